@@ -0,0 +1,88 @@
+"""
+Per-message dispatch overhead by number of chat modules registered.
+
+Each module is filtered to its own channel, so a message reaches one module.
+Compared against the same modules registered without filters.
+
+Run with: python benchmarks/dispatch_bench.py
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from datetime import datetime
+from typing import Any
+
+from eggbot.model.chat_message import ChatMessage
+from eggbot.model.chat_response import ChatResponse
+from eggbot.model.message_filter import MessageFilter
+from eggbot.module.chat_module_intf import ChatModuleIntf
+from eggbot.service.message_dispatcher import MessageDispatcher
+
+MODULE_COUNTS = (1, 10, 100, 1_000)
+REPEAT = 5
+NUMBER = 200
+MESSAGE = ChatMessage(
+    member_id="12345678901234567",
+    channel_id="channel00000",
+    created_at=str(datetime.utcnow()),
+    raw_message="Has anyone seen the egg? It was here a minute ago.",
+    guild_id="190604982934831104",
+)
+
+
+class NullModule(ChatModuleIntf):
+    """Module doing no work, isolates the cost of dispatching."""
+
+    def __init__(self, message_filter: MessageFilter) -> None:
+        self._filter = message_filter
+
+    def process_message(self, message: ChatMessage) -> ChatResponse | None:
+        return None
+
+    def message_filter(self) -> MessageFilter:
+        return self._filter
+
+    def load_config(self, config: dict[str, Any]) -> None:
+        ...
+
+
+def build_dispatcher(size: int, filtered: bool) -> MessageDispatcher:
+    """Register size modules, each filtered to a unique channel if filtered."""
+    dispatcher = MessageDispatcher()
+    for idx in range(size):
+        channel_ids = frozenset({f"channel{idx:05}"}) if filtered else frozenset()
+        module = NullModule(MessageFilter(channel_ids=channel_ids))
+        dispatcher.register(module, name=f"module{idx:05}", offload=False)
+    return dispatcher
+
+
+async def time_dispatch(dispatcher: MessageDispatcher) -> float:
+    """Best average seconds per dispatch over REPEAT runs."""
+    await dispatcher.dispatch(MESSAGE)
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(NUMBER):
+            await dispatcher.dispatch(MESSAGE)
+        best = min(best, (time.perf_counter() - start) / NUMBER)
+    return best
+
+
+async def run() -> None:
+    print(f"{'modules':>8} {'filtered usec':>14} {'unfiltered usec':>16}")
+    for size in MODULE_COUNTS:
+        filtered = await time_dispatch(build_dispatcher(size, True))
+        unfiltered = await time_dispatch(build_dispatcher(size, False))
+        print(
+            f"{size:>8} {filtered * 1_000_000:>14.2f} {unfiltered * 1_000_000:>16.2f}"
+        )
+
+
+def main() -> int:
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
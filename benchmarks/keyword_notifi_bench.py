@@ -0,0 +1,62 @@
+"""
+Per-message cost of KeywordNotifi.process_message by subscriber count.
+
+Run with: python benchmarks/keyword_notifi_bench.py
+"""
+from __future__ import annotations
+
+import timeit
+from datetime import datetime
+from typing import Any
+
+from eggbot.model.chat_message import ChatMessage
+from eggbot.module.keyword_notifi import KeywordNotifi
+
+SUBSCRIBER_COUNTS = (10, 100, 1_000, 10_000)
+REPEAT = 5
+NUMBER = 200
+MESSAGE = ChatMessage(
+    member_id="12345678901234567",
+    channel_id="01234567890123456",
+    created_at=str(datetime.utcnow()),
+    raw_message="Has anyone seen the keyword00042 egg? It was here a minute ago.",
+)
+MENTION_MESSAGE = ChatMessage(
+    member_id="12345678901234567",
+    channel_id="01234567890123456",
+    created_at=str(datetime.utcnow()),
+    raw_message="Hey <@00000000000000042> and <@!00000000000000007>, seen my egg?",
+)
+
+
+def build_config(size: int) -> dict[str, Any]:
+    """Build config with a unique keyword per subscriber."""
+    return {
+        "keyword_notifi": [
+            {
+                "member_id": f"{idx:017}",
+                "pattern": f"keyword{idx:05}",
+                "enabled": True,
+                "block_list": [],
+            }
+            for idx in range(size)
+        ]
+    }
+
+
+def main() -> int:
+    print(f"{'subscribers':>12} {'usec/message':>14} {'usec/mention':>14}")
+    for size in SUBSCRIBER_COUNTS:
+        module = KeywordNotifi()
+        module.load_config(build_config(size))
+        row = [f"{size:>12}"]
+        for message in (MESSAGE, MENTION_MESSAGE):
+            timer = timeit.Timer(lambda: module.process_message(message))
+            best = min(timer.repeat(repeat=REPEAT, number=NUMBER)) / NUMBER
+            row.append(f"{best * 1_000_000:>14.2f}")
+        print(" ".join(row))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
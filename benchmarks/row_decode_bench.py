@@ -0,0 +1,78 @@
+"""
+Per-row cost of decoding DeferredTask rows read from the database.
+
+Compares the previous decoding, a frozen dataclass with ISO text timestamps
+parsed on construction, against the slotted model decoding on access.
+
+Run with: python benchmarks/row_decode_bench.py
+"""
+from __future__ import annotations
+
+import dataclasses
+import datetime
+import sqlite3
+import timeit
+from typing import Any
+
+from eggbot.model.deferred_task import DeferredTask
+from eggbot.provider.db_connector import DBConnection
+from eggbot.provider.deferred_task_db import DeferredTaskDB
+
+ROW_COUNT = 10_000
+REPEAT = 5
+TASK = '{"event_type": "remind", "message": "get eggs"}'
+
+
+@dataclasses.dataclass(frozen=True)
+class LegacyDeferredTask:
+    uid: str
+    created_at: datetime.datetime
+    retry_at: datetime.datetime
+    event_type: str
+    event: str
+    attempts: int
+
+    @classmethod
+    def from_row(cls, *row: Any) -> LegacyDeferredTask:
+        uid, created_at, retry_at, event_type, event, attempts = row
+        return cls(
+            uid=uid,
+            created_at=datetime.datetime.fromisoformat(created_at),
+            retry_at=datetime.datetime.fromisoformat(retry_at),
+            event_type=event_type,
+            event=event,
+            attempts=attempts,
+        )
+
+
+def main() -> int:
+    dbconn = DBConnection(sqlite3.connect(":memory:"))
+    provider = DeferredTaskDB(dbconn)
+    provider.save_many([TASK] * ROW_COUNT, "remind")
+
+    now = str(datetime.datetime.utcnow())
+    legacy_rows = [(str(idx), now, now, "remind", TASK, 0) for idx in range(ROW_COUNT)]
+    cursor = dbconn.cursor()
+    cursor.execute("SELECT * FROM deferred_task")
+    rows = cursor.fetchall()
+
+    cases = {
+        "legacy dataclass": lambda: [
+            LegacyDeferredTask.from_row(*r) for r in legacy_rows
+        ],
+        "slotted model": lambda: [DeferredTask(*row) for row in rows],
+        "slotted + access": lambda: [DeferredTask(*row).retry_at for row in rows],
+        "provider get": lambda: provider.get("remind"),
+    }
+
+    print(f"{'decode':>18} {'usec/row':>10}")
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, repeat=REPEAT, number=1)) / ROW_COUNT
+        print(f"{name:>18} {best * 1_000_000:>10.3f}")
+
+    dbconn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
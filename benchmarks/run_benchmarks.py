@@ -0,0 +1,376 @@
+"""
+Benchmark suite for the message hot path and database providers.
+
+Covers KeywordNotifi.process_message by subscriber count and message length,
+and insert, query, and update throughput of DeferredTaskDB and
+ModerationActionDB by table size. Results are written as JSON so runs of two
+versions can be compared.
+
+Run with: python benchmarks/run_benchmarks.py --output results.json
+Compare:  python benchmarks/run_benchmarks.py --compare results.json
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import dataclasses
+import datetime
+import itertools
+import json
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Iterator
+
+from eggbot.model.chat_message import ChatMessage
+from eggbot.module.keyword_notifi import KeywordNotifi
+from eggbot.provider.db_connector import DBConnection
+from eggbot.provider.db_connector import DBConnector
+from eggbot.provider.deferred_task_db import DeferredTaskDB
+from eggbot.provider.moderation_action_db import ModerationActionDB
+
+SUITES = ("keyword_notifi", "deferred_task", "moderation_action")
+SUBSCRIBER_COUNTS = (10, 100, 1_000, 10_000)
+MESSAGE_LENGTHS = (64, 512, 2_000)
+ROW_COUNTS = (10_000, 100_000, 1_000_000)
+INSERT_BATCH = 1_000
+ROWS_PER_MEMBER = 100
+SAMPLE_SIZE = 200
+REPEAT = 5
+# Units where a larger value is better, all others are timings
+RATE_UNITS = {"rows/s"}
+
+
+@dataclasses.dataclass
+class Result:
+    """A single measurement, best of REPEAT runs"""
+
+    suite: str
+    case: str
+    params: dict[str, Any]
+    value: float
+    unit: str
+
+    @property
+    def key(self) -> str:
+        params = ",".join(f"{name}={value}" for name, value in self.params.items())
+        return f"{self.suite}/{self.case}[{params}]"
+
+
+def best_usec(func: Callable[[], Any], number: int) -> float:
+    """Return the best time, of REPEAT runs, of one call in microseconds."""
+    best = min(timeit.repeat(func, repeat=REPEAT, number=number))
+    return best / number * 1_000_000
+
+
+def rows_per_second(func: Callable[[], Any], rows: int) -> float:
+    """Return rows per second for a single call that writes rows."""
+    return rows / timeit.timeit(func, number=1)
+
+
+def build_message(length: int) -> ChatMessage:
+    """Build a message of given length with one subscribed keyword in the middle."""
+    filler = "the quick brown egg jumped over the lazy bacon "
+    half = (filler * (length // len(filler) + 1))[: max(length - 13, 0) // 2]
+    text = f"{half} keyword00007 {half}"[:length]
+    return ChatMessage(
+        member_id="12345678901234567",
+        channel_id="01234567890123456",
+        created_at=str(datetime.datetime.utcnow()),
+        raw_message=text,
+    )
+
+
+def bench_keyword_notifi(_: tuple[int, ...]) -> Iterator[Result]:
+    """Per-message cost of KeywordNotifi.process_message."""
+    for subscribers in SUBSCRIBER_COUNTS:
+        module = KeywordNotifi()
+        module.load_config(
+            {
+                "keyword_notifi": [
+                    {
+                        "member_id": f"{idx:017}",
+                        "pattern": f"keyword{idx:05}",
+                        "enabled": True,
+                        "block_list": [],
+                    }
+                    for idx in range(subscribers)
+                ]
+            }
+        )
+        for length in MESSAGE_LENGTHS:
+            message = build_message(length)
+            yield Result(
+                suite="keyword_notifi",
+                case="process_message",
+                params={"subscribers": subscribers, "message_length": length},
+                value=best_usec(lambda: module.process_message(message), 200),
+                unit="usec/op",
+            )
+
+
+@contextlib.contextmanager
+def open_database() -> Iterator[DBConnection]:
+    """Open a new database file, with default pragmas, removed on exit."""
+    connector = DBConnector()
+    with tempfile.TemporaryDirectory() as tempdir:
+        with connector.get_connection(str(Path(tempdir) / "bench.db")) as dbconn:
+            yield dbconn
+        connector.close_idle()
+
+
+def sample_uids(dbconn: DBConnection, table: str) -> Callable[[], str]:
+    """Return a callable giving a different existing uid each call, round robin."""
+    # uids are random, so the lowest are scattered across the table
+    cursor = dbconn.cursor()
+    cursor.execute(f"SELECT uid FROM {table} ORDER BY uid LIMIT {SAMPLE_SIZE}")
+    return itertools.cycle([row[0] for row in cursor.fetchall()]).__next__
+
+
+def bench_deferred_task(row_counts: tuple[int, ...]) -> Iterator[Result]:
+    """Insert, query, and update throughput of DeferredTaskDB."""
+    for rows in row_counts:
+        with open_database() as dbconn:
+            provider = DeferredTaskDB(dbconn)
+            params = {"rows": rows}
+            events = ['{"message": "get eggs"}'] * INSERT_BATCH
+
+            def insert() -> None:
+                for _ in range(rows // INSERT_BATCH):
+                    provider.save_many(events, "remind")
+
+            yield Result(
+                "deferred_task",
+                "save_many",
+                params,
+                rows_per_second(insert, rows),
+                "rows/s",
+            )
+
+            yield Result(
+                "deferred_task",
+                "get_due",
+                params,
+                best_usec(lambda: provider.get_due(limit=100), 20),
+                "usec/op",
+            )
+            yield Result(
+                "deferred_task",
+                "claim",
+                params,
+                best_usec(lambda: provider.claim("bench", limit=100), 20),
+                "usec/op",
+            )
+
+            next_uid = sample_uids(dbconn, "deferred_task")
+            retry_at = datetime.datetime.utcnow()
+            yield Result(
+                "deferred_task",
+                "reschedule",
+                params,
+                best_usec(lambda: provider.reschedule(next_uid(), retry_at), 200),
+                "usec/op",
+            )
+            yield Result(
+                "deferred_task",
+                "complete",
+                params,
+                best_usec(lambda: provider.complete(next_uid()), 200),
+                "usec/op",
+            )
+
+
+def bench_moderation_action(row_counts: tuple[int, ...]) -> Iterator[Result]:
+    """Insert, query, and update throughput of ModerationActionDB."""
+    for rows in row_counts:
+        with open_database() as dbconn:
+            provider = ModerationActionDB(dbconn)
+            params = {"rows": rows}
+            members = [f"{idx:017}" for idx in range(max(rows // ROWS_PER_MEMBER, 1))]
+            note = "Posted eggs in the bacon channel, see case {}"
+
+            def insert() -> None:
+                for member_id in members:
+                    events = [note.format(member_id)] * ROWS_PER_MEMBER
+                    provider.save_many(events, member_id=member_id, action="warn")
+
+            yield Result(
+                "moderation_action",
+                "save_many",
+                params,
+                rows_per_second(insert, len(members) * ROWS_PER_MEMBER),
+                "rows/s",
+            )
+
+            next_member = itertools.cycle(members).__next__
+            yield Result(
+                "moderation_action",
+                "get_by_id",
+                {**params, "rows_per_member": ROWS_PER_MEMBER},
+                best_usec(lambda: provider.get_by_id(next_member(), active=True), 50),
+                "usec/op",
+            )
+
+            # Repeat lookups of the same members during an incident
+            cached = ModerationActionDB(dbconn, cache_size=SAMPLE_SIZE)
+            next_hot = itertools.cycle(members[:SAMPLE_SIZE]).__next__
+            yield Result(
+                "moderation_action",
+                "get_by_id_cached",
+                {**params, "rows_per_member": ROWS_PER_MEMBER},
+                best_usec(lambda: cached.get_by_id(next_hot(), active=True), 400),
+                "usec/op",
+            )
+
+            # Each member's case number is found in ROWS_PER_MEMBER notes
+            yield Result(
+                "moderation_action",
+                "search",
+                {**params, "matches": ROWS_PER_MEMBER},
+                best_usec(lambda: provider.search(next_member()), 50),
+                "usec/op",
+            )
+
+            # Dashboard reports, over every row and over the latest day
+            yield Result(
+                "moderation_action",
+                "count_by_action",
+                params,
+                best_usec(provider.count_by_action, 50),
+                "usec/op",
+            )
+            yesterday = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+            yield Result(
+                "moderation_action",
+                "top_offenders",
+                params,
+                best_usec(lambda: provider.top_offenders(yesterday), 5),
+                "usec/op",
+            )
+
+            next_uid = sample_uids(dbconn, "moderation_action")
+            yield Result(
+                "moderation_action",
+                "update",
+                params,
+                best_usec(lambda: provider.update(next_uid(), "Eggs, again"), 200),
+                "usec/op",
+            )
+            yield Result(
+                "moderation_action",
+                "deactivate",
+                params,
+                best_usec(lambda: provider.deactivate(next_uid()), 200),
+                "usec/op",
+            )
+
+
+BENCHMARKS: dict[str, Callable[[tuple[int, ...]], Iterator[Result]]] = {
+    "keyword_notifi": bench_keyword_notifi,
+    "deferred_task": bench_deferred_task,
+    "moderation_action": bench_moderation_action,
+}
+
+
+def environment() -> dict[str, Any]:
+    """Describe what the results were measured on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "created_at": datetime.datetime.utcnow().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "repeat": REPEAT,
+    }
+
+
+def compare(
+    previous: list[dict[str, Any]], results: list[Result], threshold: float
+) -> int:
+    """
+    Print the change from previous results, flagging regressions.
+
+    Returns:
+        Number of results that regressed by more than threshold
+    """
+    before = {Result(**result).key: result["value"] for result in previous}
+    regressions = 0
+    print(f"\n{'benchmark':<70} {'before':>12} {'after':>12} {'change':>8}")
+    for result in results:
+        if result.key not in before:
+            continue
+        old = before[result.key]
+        change = (result.value - old) / old
+        worse = -change if result.unit in RATE_UNITS else change
+        flag = "  REGRESSED" if worse > threshold else ""
+        regressions += bool(flag)
+        print(
+            f"{result.key:<70} {old:>12.2f} {result.value:>12.2f} "
+            f"{change:>+8.1%}{flag}"
+        )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--suite",
+        action="append",
+        choices=SUITES,
+        help="Suite to run, can be repeated. Defaults to all",
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=ROW_COUNTS,
+        help="Table sizes for database suites",
+    )
+    parser.add_argument("--output", type=Path, help="Write results to JSON file")
+    parser.add_argument("--compare", type=Path, help="JSON results to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Fractional change counted as a regression when comparing",
+    )
+    args = parser.parse_args(argv)
+
+    results: list[Result] = []
+    print(f"{'benchmark':<70} {'value':>12} unit")
+    for suite in args.suite or SUITES:
+        for result in BENCHMARKS[suite](tuple(args.rows)):
+            print(f"{result.key:<70} {result.value:>12.2f} {result.unit}", flush=True)
+            results.append(result)
+
+    if args.output:
+        report = {
+            "environment": environment(),
+            "results": [dataclasses.asdict(result) for result in results],
+        }
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if args.compare:
+        previous = json.loads(args.compare.read_text(encoding="utf-8"))["results"]
+        return 1 if compare(previous, results, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -1,9 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import datetime
+import time
+from typing import Any
+from typing import Coroutine
+
 import discord
 from discord.ext import commands
 from discord.ext.commands import CommandError
 from discord.ext.commands import Context
+from eggbot.model.chat_response import ChatResponse
+from eggbot.module.keyword_notifi import KeywordNotifi
+from eggbot.provider.async_db_store import AsyncDBStore
+from eggbot.provider.db_connector import DBConnector
+from eggbot.provider.deferred_task_db import DeferredTaskDB
+from eggbot.provider.moderation_action_db import ModerationActionDB
+from eggbot.service.config_watcher import ConfigFileWatcher
+from eggbot.service.message_dispatcher import MessageDispatcher
+from eggbot.service.message_dispatcher import to_chat_message
+from eggbot.service.outbox import Outbox
+from eggbot.service.retention import RetentionJob
+from eggbot.service.retention import RetentionPolicy
+from eggbot.service.send_queue import MAX_MESSAGE_LENGTH
+from eggbot.service.send_queue import SendQueue
+from eggbot.service.task_scheduler import TaskScheduler
+from eggbot.util import metrics
+from eggbot.util.pattern_sandbox import PatternSandbox
 from runtime_yolk import Yolk
 
 
@@ -16,6 +39,25 @@ intents.presences = runtime.config.getboolean("INTENTS", "presences")
 intents.members = runtime.config.getboolean("INTENTS", "members")
 intents.message_content = runtime.config.getboolean("INTENTS", "message_content")
 bot = commands.Bot(command_prefix="!", intents=intents)
+metrics.registry.enabled = runtime.config.getboolean(
+    "METRICS", "enabled", fallback=False
+)
+dispatcher = MessageDispatcher()
+
+
+pattern_sandbox = PatternSandbox(
+    timeout=runtime.config.getfloat("KEYWORD_NOTIFI", "pattern_timeout", fallback=0.1)
+)
+keyword_notifi = KeywordNotifi(pattern_sandbox)
+keyword_notifi.load_config({KeywordNotifi.config_section: []})
+keyword_notifi_watcher = ConfigFileWatcher(
+    runtime.config.get("KEYWORD_NOTIFI", "config_file", fallback="keyword_notifi.json"),
+    lambda config: keyword_notifi.load_config(
+        {KeywordNotifi.config_section: [], **config}
+    ),
+)
+keyword_notifi_watcher.check()
+dispatcher.register(keyword_notifi)
 
 
 async def is_correct_guild(ctx: Context) -> bool:
@@ -27,6 +69,29 @@ async def is_correct_guild(ctx: Context) -> bool:
 async def on_command_error(ctx: Context, error: CommandError) -> None:
     """Handle command error."""
     logger.warning("Error captured in %s - %s", ctx.guild.id, error)
+    command = ctx.command.qualified_name if ctx.command else "unknown"
+    metrics.registry.inc("eggbot_command_errors_total", 1, command=command)
+
+
+# Start time of commands in progress by message id, only while metrics are enabled
+command_started: dict[int, float] = {}
+
+
+@bot.before_invoke
+async def start_command_timer(ctx: Context[commands.Bot]) -> None:
+    """Note when a command starts, after its checks have passed."""
+    if metrics.registry.enabled:
+        command_started[ctx.message.id] = time.perf_counter()
+
+
+@bot.after_invoke
+async def stop_command_timer(ctx: Context[commands.Bot]) -> None:
+    """Record how long a command took, whether or not it failed."""
+    start = command_started.pop(ctx.message.id, None)
+    if start is not None and ctx.command:
+        elapsed = time.perf_counter() - start
+        command = ctx.command.qualified_name
+        metrics.registry.observe("eggbot_command_seconds", elapsed, command=command)
 
 
 @bot.listen()
@@ -36,23 +101,169 @@ async def on_ready() -> None:
     logger.info("Eggbot has successfully loaded. In %s as %s", guilds, bot.user.id)
 
 
+async def deliver(response: ChatResponse) -> None:
+    """Send a module response to its delivery channel, or DM the target member."""
+    if response.delivery_id:
+        channel = bot.get_partial_messageable(int(response.delivery_id))
+        await channel.send(response.message)
+    else:
+        member_id = int(response.target_id)
+        user = bot.get_user(member_id) or await bot.fetch_user(member_id)
+        await user.send(response.message)
+
+
+send_queue = SendQueue(deliver)
+# Created in setup_hook, within the running event loop
+outbox: Outbox | None = None
+outbox_scheduler: TaskScheduler | None = None
+task_store: AsyncDBStore[DeferredTaskDB] | None = None
+moderation_store: AsyncDBStore[ModerationActionDB] | None = None
+retention_job: RetentionJob | None = None
+metrics_server: asyncio.Server | None = None
+# Long running loops, kept so failures are logged and they are cancelled on exit
+background_tasks: list[asyncio.Task[None]] = []
+
+
+def start_background(coro: Coroutine[Any, Any, None]) -> None:
+    """Run a long running loop, logging it if it ever fails."""
+    task = bot.loop.create_task(coro)
+    task.add_done_callback(log_background_failure)
+    background_tasks.append(task)
+
+
+def log_background_failure(task: asyncio.Task[None]) -> None:
+    """Log a background task that ended with an exception."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(
+            "Background task %s failed", task.get_name(), exc_info=task.exception()
+        )
+
+
+async def setup_hook() -> None:
+    """Start the outbox, config file watchers, retention, and metrics endpoint."""
+    global outbox, outbox_scheduler, task_store, moderation_store, retention_job
+    global metrics_server
+
+    database = runtime.config.get("DATABASE", "name", fallback="eggbot.db")
+    connector = DBConnector()
+    task_store = AsyncDBStore(connector, database, DeferredTaskDB)
+    # Responses are never dropped, replays keep retrying at most every 10 minutes
+    outbox_scheduler = TaskScheduler(task_store, max_backoff=600.0, max_attempts=None)
+    outbox = Outbox(send_queue, outbox_scheduler)
+    start_background(outbox_scheduler.run())
+    start_background(keyword_notifi_watcher.run())
+
+    if runtime.config.getboolean("RETENTION", "enabled", fallback=False):
+        moderation_store = AsyncDBStore(connector, database, ModerationActionDB)
+        retention_job = RetentionJob(
+            [
+                RetentionPolicy(
+                    "deferred_task",
+                    task_store,
+                    datetime.timedelta(
+                        days=runtime.config.getfloat("RETENTION", "deferred_task_days")
+                    ),
+                ),
+                RetentionPolicy(
+                    "moderation_action",
+                    moderation_store,
+                    datetime.timedelta(
+                        days=runtime.config.getfloat(
+                            "RETENTION", "moderation_action_days"
+                        )
+                    ),
+                ),
+            ],
+            chunk_size=runtime.config.getint("RETENTION", "chunk_size", fallback=500),
+            vacuum_pages=runtime.config.getint("RETENTION", "vacuum_pages") or None,
+            archive_dir=runtime.config.get("RETENTION", "archive_dir") or None,
+            interval=runtime.config.getfloat("RETENTION", "interval", fallback=3600),
+        )
+        start_background(retention_job.run())
+
+    if metrics.registry.enabled and runtime.config.getboolean(
+        "METRICS", "endpoint", fallback=False
+    ):
+        metrics_server = await metrics.serve(
+            metrics.registry,
+            runtime.config.get("METRICS", "host", fallback="127.0.0.1"),
+            runtime.config.getint("METRICS", "port", fallback=9100),
+        )
+
+
+async def teardown() -> None:
+    """Drain queued responses and stop the outbox, watchers, jobs, and endpoint."""
+    keyword_notifi_watcher.stop()
+    if retention_job is not None:
+        retention_job.stop()
+    if metrics_server is not None:
+        metrics_server.close()
+    if outbox is not None:
+        await outbox.join()
+    if outbox_scheduler is not None:
+        await outbox_scheduler.stop()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await send_queue.join()
+    if task_store is not None:
+        await task_store.close()
+    if moderation_store is not None:
+        await moderation_store.close()
+
+
+bot.setup_hook = setup_hook  # type: ignore
+
+
+@bot.listen()
+async def on_message(message: discord.Message) -> None:
+    """Route messages to chat modules and send their responses."""
+    if message.author.bot or outbox is None:
+        return
+
+    for response in await dispatcher.dispatch(to_chat_message(message)):
+        await outbox.send(response)
+
+
 @bot.command()
 @commands.check(is_correct_guild)
 async def hello(ctx: Context) -> None:
     logger.info("Eggbot hello command recieved. Hello there!")
-    await ctx.channel.send(f"Hello to you as well, {ctx.author.mention}!")
+    text = f"Hello to you as well, {ctx.author.mention}!"
+    await send_queue.put(ChatResponse(text, str(ctx.author.id), str(ctx.channel.id)))
+
+
+@bot.command()
+@commands.check(is_correct_guild)
+async def stats(ctx: Context[commands.Bot]) -> None:
+    """Reply with latency percentiles, in milliseconds, and counts."""
+    text = metrics.registry.render_text() or "No metrics recorded."
+    if not metrics.registry.enabled:
+        text = "Metrics are disabled, see [METRICS] enabled."
+    # Leave room for the code block, dropping whole lines that do not fit
+    if len(text) > MAX_MESSAGE_LENGTH - 8:
+        text = text[: MAX_MESSAGE_LENGTH - 8].rsplit("\n", 1)[0]
+    text = f"```\n{text}\n```"
+    await send_queue.put(ChatResponse(text, str(ctx.author.id), str(ctx.channel.id)))
 
 
 @bot.command()
 @commands.check(is_correct_guild)
 async def shutdown(ctx: Context) -> None:
     logger.info("Eggbot shutdown command recieved.  Until next time, space cowboy.")
-    await ctx.channel.send(f"See you next time, {ctx.author.mention}.")
+    text = f"See you next time, {ctx.author.mention}."
+    await send_queue.put(ChatResponse(text, str(ctx.author.id), str(ctx.channel.id)))
+    await teardown()
     await bot.close()
 
 
 def main() -> int:
-    bot.run(runtime.config.get("DEFAULT", "discord_token"))
+    try:
+        bot.run(runtime.config.get("DEFAULT", "discord_token"))
+    finally:
+        dispatcher.close()
+        pattern_sandbox.close()
     return 0
 
 
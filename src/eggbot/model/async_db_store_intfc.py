@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import abc
+from typing import Any
+
+
+class AsyncDBStoreIntfc(abc.ABC):
+    """ABC for all awaitable database store providers"""
+
+    @abc.abstractmethod
+    async def get(self, *args: Any, **kwargs: Any) -> list[Any]:
+        """Override for database specific get method"""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def save(self, event: str, *args: Any, **kwargs: Any) -> None:
+        """Override for database specific save method"""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def delete(self, uid: str) -> None:
+        """Override for database specific delete method"""
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        """Override to release the database connection"""
+        raise NotImplementedError()
@@ -12,3 +12,4 @@ class ChatMessage:
     channel_id: str
     created_at: str
     raw_message: str
+    guild_id: str | None = None
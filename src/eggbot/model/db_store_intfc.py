@@ -1,26 +1,206 @@
 from __future__ import annotations
 
 import abc
+import inspect
 from contextlib import contextmanager
 from typing import Any
+from typing import Callable
+from typing import Dict
 from typing import Generator
+from typing import List
+from typing import Sequence
 
 from eggbot.provider.db_connector import Cursor
 from eggbot.provider.db_connector import DBConnection
+from eggbot.util import metrics
+
+
+# Rows pulled from the cursor at a time while paging
+FETCH_SIZE = 100
+# Value of PRAGMA auto_vacuum for incremental mode
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Given rows, by column name, before they are deleted
+ArchiveCallback = Callable[[List[Dict[str, Any]]], None]
 
 
 class DBStoreIntfc(abc.ABC):
     """ABC for all database store providers"""
 
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        """Time each public method of a provider, see eggbot.util.metrics."""
+        super().__init_subclass__(**kwargs)
+        for name, attr in list(vars(cls).items()):
+            # Generators return before any work is done, so are not timed
+            if name.startswith("_") or not inspect.isfunction(attr):
+                continue
+            if inspect.isgeneratorfunction(attr):
+                continue
+            timed = metrics.registry.timed(
+                "eggbot_db_seconds", store=cls.__name__, method=name
+            )
+            setattr(cls, name, timed(attr))
+
     # Reusable code
     @contextmanager
     def get_cursor(self) -> Generator[Cursor, None, None]:
         """Context manager for creating a database cursor. Does not commit changes."""
-        cursor = self.dbconn.cursor()
-        try:
-            yield cursor
-        finally:
-            cursor.close()
+        with self.dbconn.locked():
+            cursor = self.dbconn.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def flush(self) -> None:
+        """Commit any writes deferred by the connection's write-behind mode."""
+        self.dbconn.flush()
+
+    def _iter_keyset(
+        self,
+        table: str,
+        where: Sequence[str],
+        values: Sequence[Any],
+        page_size: int,
+    ) -> Generator[list[Any], None, None]:
+        """
+        Yield chunks of rows ordered by (created_at, uid) with keyset pagination.
+
+        Each page is a new query starting after the last row seen, so memory is
+        bounded by page_size no matter the size of the table. Rows of table must
+        start with the uid and created_at columns.
+
+        Args:
+            table: Name of table to read
+            where: WHERE clause conditions, joined with AND
+            values: Values for the WHERE clause conditions
+            page_size: Maximum number of rows read per query
+        """
+        last: tuple[Any, Any] | None = None
+        while True:
+            conditions = list(where)
+            page_values = list(values)
+            if last is not None:
+                # A row value comparison seeks the index, an OR only filters it
+                conditions.append("(created_at, uid)>(?, ?)")
+                page_values.extend((last[1], last[0]))
+
+            sql = f"SELECT * FROM {table}"
+            if conditions:
+                sql += f" WHERE {' AND '.join(conditions)}"
+            sql += " ORDER BY created_at, uid LIMIT ?"
+            page_values.append(page_size)
+
+            count = 0
+            with self.get_cursor() as cursor:
+                cursor.execute(sql, page_values)
+                while True:
+                    rows = cursor.fetchmany(FETCH_SIZE)
+                    if not rows:
+                        break
+                    count += len(rows)
+                    last = (rows[-1][0], rows[-1][1])
+                    yield rows
+
+            if count < page_size:
+                return None
+
+    def _delete_chunk(
+        self,
+        table: str,
+        where: Sequence[str],
+        values: Sequence[Any],
+        limit: int,
+        archive: ArchiveCallback | None = None,
+    ) -> list[Any]:
+        """
+        Delete up to limit rows in a single short write transaction.
+
+        Rows of table must start with the uid column.
+
+        Args:
+            table: Name of table to delete from
+            where: WHERE clause conditions, joined with AND
+            values: Values for the WHERE clause conditions
+            limit: Maximum number of rows deleted
+            archive: Called with the rows before they are deleted. If it raises
+                the transaction is rolled back and nothing is deleted
+
+        Returns:
+            Rows deleted
+        """
+        select_sql = f"SELECT * FROM {table} WHERE {' AND '.join(where)} LIMIT ?"
+        delete_sql = f"DELETE FROM {table} WHERE uid=?"
+
+        # Take the write lock up front so the selected rows cannot change under us
+        self.dbconn.flush()
+        with self.get_cursor() as cursor:
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(select_sql, [*values, limit])
+                rows = cursor.fetchall()
+                if rows and archive is not None:
+                    columns = [column[0] for column in cursor.description]
+                    archive([dict(zip(columns, row)) for row in rows])
+                cursor.executemany(delete_sql, ((row[0],) for row in rows))
+                self.dbconn.flush()
+            except Exception:
+                self.dbconn.rollback()
+                raise
+
+        return rows
+
+    def compact(self, max_pages: int | None = None) -> int:
+        """
+        Return free pages of the database file to the file system.
+
+        Only databases in incremental auto_vacuum mode, the default of
+        DBConnector for new databases, are compacted, releasing up to max_pages.
+        Other databases are left as they are, convert them with `vacuum()`.
+
+        Args:
+            max_pages: Most free pages released, all when None
+
+        Returns:
+            Number of bytes released, 0 when not in incremental mode
+        """
+        self.dbconn.flush()
+        with self.get_cursor() as cursor:
+            mode = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if mode != AUTO_VACUUM_INCREMENTAL:
+                return 0
+            return self._shrink(
+                cursor,
+                f"PRAGMA incremental_vacuum({int(max_pages or 0)});",
+            )
+
+    def vacuum(self) -> int:
+        """
+        Rewrite the whole database file, converting it to incremental auto_vacuum.
+
+        A full VACUUM holds the database locked while it copies every page, so
+        run it by hand during maintenance, never on a schedule. Afterward
+        `compact()` releases free pages without a rewrite.
+
+        Returns:
+            Number of bytes released
+        """
+        self.dbconn.flush()
+        with self.get_cursor() as cursor:
+            return self._shrink(cursor, "PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")
+
+    @staticmethod
+    def _shrink(cursor: Cursor, script: str) -> int:
+        """Run a vacuum script, returning the bytes released from the file."""
+        page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+        before = cursor.execute("PRAGMA page_count").fetchone()[0]
+        # Each step of incremental_vacuum frees one page, a script runs them all
+        cursor.executescript(script)
+        after = cursor.execute("PRAGMA page_count").fetchone()[0]
+        # In WAL mode the file only shrinks once the WAL is written back
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+        return (before - after) * page_size
 
     # Override the following methods for each implementation
     @abc.abstractmethod
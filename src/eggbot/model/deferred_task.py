@@ -1,18 +1,109 @@
 from __future__ import annotations
 
-import dataclasses
 import datetime
+import json
 from typing import Any
 
+from eggbot.util.time_util import TimeUtil
+
+# Values of DeferredTask.status
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+# Marks an event payload not yet decoded
+_UNDECODED: Any = object()
+
 
-@dataclasses.dataclass
 class DeferredTask:
     """Model mirrors DeferredTask row from deferred_task table"""
 
     # NOTE: Order of attributes must match table schema
-    uid: str
-    created_at: datetime.datetime
-    retry_at: datetime.datetime
-    event_type: str
-    event: dict[str, Any]
-    attempts: int
+    # Timestamps and the event are kept as stored and decoded on access
+    __slots__ = (
+        "uid",
+        "_created_at",
+        "_retry_at",
+        "event_type",
+        "raw_event",
+        "attempts",
+        "status",
+        "_finished_at",
+        "lease_owner",
+        "_lease_until",
+        "_event",
+    )
+
+    def __init__(
+        self,
+        uid: str,
+        created_at: int,
+        retry_at: int,
+        event_type: str,
+        event: str,
+        attempts: int,
+        status: str = STATUS_PENDING,
+        finished_at: int | None = None,
+        lease_owner: str | None = None,
+        lease_until: int | None = None,
+    ) -> None:
+        self.uid = uid
+        self._created_at = created_at
+        self._retry_at = retry_at
+        self.event_type = event_type
+        self.raw_event = event
+        self.attempts = attempts
+        self.status = status
+        self._finished_at = finished_at
+        self.lease_owner = lease_owner
+        self._lease_until = lease_until
+        self._event = _UNDECODED
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        """UTC time the task was saved"""
+        return TimeUtil.from_epoch(self._created_at)
+
+    @property
+    def retry_at(self) -> datetime.datetime:
+        """UTC time the task is next due"""
+        return TimeUtil.from_epoch(self._retry_at)
+
+    @property
+    def finished_at(self) -> datetime.datetime | None:
+        """UTC time the task was marked done or dead"""
+        if self._finished_at is None:
+            return None
+        return TimeUtil.from_epoch(self._finished_at)
+
+    @property
+    def lease_until(self) -> datetime.datetime | None:
+        """UTC time the current lease expires"""
+        if self._lease_until is None:
+            return None
+        return TimeUtil.from_epoch(self._lease_until)
+
+    @property
+    def event(self) -> dict[str, Any]:
+        """Event payload, decoded from JSON on first access"""
+        if self._event is _UNDECODED:
+            self._event = json.loads(self.raw_event)
+        return self._event
+
+    def to_row(self) -> tuple[Any, ...]:
+        """Return values in table schema order, as stored"""
+        return tuple(getattr(self, name) for name in self.__slots__[:-1])
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, DeferredTask):
+            return NotImplemented
+        return self.to_row() == other.to_row()
+
+    def __repr__(self) -> str:
+        return (
+            f"DeferredTask(uid={self.uid!r}, created_at={self.created_at!r}, "
+            f"retry_at={self.retry_at!r}, event_type={self.event_type!r}, "
+            f"event={self.raw_event!r}, attempts={self.attempts!r}, "
+            f"status={self.status!r}, finished_at={self.finished_at!r}, "
+            f"lease_owner={self.lease_owner!r}, lease_until={self.lease_until!r})"
+        )
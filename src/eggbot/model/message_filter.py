@@ -0,0 +1,18 @@
+"""Cheap checks a chat module declares to receive only messages it can act on."""
+from __future__ import annotations
+
+import dataclasses
+
+
+@dataclasses.dataclass(frozen=True)
+class MessageFilter:
+    """
+    Cheap checks a chat module declares to receive only messages it can act on.
+
+    Empty values do not filter. A message must pass every non-empty check.
+    """
+
+    channel_ids: frozenset[str] = frozenset()  # Only messages in these channels
+    guild_id: str | None = None  # Only messages in this guild
+    excluded_authors: frozenset[str] = frozenset()  # Never messages from these
+    required_tokens: frozenset[str] = frozenset()  # Any one, case-insensitive
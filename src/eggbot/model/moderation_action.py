@@ -2,43 +2,105 @@ from __future__ import annotations
 
 import dataclasses
 import datetime
+from typing import Any
+
+from eggbot.util.time_util import TimeUtil
 
 
-@dataclasses.dataclass(frozen=True)
 class ModerationAction:
-    """Model row for moderation_action table"""
+    """Model row for moderation_action table. Immutable, as it is hashable."""
 
     # NOTE: Order of attributes must match table schema
+    # Timestamps and flags are kept as stored and decoded on access
+    __slots__ = (
+        "uid",
+        "_created_at",
+        "_updated_at",
+        "member_id",
+        "action",
+        "original_note",
+        "current_note",
+        "_active",
+    )
     uid: str
-    created_at: datetime.datetime
-    updated_at: datetime.datetime
+    _created_at: int
+    _updated_at: int
     member_id: str
     action: str
     original_note: str
     current_note: str
-    active: bool
+    _active: int
 
-    @classmethod
-    def from_row(
-        cls,
+    def __init__(
+        self,
         uid: str,
-        created_at: str,
-        updated_at: str,
+        created_at: int,
+        updated_at: int,
         member_id: str,
         action: str,
         original_note: str,
         current_note: str,
         active: int,
-    ) -> ModerationAction:
+    ) -> None:
+        row = (
+            uid,
+            created_at,
+            updated_at,
+            member_id,
+            action,
+            original_note,
+            current_note,
+            active,
+        )
+        for name, value in zip(self.__slots__, row):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_row(cls, *row: Any) -> ModerationAction:
         """Generate object from table row"""
-        # Handles lack of types available in sqllite3
-        return ModerationAction(
-            uid=uid,
-            created_at=datetime.datetime.fromisoformat(created_at),
-            updated_at=datetime.datetime.fromisoformat(updated_at),
-            member_id=member_id,
-            action=action,
-            original_note=original_note,
-            current_note=current_note,
-            active=bool(active),
+        return cls(*row)
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        """UTC time the action was created"""
+        return TimeUtil.from_epoch(self._created_at)
+
+    @property
+    def updated_at(self) -> datetime.datetime:
+        """UTC time the action was last updated"""
+        return TimeUtil.from_epoch(self._updated_at)
+
+    @property
+    def active(self) -> bool:
+        """True if the action has not been deactivated"""
+        return bool(self._active)
+
+    def to_row(self) -> tuple[Any, ...]:
+        """Return values in table schema order, as stored"""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise dataclasses.FrozenInstanceError(f"cannot assign to field '{name}'")
+
+    def __delattr__(self, name: str) -> None:
+        raise dataclasses.FrozenInstanceError(f"cannot delete field '{name}'")
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Copied and pickled through __init__, attributes cannot be set
+        return (type(self), self.to_row())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ModerationAction):
+            return NotImplemented
+        return self.to_row() == other.to_row()
+
+    def __hash__(self) -> int:
+        return hash(self.to_row())
+
+    def __repr__(self) -> str:
+        return (
+            f"ModerationAction(uid={self.uid!r}, created_at={self.created_at!r}, "
+            f"updated_at={self.updated_at!r}, member_id={self.member_id!r}, "
+            f"action={self.action!r}, original_note={self.original_note!r}, "
+            f"current_note={self.current_note!r}, active={self.active!r})"
         )
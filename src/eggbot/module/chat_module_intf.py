@@ -7,6 +7,7 @@ from typing import Any
 
 from eggbot.model.chat_message import ChatMessage
 from eggbot.model.chat_response import ChatResponse
+from eggbot.model.message_filter import MessageFilter
 
 
 class ChatModuleIntf(ABC):
@@ -23,6 +24,27 @@ class ChatModuleIntf(ABC):
         """
         raise NotImplementedError()
 
+    def process_message_batch(self, message: ChatMessage) -> list[ChatResponse]:
+        """
+        Process a ChatMessage object, returning every response it generates
+
+        Override when a module can respond more than once to a message. The
+        default wraps `process_message`. Responses are independent of each
+        other and can be delivered concurrently by the controller.
+        """
+        response = self.process_message(message)
+        return [response] if response is not None else []
+
+    def message_filter(self) -> MessageFilter:
+        """
+        Return the messages this module can act on
+
+        Override to skip messages the module would never respond to. Checked
+        by the controller before `process_message` is called. The default
+        receives every message.
+        """
+        return MessageFilter()
+
     @abstractmethod
     def load_config(self, config: dict[str, Any]) -> None:
         """
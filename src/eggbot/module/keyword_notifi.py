@@ -2,12 +2,39 @@
 from __future__ import annotations
 
 import dataclasses
+import logging
 import re
+import threading
 from typing import Any
+from typing import Mapping
 
 from eggbot.model.chat_message import ChatMessage
 from eggbot.model.chat_response import ChatResponse
 from eggbot.module.chat_module_intf import ChatModuleIntf
+from eggbot.util.keyword_matcher import KeywordMatcher
+from eggbot.util.pattern_sandbox import PatternSandbox
+from eggbot.util.string_util import StringUtil
+from eggbot.util.string_util import UnsafePatternError
+
+# User mentions as sent by Discord, `<@id>` or `<@!id>` when set by nickname
+_MENTION = re.compile(r"<@!?(\d+)>")
+
+logger = logging.getLogger(__name__)
+
+
+def find_mentions(text: str) -> set[str]:
+    """
+    Find the ids of every member mentioned in the text.
+
+    Args:
+        text: Raw message text
+
+    Returns:
+        Unique member ids, empty if there are no mentions
+    """
+    if "<@" not in text:
+        return set()
+    return set(_MENTION.findall(text))
 
 
 @dataclasses.dataclass(frozen=True)
@@ -17,30 +44,131 @@ class KeywordNotifiConfig:
     member_id: str
     pattern: re.Pattern[str]
     enabled: bool
-    block_list: list[str]
+    block_list: list[str]  # member or channel ids which will not notify member
     delivery_id: str | None = None
 
 
+@dataclasses.dataclass(frozen=True)
+class _Lookups:
+    """Configs and the lookups built from them, swapped in as one."""
+
+    configs: Mapping[str, KeywordNotifiConfig]
+    matcher: KeywordMatcher
+    blocked_by: Mapping[str, frozenset[str]]
+    # Enabled members by their position in the config, orders responses
+    order: Mapping[str, int]
+
+
 class KeywordNotifi(ChatModuleIntf):
     """Alert, via DM, from bot on keyword mention in chat message."""
 
     config_section = "keyword_notifi"
 
-    def __init__(self) -> None:
-        self.configs: dict[str, KeywordNotifiConfig] = {}
+    def __init__(self, sandbox: PatternSandbox | None = None) -> None:
+        """
+        Args:
+            sandbox: Confirm member patterns in worker processes under a time
+                budget. Members with patterns over budget are disabled. Patterns
+                are run inline, without a budget, if not given
+        """
+        # Replaced, never mutated, so messages always see one complete config
+        self._lookups = _Lookups({}, KeywordMatcher({}), {}, {})
+        self._compiled: dict[str, re.Pattern[str]] = {}
+        self._write_lock = threading.Lock()
+        self._sandbox = sandbox
+        self._over_budget: set[str] = set()
+
+    @property
+    def configs(self) -> Mapping[str, KeywordNotifiConfig]:
+        """Loaded member configs by member id."""
+        return self._lookups.configs
 
     def process_message(self, message: ChatMessage) -> ChatResponse | None:
         """Process chat message, returns response or None if no response exists"""
-        for config in self.configs.values():
-            mention = f"<@{config.member_id}>"
-            result = config.pattern.search(message.raw_message)
-            if result or mention in message.raw_message:
-                return ChatResponse(
-                    message=self.render_message(message),
-                    target_id=config.member_id,
-                    delivery_id=config.delivery_id,
-                )
-        return None
+        responses = self.process_message_batch(message)
+        return responses[0] if responses else None
+
+    def process_message_batch(self, message: ChatMessage) -> list[ChatResponse]:
+        """
+        Process chat message, returns a response for every member notified.
+
+        Args:
+            message: ChatMessage object to process
+
+        Returns:
+            List of ChatResponse objects, can be empty
+        """
+        lookups = self._lookups
+        matched = set(self._match(lookups.matcher, message.raw_message))
+        # Mentions cost one scan of the message, not one check per member
+        matched.update(find_mentions(message.raw_message) & lookups.order.keys())
+        if not matched:
+            return []
+        member_ids = sorted(matched, key=lookups.order.__getitem__)
+
+        blocked = lookups.blocked_by.get(message.member_id, frozenset())
+        blocked = blocked | lookups.blocked_by.get(message.channel_id, frozenset())
+        text = self.render_message(message)
+
+        return [
+            ChatResponse(
+                message=text,
+                target_id=member_id,
+                delivery_id=lookups.configs[member_id].delivery_id,
+            )
+            for member_id in member_ids
+            if member_id not in blocked
+        ]
+
+    def over_budget_members(self) -> dict[str, str]:
+        """
+        Report members disabled because their pattern ran over the time budget.
+
+        Returns:
+            Mapping of member id to the member's compiled pattern
+        """
+        return {
+            key: config.pattern.pattern
+            for key, config in self._lookups.configs.items()
+            if config.pattern.pattern in self._over_budget
+        }
+
+    def _match(self, matcher: KeywordMatcher, text: str) -> list[str]:
+        """Return ids of members matched, confirming patterns in the sandbox."""
+        if self._sandbox is None:
+            return matcher.match(text)
+
+        candidates = matcher.candidates(text)
+        patterns = [pattern for pattern, _ in candidates if pattern is not None]
+        results = iter(self._sandbox.search(patterns, text))
+
+        member_ids: list[str] = []
+        over_budget: list[re.Pattern[str]] = []
+        for pattern, keys in candidates:
+            found = True if pattern is None else next(results)
+            if found is None and pattern is not None:
+                over_budget.append(pattern)
+            elif found:
+                member_ids.extend(keys)
+
+        if over_budget:
+            self._disable_patterns(over_budget)
+        return member_ids
+
+    def _disable_patterns(self, patterns: list[re.Pattern[str]]) -> None:
+        """Disable every member using a pattern that ran over the time budget."""
+        with self._write_lock:
+            self._over_budget.update(pattern.pattern for pattern in patterns)
+            configs = dict(self._lookups.configs)
+            for key, config in configs.items():
+                if config.enabled and config.pattern.pattern in self._over_budget:
+                    logger.warning(
+                        "Disabled member %s, pattern '%s' over time budget",
+                        key,
+                        config.pattern.pattern,
+                    )
+                    configs[key] = dataclasses.replace(config, enabled=False)
+            self._swap(configs)
 
     def render_message(self, message: ChatMessage) -> str:
         """
@@ -64,24 +192,128 @@ class KeywordNotifi(ChatModuleIntf):
         """
         Load config into class, removes existing loaded config values.
 
+        Only members that changed are rebuilt. Messages processed during the
+        load see either the previous or the new config in full.
+
         Args:
             config: configuration mapping
 
         Returns:
             None
         """
-        # Reset state config
-        self.configs = {}
-
         try:
             members = config[self.config_section]
         except KeyError as err:
             raise KeyError(f"Config file missing expected key '{err}'") from err
 
-        for member in members:
-            self.configs[member["member_id"]] = KeywordNotifiConfig(
-                member_id=member["member_id"],
-                pattern=re.compile(rf"\b{member['pattern'].lower()}\b", re.I),
-                enabled=member["enabled"],
-                block_list=member["block_list"],
+        with self._write_lock:
+            current = self._lookups.configs
+            configs: dict[str, KeywordNotifiConfig] = {}
+            for member in members:
+                try:
+                    configs[member["member_id"]] = self._to_config(member)
+                except (UnsafePatternError, re.error) as err:
+                    # One bad pattern should not block everyone else's config
+                    logger.warning("Skipped member %s - %s", member["member_id"], err)
+            # Keep existing objects for unchanged members
+            configs = {
+                key: current[key] if current.get(key) == cfg else cfg
+                for key, cfg in configs.items()
+            }
+            changed = {
+                key for key, cfg in configs.items() if current.get(key) is not cfg
+            }
+            removed = current.keys() - configs.keys()
+            if changed or removed:
+                self._swap(configs)
+            logger.debug(
+                "Config reloaded, %d changed, %d removed", len(changed), len(removed)
             )
+
+    def update_member(self, member: Mapping[str, Any]) -> None:
+        """
+        Add a member's subscription, or replace it if the member already has one.
+
+        Args:
+            member: Single member mapping, as found in the config section
+
+        Raises:
+            UnsafePatternError: When the member's pattern is rejected
+            re.error: When the member's pattern is invalid
+        """
+        with self._write_lock:
+            config = self._to_config(member)
+            if self._lookups.configs.get(config.member_id) != config:
+                self._swap({**self._lookups.configs, config.member_id: config})
+
+    def remove_member(self, member_id: str) -> bool:
+        """
+        Remove a member's subscription.
+
+        Args:
+            member_id: Member to remove
+
+        Returns:
+            True if the member was subscribed
+        """
+        with self._write_lock:
+            if member_id not in self._lookups.configs:
+                return False
+            configs = dict(self._lookups.configs)
+            del configs[member_id]
+            self._swap(configs)
+            return True
+
+    def _to_config(self, member: Mapping[str, Any]) -> KeywordNotifiConfig:
+        """Create member config, reusing the compiled pattern when unchanged."""
+        pattern = self._compile(member["pattern"])
+        return KeywordNotifiConfig(
+            member_id=member["member_id"],
+            pattern=pattern,
+            # Patterns over the time budget stay disabled until they are changed
+            enabled=member["enabled"] and pattern.pattern not in self._over_budget,
+            block_list=member["block_list"],
+            delivery_id=member.get("delivery_id"),
+        )
+
+    def _compile(self, pattern: str) -> re.Pattern[str]:
+        """Compile a member's pattern, memoized by pattern text."""
+        compiled = self._compiled.get(pattern)
+        if compiled is None:
+            compiled = StringUtil.compile_pattern(
+                rf"\b{pattern.lower()}\b", re.I, safe=True
+            )
+            self._compiled[pattern] = compiled
+        return compiled
+
+    def _swap(self, configs: dict[str, KeywordNotifiConfig]) -> None:
+        """Build lookups for configs and swap them in. Hold the write lock."""
+        self._lookups = self._build_lookups(configs)
+
+        # Drop memoized patterns no member uses anymore
+        in_use = {cfg.pattern.pattern for cfg in configs.values()}
+        self._compiled = {
+            key: pattern
+            for key, pattern in self._compiled.items()
+            if pattern.pattern in in_use
+        }
+
+    @staticmethod
+    def _build_lookups(configs: dict[str, KeywordNotifiConfig]) -> _Lookups:
+        """Precompute matcher and block lists from configs."""
+        # Disabled members are left out entirely, they cost nothing per message
+        enabled = {key: cfg for key, cfg in configs.items() if cfg.enabled}
+
+        blocked_by: dict[str, set[str]] = {}
+        for config in enabled.values():
+            for blocked_id in config.block_list:
+                blocked_by.setdefault(blocked_id, set()).add(config.member_id)
+
+        return _Lookups(
+            configs=configs,
+            matcher=KeywordMatcher(
+                patterns={key: config.pattern for key, config in enabled.items()}
+            ),
+            blocked_by={key: frozenset(ids) for key, ids in blocked_by.items()},
+            order={key: index for index, key in enumerate(enabled)},
+        )
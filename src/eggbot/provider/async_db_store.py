@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from types import TracebackType
+from typing import Any
+from typing import Callable
+from typing import Generic
+from typing import TypeVar
+
+from eggbot.model.async_db_store_intfc import AsyncDBStoreIntfc
+from eggbot.model.db_store_intfc import DBStoreIntfc
+from eggbot.provider.db_connector import DBConnection
+from eggbot.provider.db_connector import DBConnector
+
+StoreT = TypeVar("StoreT", bound=DBStoreIntfc)
+ResultT = TypeVar("ResultT")
+
+
+class AsyncDBStore(AsyncDBStoreIntfc, Generic[StoreT]):
+    def __init__(
+        self,
+        connector: DBConnector,
+        database_name: str,
+        store_type: Callable[[DBConnection], StoreT],
+    ) -> None:
+        """
+        Awaitable wrapper running a DBStoreIntfc provider on a dedicated thread.
+
+        The connection and provider are created on, and only ever used from, a
+        single database thread. Queries are queued to that thread in the order
+        they are awaited so the event loop is never blocked by the database.
+
+        Args:
+            connector: Connector used to open the database
+            database_name: Name of database to open
+            store_type: Provider class, or factory, given the opened connection
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"eggbot-db-{database_name}",
+        )
+        self._exit_stack = contextlib.ExitStack()
+        self._store: StoreT | None = None
+        self._opened = self._executor.submit(
+            self._open,
+            connector,
+            database_name,
+            store_type,
+        )
+
+    async def __aenter__(self) -> AsyncDBStore[StoreT]:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.close()
+
+    async def run(
+        self,
+        func: Callable[..., ResultT],
+        *args: Any,
+        **kwargs: Any,
+    ) -> ResultT:
+        """
+        Run a provider method, or any callable given the provider, on the DB thread.
+
+        Args:
+            func: Callable given the provider as the first argument
+            args: Additional positional arguments for func
+            kwargs: Additional keyword arguments for func
+
+        Returns:
+            The result of func
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self._call, func, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def get(self, *args: Any, **kwargs: Any) -> list[Any]:
+        """Awaitable provider get method"""
+        return await self.run(lambda store: store.get(*args, **kwargs))
+
+    async def save(self, event: str, *args: Any, **kwargs: Any) -> None:
+        """Awaitable provider save method"""
+        await self.run(lambda store: store.save(event, *args, **kwargs))
+
+    async def delete(self, uid: str) -> None:
+        """Awaitable provider delete method"""
+        await self.run(lambda store: store.delete(uid))
+
+    async def close(self) -> None:
+        """Close the database connection and stop the database thread"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._exit_stack.close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    def _open(
+        self,
+        connector: DBConnector,
+        database_name: str,
+        store_type: Callable[[DBConnection], StoreT],
+    ) -> None:
+        """Open connection and create provider. Runs on the DB thread."""
+        dbconn = self._exit_stack.enter_context(connector.get_connection(database_name))
+        self._store = store_type(dbconn)
+
+    def _call(self, func: Callable[..., ResultT], *args: Any, **kwargs: Any) -> ResultT:
+        """Run func against the provider. Runs on the DB thread."""
+        # Raises here if the connection failed to open
+        self._opened.result()
+        return func(self._store, *args, **kwargs)
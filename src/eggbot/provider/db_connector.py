@@ -2,8 +2,13 @@ from __future__ import annotations
 
 import contextlib
 import dataclasses
+import logging
 import sqlite3
+import threading
+import time
+from typing import Callable
 from typing import Generator
+from typing import Mapping
 
 # Explict type alias definitions for abstract from DB engine
 # Cannot be class-level until 3.10
@@ -11,30 +16,188 @@ Cursor = sqlite3.Cursor
 IntegrityError = sqlite3.IntegrityError
 
 
+MEMORY_DATABASE = ":memory:"
+
+logger = logging.getLogger(__name__)
+
+# Seconds a connection waits on another's lock, the sqlite3 default
+_BUSY_TIMEOUT = 5.0
+
+# Applied to every new connection unless DBConnector is given its own
+DEFAULT_PRAGMAS: dict[str, str | int] = {
+    # Only takes effect on new databases, see DBStoreIntfc.vacuum
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16_000,  # Negative values are KiB
+    "mmap_size": 134_217_728,
+}
+
+
+@dataclasses.dataclass
+class PoolStats:
+    """Connection pool usage of a single database"""
+
+    opened: int = 0
+    checkouts: int = 0
+    waits: int = 0
+    wait_time: float = 0.0
+    max_wait: float = 0.0
+    in_use: int = 0
+    idle: int = 0
+
+
 @dataclasses.dataclass
 class _ActiveConnections:
     connection: sqlite3.Connection
     count: int
 
 
+@dataclasses.dataclass
+class _WriteBehind:
+    max_pending: int
+    max_delay: float
+    pending: int = 0
+    first_pending_at: float = 0.0
+    timer: threading.Timer | None = None
+
+
 class DBConnection:
     """Database connection abstract. Use this over importing DB library"""
 
     def __init__(self, dbconn: sqlite3.Connection) -> None:
         self._dbconn = dbconn
+        self._write_behind: _WriteBehind | None = None
+        self._flush_hooks: list[Callable[[int], None]] = []
+        # Held while in use so the write-behind timer never flushes mid-operation
+        self._lock = threading.RLock()
 
     def cursor(self) -> sqlite3.Cursor:
         """Create a database cursor"""
         return self._dbconn.cursor()
 
+    @contextlib.contextmanager
+    def locked(self) -> Generator[None, None, None]:
+        """Hold the connection so deferred writes are not flushed by the timer."""
+        with self._lock:
+            yield None
+
     def commit(self) -> None:
-        """Commit pending changes to database"""
-        return self._dbconn.commit()
+        """Commit pending changes to database, deferred if write-behind is enabled"""
+        with self._lock:
+            if self._write_behind is None:
+                return self._dbconn.commit()
+
+            write_behind = self._write_behind
+            if not write_behind.pending:
+                write_behind.first_pending_at = time.monotonic()
+                # Flushes an idle connection, which otherwise holds the write lock
+                write_behind.timer = threading.Timer(
+                    write_behind.max_delay, self._flush_on_timer
+                )
+                write_behind.timer.daemon = True
+                write_behind.timer.start()
+            write_behind.pending += 1
+
+            if write_behind.pending >= write_behind.max_pending:
+                self.flush()
+            else:
+                self.flush_if_due()
+
+    @property
+    def pending_writes(self) -> int:
+        """Number of commits deferred by write-behind and not yet durable"""
+        return self._write_behind.pending if self._write_behind else 0
+
+    def flush(self) -> None:
+        """Commit all deferred writes now, in a single transaction"""
+        with self._lock:
+            self._dbconn.commit()
+            write_behind = self._write_behind
+            if write_behind is None or not write_behind.pending:
+                return None
+
+            self._cancel_timer(write_behind)
+            pending, write_behind.pending = write_behind.pending, 0
+            for hook in self._flush_hooks:
+                hook(pending)
+
+    def rollback(self) -> None:
+        """Discard all uncommitted changes, including deferred writes"""
+        with self._lock:
+            self._dbconn.rollback()
+            if self._write_behind is not None:
+                self._cancel_timer(self._write_behind)
+                self._write_behind.pending = 0
+
+    def flush_if_due(self) -> None:
+        """Flush deferred writes if the oldest has waited longer than max_delay"""
+        write_behind = self._write_behind
+        if not write_behind or not write_behind.pending:
+            return None
+
+        if time.monotonic() - write_behind.first_pending_at >= write_behind.max_delay:
+            self.flush()
+
+    def enable_write_behind(
+        self, max_pending: int = 100, max_delay: float = 1.0
+    ) -> None:
+        """
+        Defer commits and group them into a single transaction.
+
+        Writes are still executed immediately and are visible to this connection.
+        They become durable when `max_pending` commits have been deferred, when
+        the oldest deferred commit is `max_delay` seconds old, on `flush()`, or
+        when the connection's context closes. Uncommitted writes hold the
+        database's write lock, so keep max_delay short. A timer thread flushes
+        them once due if the connection is idle, use `locked()` around work the
+        timer must not split. The sqlite3 connection must allow use from other
+        threads, as pooled connections of DBConnector do.
+
+        Args:
+            max_pending: Number of deferred commits which triggers a flush
+            max_delay: Seconds a deferred commit can wait before a flush
+        """
+        self.flush()
+        self._write_behind = _WriteBehind(max_pending=max_pending, max_delay=max_delay)
+
+    def disable_write_behind(self) -> None:
+        """Flush any deferred writes and return to committing on every write"""
+        self.flush()
+        self._write_behind = None
+
+    def add_flush_hook(self, hook: Callable[[int], None]) -> None:
+        """
+        Register a callback run after deferred writes are committed.
+
+        Args:
+            hook: Callable given the number of deferred commits made durable
+        """
+        self._flush_hooks.append(hook)
 
     def close(self) -> None:
         """Close database connection. Use with care, allow context to handle."""
+        if self.pending_writes:
+            self.flush()
         return self._dbconn.close()
 
+    def _flush_on_timer(self) -> None:
+        """Flush deferred writes once due. Runs on the write-behind timer thread."""
+        try:
+            with self._lock:
+                write_behind = self._write_behind
+                if write_behind is not None and write_behind.pending:
+                    self.flush()
+        except Exception:
+            logger.exception("Failed to flush deferred writes")
+
+    @staticmethod
+    def _cancel_timer(write_behind: _WriteBehind) -> None:
+        """Stop the timer of flushed or discarded writes."""
+        if write_behind.timer is not None:
+            write_behind.timer.cancel()
+            write_behind.timer = None
+
 
 class DBConnector:
     def __init__(
@@ -43,21 +206,46 @@ class DBConnector:
         user: str | None = None,
         password: str | None = None,
         port: int | None = None,
+        *,
+        pool_size: int = 5,
+        timeout: float | None = None,
+        pragmas: Mapping[str, str | int] | None = None,
     ) -> None:
         """
         Prepare a connection to the database with optional requirements.
 
+        Connections are pooled per database and are safe to use from any thread.
+        Each thread checks out its own connection, reused by nested calls on the
+        same thread. Released connections are kept open for reuse, up to
+        pool_size, except for in-memory databases which close when released.
+
         Args:
             url: URL to database
             user: Username to login to database
             password: Password to login to database
             port: Port open to database traffic
+            pool_size: Maximum connections checked out, per database, at once
+            timeout: Seconds to wait for a free connection, None waits forever
+            pragmas: PRAGMA statements run on every new connection. Defaults
+                to DEFAULT_PRAGMAS, pass an empty mapping to run none.
         """
         self.url = url
         self.user = user
         self.password = password
         self.port = port
-        self._active: dict[str, _ActiveConnections] = {}
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+
+        for name in self.pragmas:
+            if not name.isidentifier():
+                raise ValueError(f"Invalid pragma name '{name}'")
+
+        self._lock = threading.Lock()
+        self._active: dict[str, dict[int, _ActiveConnections]] = {}
+        self._idle: dict[str, list[sqlite3.Connection]] = {}
+        self._slots: dict[str, threading.BoundedSemaphore] = {}
+        self._stats: dict[str, PoolStats] = {}
 
     @contextlib.contextmanager
     def get_connection(
@@ -72,20 +260,146 @@ class DBConnector:
 
         Yields:
             SQL Database connection.
+
+        Raises:
+            TimeoutError: No connection became free within timeout
         """
-        if database_name not in self._active:
-            self._active[database_name] = _ActiveConnections(
-                connection=sqlite3.connect(database_name),
-                count=1,
+        active = self._checkout(database_name)
+        dbconnection = DBConnection(active.connection)
+        try:
+            yield dbconnection
+
+        finally:
+            if dbconnection.pending_writes:
+                dbconnection.flush()
+            self._release(database_name)
+
+    def get_stats(self, database_name: str) -> PoolStats:
+        """
+        Return a snapshot of pool usage for a database.
+
+        Args:
+            database_name: Name of database
+
+        Returns:
+            PoolStats, all zero for a database never opened
+        """
+        with self._lock:
+            return dataclasses.replace(self._stats.get(database_name, PoolStats()))
+
+    def close_idle(self) -> None:
+        """Close all idle pooled connections. Connections in use are unaffected."""
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle.clear()
+            for stats in self._stats.values():
+                stats.idle = 0
+
+        for connection in idle:
+            connection.close()
+
+    def _checkout(self, database_name: str) -> _ActiveConnections:
+        """Return this thread's connection, waiting for a free slot if needed."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            active = self._active.get(database_name, {}).get(thread_id)
+            if active is not None:
+                active.count += 1
+                return active
+
+            slots = self._slots.setdefault(
+                database_name,
+                threading.BoundedSemaphore(self.pool_size),
             )
-        else:
-            self._active[database_name].count += 1
+            stats = self._stats.setdefault(database_name, PoolStats())
+
+        waited = 0.0
+        if not slots.acquire(blocking=False):
+            start = time.perf_counter()
+            if not slots.acquire(timeout=self.timeout):
+                raise TimeoutError(f"No free connection to '{database_name}'")
+            waited = time.perf_counter() - start
 
         try:
-            yield DBConnection(self._active[database_name].connection)
+            with self._lock:
+                idle = self._idle.get(database_name)
+                connection = idle.pop() if idle else None
 
-        finally:
-            self._active[database_name].count -= 1
-            if not self._active[database_name].count:
-                self._active[database_name].connection.close()
+            if connection is None:
+                connection = self._open(database_name)
+                opened = 1
+            else:
+                opened = 0
+
+        except Exception:
+            slots.release()
+            raise
+
+        with self._lock:
+            active = _ActiveConnections(connection=connection, count=1)
+            self._active.setdefault(database_name, {})[thread_id] = active
+            stats.opened += opened
+            stats.checkouts += 1
+            stats.waits += bool(waited)
+            stats.wait_time += waited
+            stats.max_wait = max(stats.max_wait, waited)
+            stats.in_use += 1
+            stats.idle = len(self._idle.get(database_name, []))
+        return active
+
+    def _release(self, database_name: str) -> None:
+        """Release this thread's connection once it is no longer nested."""
+        thread_id = threading.get_ident()
+        with self._lock:
+            connections = self._active[database_name]
+            active = connections[thread_id]
+            active.count -= 1
+            if active.count:
+                return None
+
+            del connections[thread_id]
+            if not connections:
                 self._active.pop(database_name, None)
+
+            idle = self._idle.setdefault(database_name, [])
+            keep = database_name != MEMORY_DATABASE and len(idle) < self.pool_size
+            if keep:
+                # Never hand uncommitted work to the next thread
+                if active.connection.in_transaction:
+                    active.connection.rollback()
+                idle.append(active.connection)
+
+            stats = self._stats[database_name]
+            stats.in_use -= 1
+            stats.idle = len(idle)
+
+        if not keep:
+            active.connection.close()
+        self._slots[database_name].release()
+
+    def _open(self, database_name: str) -> sqlite3.Connection:
+        """Open a new connection and apply pragmas."""
+        # Connections move between threads but are only ever used by one at a time
+        connection = sqlite3.connect(
+            database_name,
+            timeout=_BUSY_TIMEOUT,
+            check_same_thread=False,
+        )
+        for name, value in self.pragmas.items():
+            self._pragma(connection, f"PRAGMA {name}={value}")
+        return connection
+
+    @staticmethod
+    def _pragma(connection: sqlite3.Connection, statement: str) -> None:
+        """Run a pragma, retrying while another connection holds the lock."""
+        # Switching journal mode fails at once rather than waiting on the
+        # busy timeout, as when two connections open a new database together
+        deadline = time.monotonic() + _BUSY_TIMEOUT
+        while True:
+            try:
+                connection.execute(statement).fetchall()
+                return None
+            except sqlite3.OperationalError as err:
+                if "locked" not in str(err) or time.monotonic() >= deadline:
+                    raise
+            time.sleep(0.01)
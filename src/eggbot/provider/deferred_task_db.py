@@ -2,11 +2,131 @@ from __future__ import annotations
 
 import datetime
 from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import Sequence
 from uuid import uuid4
 
+from eggbot.model.db_store_intfc import ArchiveCallback
 from eggbot.model.db_store_intfc import DBStoreIntfc
 from eggbot.model.deferred_task import DeferredTask
+from eggbot.model.deferred_task import STATUS_DEAD
+from eggbot.model.deferred_task import STATUS_DONE
+from eggbot.model.deferred_task import STATUS_PENDING
 from eggbot.provider.db_connector import DBConnection
+from eggbot.provider.schema_migration import migrate
+from eggbot.provider.schema_migration import Migration
+from eggbot.provider.schema_migration import to_epoch_sql
+from eggbot.util.time_util import TimeUtil
+
+_MIGRATIONS = (
+    Migration(
+        version=1,
+        statements=(
+            (
+                "CREATE TABLE IF NOT EXISTS deferred_task (uid TEXT PRIMARY KEY, "
+                "created_at TEXT, retry_at TEXT, event_type TEXT, "
+                "event TEXT, attempts INT)"
+            ),
+        ),
+    ),
+    Migration(
+        version=2,
+        statements=(
+            (
+                "CREATE INDEX IF NOT EXISTS deferred_task_event_type_retry_at "
+                "ON deferred_task (event_type, retry_at)"
+            ),
+        ),
+    ),
+    Migration(
+        version=3,
+        statements=(
+            (
+                "ALTER TABLE deferred_task "
+                f"ADD COLUMN status TEXT NOT NULL DEFAULT '{STATUS_PENDING}'"
+            ),
+            "ALTER TABLE deferred_task ADD COLUMN finished_at TEXT",
+            (
+                "CREATE INDEX IF NOT EXISTS deferred_task_status_retry_at "
+                "ON deferred_task (status, retry_at)"
+            ),
+        ),
+    ),
+    Migration(
+        version=4,
+        statements=(
+            "ALTER TABLE deferred_task ADD COLUMN lease_owner TEXT",
+            "ALTER TABLE deferred_task ADD COLUMN lease_until TEXT",
+            (
+                "CREATE INDEX IF NOT EXISTS deferred_task_status_lease_until "
+                "ON deferred_task (status, lease_until)"
+            ),
+        ),
+    ),
+    Migration(
+        version=5,
+        statements=(
+            # Replaced by event_type_created_at, which also serves keyset pagination
+            "DROP INDEX IF EXISTS deferred_task_event_type_retry_at",
+            (
+                "CREATE INDEX IF NOT EXISTS deferred_task_created_at "
+                "ON deferred_task (created_at, uid)"
+            ),
+            (
+                "CREATE INDEX IF NOT EXISTS deferred_task_event_type_created_at "
+                "ON deferred_task (event_type, created_at, uid)"
+            ),
+        ),
+    ),
+    Migration(
+        version=6,
+        statements=(
+            # Rebuild with timestamps stored as integer microseconds since the epoch
+            (
+                "CREATE TABLE deferred_task_v6 (uid TEXT PRIMARY KEY, "
+                "created_at INTEGER, retry_at INTEGER, event_type TEXT, event TEXT, "
+                f"attempts INT, status TEXT NOT NULL DEFAULT '{STATUS_PENDING}', "
+                "finished_at INTEGER, lease_owner TEXT, lease_until INTEGER)"
+            ),
+            (
+                "INSERT INTO deferred_task_v6 SELECT uid, "
+                f"{to_epoch_sql('created_at')}, {to_epoch_sql('retry_at')}, "
+                "event_type, event, attempts, status, "
+                f"{to_epoch_sql('finished_at')}, lease_owner, "
+                f"{to_epoch_sql('lease_until')} FROM deferred_task"
+            ),
+            "DROP TABLE deferred_task",
+            "ALTER TABLE deferred_task_v6 RENAME TO deferred_task",
+            (
+                "CREATE INDEX deferred_task_status_retry_at "
+                "ON deferred_task (status, retry_at)"
+            ),
+            (
+                "CREATE INDEX deferred_task_status_lease_until "
+                "ON deferred_task (status, lease_until)"
+            ),
+            (
+                "CREATE INDEX deferred_task_created_at "
+                "ON deferred_task (created_at, uid)"
+            ),
+            (
+                "CREATE INDEX deferred_task_event_type_created_at "
+                "ON deferred_task (event_type, created_at, uid)"
+            ),
+        ),
+    ),
+    Migration(
+        version=7,
+        statements=(
+            # Finished tasks are pruned oldest first
+            (
+                "CREATE INDEX deferred_task_status_finished_at "
+                "ON deferred_task (status, finished_at)"
+            ),
+        ),
+    ),
+)
 
 
 class DeferredTaskDB(DBStoreIntfc):
@@ -17,15 +137,8 @@ class DeferredTaskDB(DBStoreIntfc):
         self._init_table()
 
     def _init_table(self) -> None:
-        """Build table if needed"""
-        sql = (
-            "CREATE TABLE IF NOT EXISTS deferred_task (uid TEXT PRIMARY KEY, "
-            "created_at TEXT, retry_at TEXT, event_type TEXT, "
-            "event TEXT, attempts INT)"
-        )
-        with self.get_cursor() as cursor:
-            cursor.execute(sql)
-            self.dbconn.commit()
+        """Build table if needed and apply schema migrations"""
+        migrate(self.dbconn, "deferred_task", _MIGRATIONS)
 
     def row_count(self) -> int:
         """Return total rows in deferred task table"""
@@ -56,7 +169,49 @@ class DeferredTaskDB(DBStoreIntfc):
         )
 
         with self.get_cursor() as cursor:
-            cursor.execute(sql, (str(uuid4()), now, after, type_, event, 0))
+            cursor.execute(
+                sql,
+                (
+                    str(uuid4()),
+                    TimeUtil.to_epoch(now),
+                    TimeUtil.to_epoch(after),
+                    type_,
+                    event,
+                    0,
+                ),
+            )
+            self.dbconn.commit()
+
+    def save_many(
+        self,
+        events: Iterable[str],
+        type_: str = "default",
+        retry_after: int = 0,
+    ) -> None:
+        """
+        Save many deferred tasks to database in a single statement.
+
+        Args:
+            events: Serialized event payloads to event handlers
+            type_: Optional type classification of events
+            retry_after: Number of seconds to wait, from save, before retry is attempted
+
+        Returns:
+            None
+        """
+        now = datetime.datetime.utcnow()
+        created_at = TimeUtil.to_epoch(now)
+        retry_at = TimeUtil.to_epoch(now + datetime.timedelta(seconds=retry_after))
+        sql = (
+            "INSERT INTO deferred_task (uid, created_at, retry_at, event_type, event, "
+            "attempts) VALUES (?, ?, ?, ?, ?, ?)"
+        )
+        values = (
+            (str(uuid4()), created_at, retry_at, type_, event, 0) for event in events
+        )
+
+        with self.get_cursor() as cursor:
+            cursor.executemany(sql, values)
             self.dbconn.commit()
 
     def get(self, event_type: str | None = None) -> list[DeferredTask]:
@@ -77,6 +232,214 @@ class DeferredTaskDB(DBStoreIntfc):
             cursor.execute(sql, values)
             return self._to_model(cursor.fetchall())
 
+    def iter_all(
+        self,
+        event_type: str | None = None,
+        page_size: int = 500,
+    ) -> Iterator[DeferredTask]:
+        """
+        Stream deferred tasks from database, oldest first, in bounded memory
+
+        Args:
+            event_type: Optional filter by event type otherwise return all
+            page_size: Maximum number of rows read per query
+
+        Yields:
+            DeferredTask objects
+        """
+        where, values = (["event_type=?"], [event_type]) if event_type else ([], [])
+        for rows in self._iter_keyset("deferred_task", where, values, page_size):
+            yield from self._to_model(rows)
+
+    def get_due(
+        self,
+        now: datetime.datetime | None = None,
+        limit: int = 100,
+        event_types: Sequence[str] | None = None,
+    ) -> list[DeferredTask]:
+        """
+        Return pending tasks due for an attempt and not leased, oldest retry_at first
+
+        Args:
+            now: Point in time tasks are due by, defaults to utcnow
+            limit: Maximum number of tasks to return
+            event_types: Optional filter by event types otherwise return all types
+        """
+        where, values = self._due_clause(now or datetime.datetime.utcnow(), event_types)
+        sql = f"SELECT * FROM deferred_task WHERE {where} ORDER BY retry_at LIMIT ?"
+
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values + [limit])
+            return self._to_model(cursor.fetchall())
+
+    def claim(
+        self,
+        owner: str,
+        limit: int = 100,
+        lease_seconds: float = 300,
+        event_types: Sequence[str] | None = None,
+    ) -> list[DeferredTask]:
+        """
+        Atomically lease up to limit due tasks to owner.
+
+        Claimed tasks are not due to any other owner until the lease expires.
+        Expired leases are reclaimed. Safe across connections and processes.
+
+        Args:
+            owner: Unique name of the claiming worker
+            limit: Maximum number of tasks to claim
+            lease_seconds: Seconds the lease is held before it can be reclaimed
+            event_types: Optional filter by event types otherwise claim all types
+
+        Returns:
+            Claimed tasks, oldest retry_at first. Can be empty
+        """
+        now = datetime.datetime.utcnow()
+        until = TimeUtil.to_epoch(now + datetime.timedelta(seconds=lease_seconds))
+        where, values = self._due_clause(now, event_types)
+        update_sql = (
+            "UPDATE deferred_task SET lease_owner=?, lease_until=? WHERE uid IN "
+            f"(SELECT uid FROM deferred_task WHERE {where} ORDER BY retry_at LIMIT ?)"
+        )
+        select_sql = (
+            "SELECT * FROM deferred_task WHERE lease_owner=? AND lease_until=? "
+            "ORDER BY retry_at"
+        )
+
+        # Take the write lock up front so the due rows cannot change under us
+        self.dbconn.flush()
+        with self.get_cursor() as cursor:
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(update_sql, [owner, until] + values + [limit])
+                cursor.execute(select_sql, (owner, until))
+                rows = cursor.fetchall()
+                self.dbconn.flush()
+            except Exception:
+                self.dbconn.rollback()
+                raise
+
+        return self._to_model(rows)
+
+    def next_retry_at(
+        self,
+        after: datetime.datetime | None = None,
+    ) -> datetime.datetime | None:
+        """
+        Return the earliest time a pending task can become due
+
+        This is the earliest retry_at, or lease expiry of a leased task.
+
+        Args:
+            after: Optionally only consider times after this time
+
+        Returns:
+            Earliest time or None if no pending tasks exist
+        """
+        times = []
+        for column in ("retry_at", "lease_until"):
+            sql = f"SELECT MIN({column}) FROM deferred_task WHERE status=?"
+            values: list[Any] = [STATUS_PENDING]
+            if after is not None:
+                sql += f" AND {column}>?"
+                values.append(TimeUtil.to_epoch(after))
+
+            with self.get_cursor() as cursor:
+                cursor.execute(sql, values)
+                value = cursor.fetchone()[0]
+            if value is not None:
+                times.append(TimeUtil.from_epoch(value))
+
+        return min(times) if times else None
+
+    def reschedule(
+        self,
+        uid: str,
+        retry_at: datetime.datetime,
+        owner: str | None = None,
+    ) -> None:
+        """
+        Record a failed attempt, release any lease, and set when the task is next due
+
+        Args:
+            uid: UID of task
+            retry_at: Point in time the next attempt is due
+            owner: If given, only applied while owner holds the task's lease
+
+        Returns:
+            None
+        """
+        sql = (
+            "UPDATE deferred_task SET retry_at=?, attempts=attempts+1, "
+            "lease_owner=NULL, lease_until=NULL WHERE uid=?"
+        )
+        values: list[Any] = [TimeUtil.to_epoch(retry_at), uid]
+        if owner is not None:
+            sql += " AND lease_owner=?"
+            values.append(owner)
+
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values)
+            self.dbconn.commit()
+
+    def complete(self, uid: str, owner: str | None = None) -> None:
+        """
+        Mark task as done, it will no longer be due
+
+        Args:
+            uid: UID of task
+            owner: If given, only applied while owner holds the task's lease
+
+        Returns:
+            None
+        """
+        self._finish(uid, STATUS_DONE, attempted=False, owner=owner)
+
+    def dead_letter(self, uid: str, owner: str | None = None) -> None:
+        """
+        Record a final failed attempt and mark task as dead, it will no longer be due
+
+        Args:
+            uid: UID of task
+            owner: If given, only applied while owner holds the task's lease
+
+        Returns:
+            None
+        """
+        self._finish(uid, STATUS_DEAD, attempted=True, owner=owner)
+
+    def _finish(
+        self, uid: str, status: str, attempted: bool, owner: str | None
+    ) -> None:
+        """Set final status of a task"""
+        sql = (
+            "UPDATE deferred_task SET status=?, finished_at=?, attempts=attempts+? "
+            "WHERE uid=?"
+        )
+        finished_at = TimeUtil.to_epoch(datetime.datetime.utcnow())
+        values: list[Any] = [status, finished_at, int(attempted), uid]
+        if owner is not None:
+            sql += " AND lease_owner=?"
+            values.append(owner)
+
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values)
+            self.dbconn.commit()
+
+    def _due_clause(
+        self,
+        now: datetime.datetime,
+        event_types: Sequence[str] | None,
+    ) -> tuple[str, list[Any]]:
+        """Build WHERE clause and values selecting tasks due and not leased at now"""
+        where = "status=? AND retry_at<=? AND (lease_until IS NULL OR lease_until<=?)"
+        epoch = TimeUtil.to_epoch(now)
+        values: list[Any] = [STATUS_PENDING, epoch, epoch]
+        if event_types is not None:
+            where += f" AND event_type IN ({', '.join('?' * len(event_types))})"
+            values.extend(event_types)
+        return where, values
+
     def delete(self, uid: str) -> None:
         """
         Delete row from deferred_task table by uid
@@ -92,6 +455,36 @@ class DeferredTaskDB(DBStoreIntfc):
             cursor.execute(sql, (uid,))
             self.dbconn.commit()
 
+    def prune(
+        self,
+        before: datetime.datetime,
+        *,
+        statuses: Sequence[str] = (STATUS_DONE, STATUS_DEAD),
+        limit: int = 500,
+        archive: ArchiveCallback | None = None,
+    ) -> int:
+        """
+        Delete a chunk of tasks finished before a point in time
+
+        Each call is a single short transaction, call until less than limit
+        rows are deleted to prune all.
+
+        Args:
+            before: Tasks finished before this time are deleted
+            statuses: Final statuses of tasks deleted
+            limit: Maximum number of tasks deleted
+            archive: Given the tasks, as dicts by column, before they are deleted
+
+        Returns:
+            Number of tasks deleted
+        """
+        where = [
+            f"status IN ({', '.join('?' * len(statuses))})",
+            "finished_at<?",
+        ]
+        values = [*statuses, TimeUtil.to_epoch(before)]
+        return len(self._delete_chunk("deferred_task", where, values, limit, archive))
+
     def _to_model(self, rows: list[list[Any]]) -> list[DeferredTask]:
-        """Convert rows into DeferredTask model."""
+        """Convert rows into DeferredTask model. Values are decoded on access."""
         return [DeferredTask(*row) for row in rows]
@@ -1,31 +1,430 @@
 from __future__ import annotations
 
+import collections
+import dataclasses
 import datetime
+import difflib
+import json
+import re
+import threading
+import time
 from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
 from uuid import uuid4
 
+from eggbot.model.db_store_intfc import ArchiveCallback
 from eggbot.model.db_store_intfc import DBStoreIntfc
 from eggbot.model.moderation_action import ModerationAction
 from eggbot.provider.db_connector import DBConnection
+from eggbot.provider.schema_migration import migrate
+from eggbot.provider.schema_migration import Migration
+from eggbot.provider.schema_migration import to_epoch_sql
+from eggbot.util import metrics
+from eggbot.util.time_util import TimeUtil
+
+_HistoryKey = Tuple[str, Optional[bool]]
+_Rows = List[Any]
+
+# Periods counted by ModerationActionDB.count_by_period
+PERIODS = ("day", "week")
+
+_DAY_USEC = 86_400_000_000
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+# Statements run by triggers to count a row, as `new`, or uncount it, as `old`
+_TALLY_KEY = (
+    f"day={{row}}.created_at / {_DAY_USEC} "
+    "AND action={row}.action AND active={row}.active"
+)
+_TALLY_ADD = (
+    "INSERT INTO moderation_action_daily (day, action, active, total) "
+    f"VALUES ({{row}}.created_at / {_DAY_USEC}, {{row}}.action, {{row}}.active, 1) "
+    "ON CONFLICT (day, action, active) DO UPDATE SET total=total + 1;"
+)
+_TALLY_REMOVE = (
+    f"UPDATE moderation_action_daily SET total=total - 1 WHERE {_TALLY_KEY}; "
+    f"DELETE FROM moderation_action_daily WHERE {_TALLY_KEY} AND total=0;"
+)
+
+_MIGRATIONS = (
+    Migration(
+        version=1,
+        statements=(
+            (
+                "CREATE TABLE IF NOT EXISTS moderation_action (uid TEXT PRIMARY KEY, "
+                "created_at TEXT, updated_at TEXT, member_id TEXT, action TEXT, "
+                "original_note TEXT, current_note TEXT, active BOOL)"
+            ),
+        ),
+    ),
+    Migration(
+        version=2,
+        statements=(
+            (
+                "CREATE INDEX IF NOT EXISTS moderation_action_member_id_active "
+                "ON moderation_action (member_id, active)"
+            ),
+            (
+                "CREATE INDEX IF NOT EXISTS moderation_action_action "
+                "ON moderation_action (action)"
+            ),
+        ),
+    ),
+    Migration(
+        version=3,
+        statements=(
+            # Widen lookup indexes to also serve keyset pagination
+            "DROP INDEX IF EXISTS moderation_action_member_id_active",
+            (
+                "CREATE INDEX moderation_action_member_id_active "
+                "ON moderation_action (member_id, active, created_at, uid)"
+            ),
+            "DROP INDEX IF EXISTS moderation_action_action",
+            (
+                "CREATE INDEX moderation_action_action "
+                "ON moderation_action (action, created_at, uid)"
+            ),
+            (
+                "CREATE INDEX IF NOT EXISTS moderation_action_created_at "
+                "ON moderation_action (created_at, uid)"
+            ),
+        ),
+    ),
+    Migration(
+        version=4,
+        statements=(
+            # Rebuild with timestamps stored as integer microseconds since the epoch
+            (
+                "CREATE TABLE moderation_action_v4 (uid TEXT PRIMARY KEY, "
+                "created_at INTEGER, updated_at INTEGER, member_id TEXT, "
+                "action TEXT, original_note TEXT, current_note TEXT, active BOOL)"
+            ),
+            (
+                "INSERT INTO moderation_action_v4 SELECT uid, "
+                f"{to_epoch_sql('created_at')}, {to_epoch_sql('updated_at')}, "
+                "member_id, action, original_note, current_note, active "
+                "FROM moderation_action"
+            ),
+            "DROP TABLE moderation_action",
+            "ALTER TABLE moderation_action_v4 RENAME TO moderation_action",
+            (
+                "CREATE INDEX moderation_action_member_id_active "
+                "ON moderation_action (member_id, active, created_at, uid)"
+            ),
+            (
+                "CREATE INDEX moderation_action_action "
+                "ON moderation_action (action, created_at, uid)"
+            ),
+            (
+                "CREATE INDEX moderation_action_created_at "
+                "ON moderation_action (created_at, uid)"
+            ),
+        ),
+    ),
+    Migration(
+        version=5,
+        statements=(
+            # Append-only edits of current_note, each a delta from the one before
+            (
+                "CREATE TABLE moderation_action_revision (uid TEXT NOT NULL, "
+                "revision INTEGER NOT NULL, created_at INTEGER NOT NULL, "
+                "delta TEXT NOT NULL, PRIMARY KEY (uid, revision)) WITHOUT ROWID"
+            ),
+            (
+                "CREATE TRIGGER moderation_action_revision_delete "
+                "AFTER DELETE ON moderation_action BEGIN "
+                "DELETE FROM moderation_action_revision WHERE uid=old.uid; END"
+            ),
+            # Notes edited before now keep one revision, replacing the original
+            (
+                "INSERT INTO moderation_action_revision "
+                "SELECT uid, 1, updated_at, "
+                "json_array(-length(original_note), current_note) "
+                "FROM moderation_action WHERE current_note IS NOT original_note"
+            ),
+        ),
+    ),
+    Migration(
+        version=6,
+        statements=(
+            # Member totals in a time window are read from the index alone
+            "DROP INDEX IF EXISTS moderation_action_created_at",
+            (
+                "CREATE INDEX moderation_action_created_at "
+                "ON moderation_action (created_at, uid, member_id, action)"
+            ),
+            # Rows per UTC day, action, and active flag, kept current by triggers
+            (
+                "CREATE TABLE moderation_action_daily (day INTEGER NOT NULL, "
+                "action TEXT NOT NULL, active BOOL NOT NULL, total INTEGER NOT NULL, "
+                "PRIMARY KEY (day, action, active)) WITHOUT ROWID"
+            ),
+            (
+                "CREATE TRIGGER moderation_action_daily_insert "
+                "AFTER INSERT ON moderation_action BEGIN "
+                f"{_TALLY_ADD.format(row='new')} END"
+            ),
+            (
+                "CREATE TRIGGER moderation_action_daily_delete "
+                "AFTER DELETE ON moderation_action BEGIN "
+                f"{_TALLY_REMOVE.format(row='old')} END"
+            ),
+            (
+                "CREATE TRIGGER moderation_action_daily_update "
+                "AFTER UPDATE OF created_at, action, active ON moderation_action "
+                "WHEN old.created_at IS NOT new.created_at "
+                "OR old.action IS NOT new.action OR old.active IS NOT new.active "
+                f"BEGIN {_TALLY_REMOVE.format(row='old')} "
+                f"{_TALLY_ADD.format(row='new')} END"
+            ),
+            (
+                "INSERT INTO moderation_action_daily "
+                f"SELECT created_at / {_DAY_USEC}, action, active, COUNT(*) "
+                "FROM moderation_action GROUP BY 1, 2, 3"
+            ),
+        ),
+    ),
+    Migration(
+        version=7,
+        statements=(
+            # Inactive actions are pruned oldest first, active ones are never read
+            (
+                "CREATE INDEX moderation_action_inactive_created_at "
+                "ON moderation_action (created_at) WHERE active=0"
+            ),
+        ),
+    ),
+    Migration(
+        version=8,
+        statements=(
+            # Pages all of a member's actions in order, whatever their active flag
+            (
+                "CREATE INDEX moderation_action_member_id_created_at "
+                "ON moderation_action (member_id, created_at, uid)"
+            ),
+        ),
+    ),
+)
+
+# Full-text index of notes, kept in sync with moderation_action by triggers.
+# Versioned on its own as it is only created where SQLite has FTS5.
+_SEARCH_MIGRATIONS = (
+    Migration(
+        version=1,
+        statements=(
+            (
+                "CREATE VIRTUAL TABLE moderation_action_fts USING fts5("
+                "original_note, current_note, content='moderation_action', "
+                "content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')"
+            ),
+            (
+                "CREATE TRIGGER moderation_action_fts_insert "
+                "AFTER INSERT ON moderation_action BEGIN "
+                "INSERT INTO moderation_action_fts "
+                "(rowid, original_note, current_note) "
+                "VALUES (new.rowid, new.original_note, new.current_note); END"
+            ),
+            (
+                "CREATE TRIGGER moderation_action_fts_delete "
+                "AFTER DELETE ON moderation_action BEGIN "
+                "INSERT INTO moderation_action_fts "
+                "(moderation_action_fts, rowid, original_note, current_note) "
+                "VALUES ('delete', old.rowid, old.original_note, old.current_note); "
+                "END"
+            ),
+            (
+                "CREATE TRIGGER moderation_action_fts_update "
+                "AFTER UPDATE OF original_note, current_note ON moderation_action "
+                "BEGIN "
+                "INSERT INTO moderation_action_fts "
+                "(moderation_action_fts, rowid, original_note, current_note) "
+                "VALUES ('delete', old.rowid, old.original_note, old.current_note); "
+                "INSERT INTO moderation_action_fts "
+                "(rowid, original_note, current_note) "
+                "VALUES (new.rowid, new.original_note, new.current_note); END"
+            ),
+            # Index notes saved before the index existed
+            (
+                "INSERT INTO moderation_action_fts (moderation_action_fts) "
+                "VALUES ('rebuild')"
+            ),
+        ),
+    ),
+)
+
+# Marks around matched terms in search snippets
+SNIPPET_START = "["
+SNIPPET_END = "]"
+SNIPPET_TOKENS = 12
+# Characters either side of the match in snippets made without FTS5
+SNIPPET_CHARS = 40
+# Runs of whitespace or of anything else, note revisions are diffed by these
+_WORDS = re.compile(r"\s+|\S+")
+
+
+@dataclasses.dataclass
+class SearchResult:
+    """Moderation action matching a search, best match first"""
+
+    action: ModerationAction
+    rank: float  # Lower is a better match, 0.0 when unranked
+    snippet: str
+
+
+@dataclasses.dataclass(frozen=True)
+class NoteRevision:
+    """A version of a moderation action's note, revision 0 is the original"""
+
+    revision: int
+    created_at: datetime.datetime
+    note: str
+
+
+@dataclasses.dataclass
+class ActiveCounts:
+    """Number of active and inactive moderation actions"""
+
+    active: int = 0
+    inactive: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.active + self.inactive
+
+
+@dataclasses.dataclass
+class HistoryCacheStats:
+    """Usage of the member history cache"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    size: int = 0
+
+
+class _HistoryCache:
+    """
+    Thread-safe LRU cache, with expiry, of member history rows.
+
+    Keeps which member each cached row belongs to, so a change to a row by uid
+    invalidates only that member's entries.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: collections.OrderedDict[
+            _HistoryKey, tuple[float, _Rows]
+        ] = collections.OrderedDict()
+        self._keys_by_member: dict[str, set[_HistoryKey]] = {}
+        # Member of each uid in a cached entry, and how many entries hold it
+        self._member_by_uid: dict[str, str] = {}
+        self._uid_refs: collections.Counter[str] = collections.Counter()
+        self._stats = HistoryCacheStats()
+        self._lock = threading.Lock()
+
+    def get(self, key: _HistoryKey) -> _Rows | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: _HistoryKey, rows: _Rows) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, rows)
+            self._keys_by_member.setdefault(key[0], set()).add(key)
+            for row in rows:
+                self._member_by_uid[row[0]] = key[0]
+                self._uid_refs[row[0]] += 1
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self._stats.evictions += 1
+
+    def member_of(self, uid: str) -> str | None:
+        """Return the member of a uid, if the uid is in a cached entry."""
+        with self._lock:
+            return self._member_by_uid.get(uid)
+
+    def invalidate(self, member_id: str) -> None:
+        """Remove every entry of a member."""
+        with self._lock:
+            keys = self._keys_by_member.get(member_id, set())
+            self._stats.invalidations += len(keys)
+            for key in list(keys):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_member.clear()
+            self._member_by_uid.clear()
+            self._uid_refs.clear()
+
+    def stats(self) -> HistoryCacheStats:
+        with self._lock:
+            return dataclasses.replace(self._stats, size=len(self._entries))
+
+    def _remove(self, key: _HistoryKey) -> None:
+        """Remove an entry and the uids only it holds. Hold lock."""
+        _, rows = self._entries.pop(key)
+        keys = self._keys_by_member[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys_by_member[key[0]]
+
+        for row in rows:
+            self._uid_refs[row[0]] -= 1
+            if not self._uid_refs[row[0]]:
+                del self._uid_refs[row[0]]
+                del self._member_by_uid[row[0]]
 
 
 class ModerationActionDB(DBStoreIntfc):
-    def __init__(self, db_connection: DBConnection) -> None:
-        """CRUD method layer for Moderation Action table"""
+    def __init__(
+        self,
+        db_connection: DBConnection,
+        *,
+        cache_size: int = 0,
+        cache_ttl: float = 60.0,
+    ) -> None:
+        """
+        CRUD method layer for Moderation Action table
+
+        Args:
+            db_connection: Connection to the database
+            cache_size: Number of (member_id, active) results of `get_by_id` kept
+                in memory. Writes through this provider keep cached results
+                current. Disabled when 0
+            cache_ttl: Seconds a cached result is used, bounds how long writes
+                made through other connections go unseen
+        """
         self.dbconn = db_connection
+        self._cache = _HistoryCache(cache_size, cache_ttl) if cache_size else None
 
         self._init_table()
 
     def _init_table(self) -> None:
-        """Build table if needed"""
-        sql = (
-            "CREATE TABLE IF NOT EXISTS moderation_action (uid TEXT PRIMARY KEY, "
-            "created_at TEXT, updated_at TEXT, member_id TEXT, action TEXT, "
-            "original_note TEXT, current_note TEXT, active BOOL)"
-        )
-        with self.get_cursor() as cursor:
-            cursor.execute(sql)
-            self.dbconn.commit()
+        """Build table if needed and apply schema migrations"""
+        migrate(self.dbconn, "moderation_action", _MIGRATIONS)
+        self.has_search_index = has_fts5(self.dbconn)
+        if self.has_search_index:
+            migrate(self.dbconn, "moderation_action_fts", _SEARCH_MIGRATIONS)
 
     def row_count(self) -> int:
         """Return total rows in moderation action table"""
@@ -46,7 +445,7 @@ class ModerationActionDB(DBStoreIntfc):
         Returns:
             None
         """
-        now = datetime.datetime.utcnow()
+        now = TimeUtil.to_epoch(datetime.datetime.utcnow())
         sql = (
             "INSERT INTO moderation_action (uid, created_at, updated_at, member_id, "
             "action, original_note, current_note, active) "
@@ -68,6 +467,41 @@ class ModerationActionDB(DBStoreIntfc):
                 ),
             )
             self.dbconn.commit()
+        self._invalidate(member_id)
+
+    def save_many(
+        self,
+        events: Iterable[str],
+        *,
+        member_id: str = "egg",
+        action: str = "note",
+    ) -> None:
+        """
+        Save many moderation actions to database in a single statement.
+
+        Args:
+            events: Reasons for moderation actions
+            member_id: ID of member actions noted on. Default to 'egg', a catch-all id
+            action: Type of action take, defaults to 'note' action
+
+        Returns:
+            None
+        """
+        now = TimeUtil.to_epoch(datetime.datetime.utcnow())
+        sql = (
+            "INSERT INTO moderation_action (uid, created_at, updated_at, member_id, "
+            "action, original_note, current_note, active) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        )
+        values = (
+            (str(uuid4()), now, now, member_id, action, event, event, True)
+            for event in events
+        )
+
+        with self.get_cursor() as cursor:
+            cursor.executemany(sql, values)
+            self.dbconn.commit()
+        self._invalidate(member_id)
 
     def get(self, action: str | None = None) -> list[ModerationAction]:
         """
@@ -105,6 +539,15 @@ class ModerationActionDB(DBStoreIntfc):
         Returns:
             List of ModerationAction objects discovered, can be empty
         """
+        key = (member_id, active)
+        if self._cache is not None:
+            rows = self._cache.get(key)
+            result = "miss" if rows is None else "hit"
+            metrics.registry.inc("eggbot_db_cache_total", 1, result=result)
+            if rows is not None:
+                # New models each call, callers cannot change what is cached
+                return self._to_model(rows)
+
         if active is not None:
             sql = "SELECT * FROM moderation_action WHERE active=? and member_id=?"
             values = [active, member_id]
@@ -114,7 +557,229 @@ class ModerationActionDB(DBStoreIntfc):
 
         with self.get_cursor() as cursor:
             cursor.execute(sql, values)
-            return self._to_model(cursor.fetchall())
+            rows = cursor.fetchall()
+
+        if self._cache is not None:
+            self._cache.put(key, rows)
+        return self._to_model(rows)
+
+    def iter_all(
+        self,
+        action: str | None = None,
+        page_size: int = 500,
+    ) -> Iterator[ModerationAction]:
+        """
+        Stream moderation actions from database, oldest first, in bounded memory
+
+        Args:
+            action: Optional filter as to the type of action to return
+            page_size: Maximum number of rows read per query
+
+        Yields:
+            ModerationAction objects
+        """
+        where, values = (["action=?"], [action]) if action else ([], [])
+        for rows in self._iter_keyset("moderation_action", where, values, page_size):
+            yield from self._to_model(rows)
+
+    def iter_by_id(
+        self,
+        member_id: str,
+        active: bool | None = None,
+        page_size: int = 500,
+    ) -> Iterator[ModerationAction]:
+        """
+        Stream moderation actions of a member, oldest first, in bounded memory
+
+        Args:
+            member_id: Member ID to return
+            active: If true or false, filter by (in)active actions else all actions
+            page_size: Maximum number of rows read per query
+
+        Yields:
+            ModerationAction objects
+        """
+        where: list[str] = ["member_id=?"]
+        values: list[Any] = [member_id]
+        if active is not None:
+            where.append("active=?")
+            values.append(active)
+
+        for rows in self._iter_keyset("moderation_action", where, values, page_size):
+            yield from self._to_model(rows)
+
+    def count_by_action(
+        self,
+        since: datetime.date | None = None,
+        until: datetime.date | None = None,
+        active: bool | None = None,
+    ) -> dict[str, int]:
+        """
+        Count moderation actions by type of action, read from daily totals
+
+        Args:
+            since: First UTC day counted, else from the oldest action
+            until: UTC day counting stops before, else to the newest action
+            active: If true or false, count (in)active actions else all actions
+
+        Returns:
+            Number of actions by type of action, types without actions omitted
+        """
+        sql, values = self._daily_sql("action", since, until, active=active)
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values)
+            return dict(cursor.fetchall())
+
+    def count_by_period(
+        self,
+        period: str = "day",
+        since: datetime.date | None = None,
+        until: datetime.date | None = None,
+        action: str | None = None,
+    ) -> dict[datetime.date, int]:
+        """
+        Count moderation actions by UTC day or week, read from daily totals
+
+        Args:
+            period: One of PERIODS, weeks start on Monday
+            since: First UTC day counted, else from the oldest action
+            until: UTC day counting stops before, else to the newest action
+            action: Optional filter as to the type of action to count
+
+        Returns:
+            Number of actions by first day of period, oldest first. Periods
+            without actions are omitted
+
+        Raises:
+            ValueError: When period is not one of PERIODS
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Period must be one of {PERIODS}, not '{period}'")
+        # The epoch was a Thursday, three days into its week
+        start = "day" if period == "day" else "day - (day + 3) % 7"
+        sql, values = self._daily_sql(start, since, until, action=action)
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values)
+            return {
+                datetime.date.fromordinal(day + _EPOCH_ORDINAL): total
+                for day, total in cursor.fetchall()
+            }
+
+    def count_active(
+        self,
+        since: datetime.date | None = None,
+        until: datetime.date | None = None,
+        action: str | None = None,
+    ) -> ActiveCounts:
+        """
+        Count active and inactive moderation actions, read from daily totals
+
+        Args:
+            since: First UTC day counted, else from the oldest action
+            until: UTC day counting stops before, else to the newest action
+            action: Optional filter as to the type of action to count
+
+        Returns:
+            Active and inactive totals
+        """
+        sql, values = self._daily_sql("active", since, until, action=action)
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values)
+            totals = dict(cursor.fetchall())
+        return ActiveCounts(active=totals.get(1, 0), inactive=totals.get(0, 0))
+
+    def count_by_member(self, active: bool | None = None) -> dict[str, int]:
+        """
+        Count moderation actions by member, read from the member index
+
+        Args:
+            active: If true or false, count (in)active actions else all actions
+
+        Returns:
+            Number of actions by member id, members without actions omitted
+        """
+        if active is not None:
+            sql = (
+                "SELECT member_id, COUNT(*) FROM moderation_action "
+                "WHERE active=? GROUP BY member_id"
+            )
+            values: list[Any] = [active]
+        else:
+            sql = "SELECT member_id, COUNT(*) FROM moderation_action GROUP BY member_id"
+            values = []
+
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values)
+            return dict(cursor.fetchall())
+
+    def top_offenders(
+        self,
+        since: datetime.datetime,
+        until: datetime.datetime | None = None,
+        *,
+        action: str | None = None,
+        limit: int = 10,
+    ) -> list[tuple[str, int]]:
+        """
+        Return members with the most moderation actions in a time window
+
+        Only index entries within the window are read.
+
+        Args:
+            since: Start of window, inclusive
+            until: End of window, exclusive, else to the newest action
+            action: Optional filter as to the type of action to count
+            limit: Maximum number of members returned
+
+        Returns:
+            Member ids and their number of actions, most first, ties by member id
+        """
+        where = ["created_at>=?"]
+        values: list[Any] = [TimeUtil.to_epoch(since)]
+        if until is not None:
+            where.append("created_at<?")
+            values.append(TimeUtil.to_epoch(until))
+        if action is not None:
+            where.append("action=?")
+            values.append(action)
+
+        # Unary + keeps the member index, which skips sorting for GROUP BY but
+        # reads every row, from being picked over the window's range scan
+        sql = (
+            "SELECT member_id, COUNT(*) AS total FROM moderation_action "
+            f"WHERE {' AND '.join(where)} GROUP BY +member_id "
+            "ORDER BY total DESC, member_id LIMIT ?"
+        )
+        values.append(limit)
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values)
+            return [(member_id, total) for member_id, total in cursor.fetchall()]
+
+    @staticmethod
+    def _daily_sql(
+        group: str,
+        since: datetime.date | None,
+        until: datetime.date | None,
+        **equals: Any,
+    ) -> tuple[str, list[Any]]:
+        """Build a query of daily totals summed by group, ordered by group."""
+        where: list[str] = []
+        values: list[Any] = []
+        if since is not None:
+            where.append("day>=?")
+            values.append(since.toordinal() - _EPOCH_ORDINAL)
+        if until is not None:
+            where.append("day<?")
+            values.append(until.toordinal() - _EPOCH_ORDINAL)
+        for column, value in equals.items():
+            if value is not None:
+                where.append(f"{column}=?")
+                values.append(value)
+
+        sql = f"SELECT {group}, SUM(total) FROM moderation_action_daily"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        return f"{sql} GROUP BY 1 ORDER BY 1", values
 
     def update(self, uid: str, event: str) -> None:
         """
@@ -127,12 +792,62 @@ class ModerationActionDB(DBStoreIntfc):
         Returns:
             None
         """
-        now = datetime.datetime.utcnow()
-        sql = "UPDATE moderation_action SET current_note=?, updated_at=? WHERE uid=?"
-        values = (event, now, uid)
+        now = TimeUtil.to_epoch(datetime.datetime.utcnow())
+        select_sql = "SELECT current_note FROM moderation_action WHERE uid=?"
+        revision_sql = (
+            "INSERT INTO moderation_action_revision "
+            "(uid, revision, created_at, delta) "
+            "SELECT ?, COALESCE(MAX(revision), 0) + 1, ?, ? "
+            "FROM moderation_action_revision WHERE uid=?"
+        )
+        update_sql = (
+            "UPDATE moderation_action SET current_note=?, updated_at=? WHERE uid=?"
+        )
+        # Take the write lock up front so a concurrent edit cannot be lost
+        self.dbconn.flush()
         with self.get_cursor() as cursor:
-            cursor.execute(sql, values)
-            self.dbconn.commit()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(select_sql, (uid,))
+                row = cursor.fetchone()
+                if row is not None:
+                    if row[0] != event:
+                        delta = encode_delta(row[0], event)
+                        cursor.execute(revision_sql, (uid, now, delta, uid))
+                    cursor.execute(update_sql, (event, now, uid))
+                self.dbconn.flush()
+            except Exception:
+                self.dbconn.rollback()
+                raise
+
+        if row is not None:
+            self._invalidate_uid(uid)
+
+    def get_history(self, uid: str) -> list[NoteRevision]:
+        """
+        Return every version of a moderation action's note, oldest first.
+
+        Args:
+            uid: UID of moderation action
+
+        Returns:
+            The original note then each edit, empty if the action does not exist
+        """
+        return self._replay(uid, None)
+
+    def get_note_as_of(self, uid: str, at: datetime.datetime) -> str | None:
+        """
+        Return a moderation action's note as it was at a point in time.
+
+        Args:
+            uid: UID of moderation action
+            at: UTC point in time
+
+        Returns:
+            The note, None if the action did not exist at that time
+        """
+        history = self._replay(uid, TimeUtil.to_epoch(at))
+        return history[-1].note if history else None
 
     def delete(self, uid: str) -> None:
         """
@@ -148,6 +863,7 @@ class ModerationActionDB(DBStoreIntfc):
         with self.get_cursor() as cursor:
             cursor.execute(sql, (uid,))
             self.dbconn.commit()
+        self._invalidate_uid(uid)
 
     def deactivate(self, uid: str) -> None:
         """
@@ -164,7 +880,316 @@ class ModerationActionDB(DBStoreIntfc):
         with self.get_cursor() as cursor:
             cursor.execute(sql, values)
             self.dbconn.commit()
+        # The row moves to the inactive results, which may not hold it yet
+        self._invalidate_uid(uid, lookup=True)
+
+    def prune(
+        self,
+        before: datetime.datetime,
+        *,
+        limit: int = 500,
+        archive: ArchiveCallback | None = None,
+    ) -> int:
+        """
+        Delete a chunk of inactive moderation actions created before a point in time
+
+        Each call is a single short transaction, call until less than limit
+        rows are deleted to prune all. Note history, search index, and daily
+        totals of deleted actions are removed with them.
+
+        Args:
+            before: Inactive actions created before this time are deleted
+            limit: Maximum number of actions deleted
+            archive: Given the actions, as dicts by column, before they are deleted
+
+        Returns:
+            Number of actions deleted
+        """
+        where = ["active=0", "created_at<?"]
+        values = [TimeUtil.to_epoch(before)]
+        rows = self._delete_chunk("moderation_action", where, values, limit, archive)
+        for member_id in {row[3] for row in rows}:
+            self._invalidate(member_id)
+        return len(rows)
+
+    def search(
+        self,
+        query: str,
+        member_id: str | None = None,
+        limit: int = 25,
+    ) -> list[SearchResult]:
+        """
+        Search original and current notes for every word of a query.
+
+        Words are matched whole, ignoring case and accents. End a word with `*`
+        to match it as a prefix. Results are ranked by relevance. Where SQLite
+        lacks FTS5, words are matched as substrings and results are newest first.
+
+        Args:
+            query: Words to search for
+            member_id: Optional filter to a single member's actions
+            limit: Maximum number of results to return
+
+        Returns:
+            Matching actions with a snippet of the best matching note, can be empty
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        if not self.has_search_index:
+            return self._search_scan(terms, member_id, limit)
+
+        # Quote each word so no input is read as FTS5 query syntax
+        phrases = []
+        for term in terms:
+            prefix = term.endswith("*") and len(term) > 1
+            phrase = '"{}"'.format(term.rstrip("*").replace('"', '""'))
+            phrases.append(f"{phrase}*" if prefix else phrase)
+
+        sql = (
+            "SELECT moderation_action.*, bm25(moderation_action_fts), "
+            "snippet(moderation_action_fts, -1, ?, ?, '...', ?) "
+            "FROM moderation_action_fts JOIN moderation_action "
+            "ON moderation_action.rowid = moderation_action_fts.rowid "
+            "WHERE moderation_action_fts MATCH ?"
+        )
+        values: list[Any] = [
+            SNIPPET_START,
+            SNIPPET_END,
+            SNIPPET_TOKENS,
+            " ".join(phrases),
+        ]
+        if member_id is not None:
+            sql += " AND moderation_action.member_id=?"
+            values.append(member_id)
+        sql += " ORDER BY bm25(moderation_action_fts) LIMIT ?"
+        values.append(limit)
+
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values)
+            rows = cursor.fetchall()
+
+        return [
+            SearchResult(ModerationAction(*row[:-2]), row[-2], row[-1]) for row in rows
+        ]
+
+    def rebuild_search_index(self) -> None:
+        """
+        Rebuild the full-text index from the table.
+
+        Needed only if rowids change, which a full VACUUM may do.
+        """
+        if not self.has_search_index:
+            return
+        sql = (
+            "INSERT INTO moderation_action_fts (moderation_action_fts) "
+            "VALUES ('rebuild')"
+        )
+        with self.get_cursor() as cursor:
+            cursor.execute(sql)
+            self.dbconn.commit()
+
+    def vacuum(self) -> int:
+        """
+        Rewrite the whole database file, see DBStoreIntfc.vacuum.
+
+        The full-text index is rebuilt after, as VACUUM may renumber rowids.
+
+        Returns:
+            Number of bytes released
+        """
+        released = super().vacuum()
+        self.rebuild_search_index()
+        return released
+
+    def _search_scan(
+        self,
+        terms: list[str],
+        member_id: str | None,
+        limit: int,
+    ) -> list[SearchResult]:
+        """Search by substring, scanning every note. Used without FTS5."""
+        words = [term.rstrip("*") or term for term in terms]
+        where: list[str] = []
+        values: list[Any] = []
+        for word in words:
+            escaped = word.replace("\\", "\\\\").replace("%", "\\%")
+            pattern = "%{}%".format(escaped.replace("_", "\\_"))
+            where.append(
+                "(original_note LIKE ? ESCAPE '\\' OR current_note LIKE ? ESCAPE '\\')"
+            )
+            values.extend((pattern, pattern))
+        if member_id is not None:
+            where.append("member_id=?")
+            values.append(member_id)
+
+        sql = (
+            f"SELECT * FROM moderation_action WHERE {' AND '.join(where)} "
+            "ORDER BY created_at DESC, uid LIMIT ?"
+        )
+        with self.get_cursor() as cursor:
+            cursor.execute(sql, values + [limit])
+            actions = self._to_model(cursor.fetchall())
+
+        return [
+            SearchResult(action, 0.0, _scan_snippet(action, words))
+            for action in actions
+        ]
+
+    def _replay(self, uid: str, until: int | None) -> list[NoteRevision]:
+        """Rebuild each version of a note, up to an epoch time if given."""
+        action_sql = "SELECT created_at, original_note FROM moderation_action "
+        action_sql += "WHERE uid=?"
+        revision_sql = (
+            "SELECT revision, created_at, delta FROM moderation_action_revision "
+            "WHERE uid=?"
+        )
+        values: list[Any] = [uid]
+        if until is not None:
+            action_sql += " AND created_at<=?"
+            revision_sql += " AND created_at<=?"
+            values.append(until)
+        revision_sql += " ORDER BY revision"
+
+        with self.get_cursor() as cursor:
+            cursor.execute(action_sql, values)
+            action = cursor.fetchone()
+            if action is None:
+                return []
+            cursor.execute(revision_sql, values)
+            revisions = cursor.fetchall()
+
+        note = action[1]
+        history = [NoteRevision(0, TimeUtil.from_epoch(action[0]), note)]
+        for revision, created_at, delta in revisions:
+            note = apply_delta(note, delta)
+            history.append(
+                NoteRevision(revision, TimeUtil.from_epoch(created_at), note)
+            )
+        return history
+
+    def get_cache_stats(self) -> HistoryCacheStats:
+        """Return a snapshot of member history cache usage, zeros if disabled."""
+        return self._cache.stats() if self._cache else HistoryCacheStats()
+
+    def clear_cache(self) -> None:
+        """Empty the member history cache, use after writes by other means."""
+        if self._cache is not None:
+            self._cache.clear()
+
+    def _invalidate(self, member_id: str) -> None:
+        """Drop cached results of a member."""
+        if self._cache is not None:
+            self._cache.invalidate(member_id)
+
+    def _invalidate_uid(self, uid: str, lookup: bool = False) -> None:
+        """
+        Drop cached results of the member owning uid.
+
+        Args:
+            uid: UID of row changed
+            lookup: Query the member if no cached result holds the row
+        """
+        if self._cache is None:
+            return
+        member_id = self._cache.member_of(uid)
+        if member_id is None and lookup:
+            sql = "SELECT member_id FROM moderation_action WHERE uid=?"
+            with self.get_cursor() as cursor:
+                cursor.execute(sql, (uid,))
+                row = cursor.fetchone()
+            member_id = row[0] if row else None
+        if member_id is not None:
+            self._cache.invalidate(member_id)
 
     def _to_model(self, rows: list[list[Any]]) -> list[ModerationAction]:
-        """Convert rows into DeferredTask model."""
-        return [ModerationAction.from_row(*row) for row in rows]
+        """Convert rows into ModerationAction model. Values are decoded on access."""
+        return [ModerationAction(*row) for row in rows]
+
+
+def encode_delta(old: str, new: str) -> str:
+    """
+    Encode the changes from one note to the next as a compact JSON list.
+
+    Each item is applied to the old note in order. A positive number copies
+    that many characters, a negative number skips that many characters, and a
+    string is inserted.
+
+    Args:
+        old: Previous note
+        new: Next note
+
+    Returns:
+        Delta for `apply_delta`
+    """
+    # Compared word by word, edits to notes are to words not characters
+    old_words = _WORDS.findall(old)
+    new_words = _WORDS.findall(new)
+    delta: list[int | str] = []
+    matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        length = sum(len(word) for word in old_words[old_start:old_end])
+        if tag == "equal":
+            delta.append(length)
+            continue
+        if length:
+            delta.append(-length)
+        if new_end > new_start:
+            delta.append("".join(new_words[new_start:new_end]))
+    return json.dumps(delta, separators=(",", ":"))
+
+
+def apply_delta(old: str, delta: str) -> str:
+    """
+    Apply a delta made by `encode_delta` to the previous note.
+
+    Args:
+        old: Previous note
+        delta: Encoded changes
+
+    Returns:
+        Next note
+    """
+    parts: list[str] = []
+    position = 0
+    for item in json.loads(delta):
+        if isinstance(item, str):
+            parts.append(item)
+        elif item > 0:
+            parts.append(old[position : position + item])
+            position += item
+        else:
+            position -= item
+    return "".join(parts)
+
+
+def has_fts5(dbconn: DBConnection) -> bool:
+    """Return True if the SQLite library was built with FTS5."""
+    cursor = dbconn.cursor()
+    try:
+        cursor.execute("PRAGMA compile_options")
+        return any(row[0] == "ENABLE_FTS5" for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _scan_snippet(action: ModerationAction, words: list[str]) -> str:
+    """Mark the first word found in a note, with characters either side."""
+    word = words[0].lower()
+    for note in (action.current_note, action.original_note):
+        start = note.lower().find(word)
+        if start < 0:
+            continue
+        end = start + len(word)
+        return "".join(
+            (
+                "..." if start > SNIPPET_CHARS else "",
+                note[max(start - SNIPPET_CHARS, 0) : start],
+                SNIPPET_START,
+                note[start:end],
+                SNIPPET_END,
+                note[end : end + SNIPPET_CHARS],
+                "..." if end + SNIPPET_CHARS < len(note) else "",
+            )
+        )
+    return ""
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import Sequence
+
+from eggbot.provider.db_connector import DBConnection
+
+VERSION_TABLE = "schema_version"
+
+
+@dataclasses.dataclass(frozen=True)
+class Migration:
+    """Statements which move a table's schema to the given version"""
+
+    version: int
+    statements: tuple[str, ...]
+
+
+def to_epoch_sql(column: str) -> str:
+    """
+    SQL expression converting an ISO text timestamp column to epoch microseconds.
+
+    Matches TimeUtil.to_epoch. NULL values are kept as NULL.
+
+    Args:
+        column: Name of column holding "YYYY-MM-DD HH:MM:SS[.ffffff]" values
+    """
+    return (
+        f"CAST(strftime('%s', {column}) AS INTEGER) * 1000000 "
+        f"+ CAST(substr({column} || '.000000', 21, 6) AS INTEGER)"
+    )
+
+
+def get_version(dbconn: DBConnection, table_name: str) -> int:
+    """
+    Return the recorded schema version of a table.
+
+    Args:
+        dbconn: Database connection
+        table_name: Name of table
+
+    Returns:
+        Schema version, 0 when no migration has been recorded
+    """
+    cursor = dbconn.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} "
+            "(table_name TEXT PRIMARY KEY, version INT)"
+        )
+        cursor.execute(
+            f"SELECT version FROM {VERSION_TABLE} WHERE table_name=?",
+            (table_name,),
+        )
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    return row[0] if row else 0
+
+
+def migrate(
+    dbconn: DBConnection,
+    table_name: str,
+    migrations: Sequence[Migration],
+) -> int:
+    """
+    Apply each migration newer than the table's recorded schema version.
+
+    Every migration, with its version bump, runs in its own transaction and is
+    committed immediately. The version is read again once the write lock is
+    held, so processes migrating the same database at once apply each
+    migration only once. A failed migration is rolled back and raised.
+
+    Args:
+        dbconn: Database connection
+        table_name: Name of table the migrations belong to
+        migrations: Migrations for the table in any order
+
+    Returns:
+        Schema version of the table after migrating
+    """
+    # Never mix deferred writes into a migration's transaction
+    dbconn.flush()
+    version = get_version(dbconn, table_name)
+
+    for migration in sorted(migrations, key=lambda item: item.version):
+        if migration.version <= version:
+            continue
+
+        cursor = dbconn.cursor()
+        try:
+            # Another process may have migrated since the version was read
+            cursor.execute("BEGIN IMMEDIATE")
+            version = get_version(dbconn, table_name)
+            if migration.version > version:
+                for statement in migration.statements:
+                    cursor.execute(statement)
+                cursor.execute(
+                    f"INSERT OR REPLACE INTO {VERSION_TABLE} (table_name, version) "
+                    "VALUES (?, ?)",
+                    (table_name, migration.version),
+                )
+                version = migration.version
+            dbconn.flush()
+        except Exception:
+            dbconn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    return version
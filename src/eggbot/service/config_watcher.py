@@ -0,0 +1,83 @@
+"""Reload a JSON config file whenever it changes on disk."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Any
+from typing import Callable
+from typing import Dict
+
+ConfigCallback = Callable[[Dict[str, Any]], None]
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigFileWatcher:
+    """Reload a JSON config file whenever it changes on disk."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        on_change: ConfigCallback,
+        *,
+        interval: float = 5.0,
+    ) -> None:
+        """
+        The file is polled by modification time and size, it is only read and
+        parsed when either changes. A file that is missing or fails to parse is
+        logged and the previously loaded config is kept.
+
+        Args:
+            path: JSON file to watch
+            on_change: Called with the parsed file, e.g. a module's load_config
+            interval: Seconds between checks when running
+        """
+        self.path = Path(path)
+        self._on_change = on_change
+        self._interval = interval
+        self._signature: tuple[int, int] | None = None
+        self._running = False
+
+    def check(self) -> bool:
+        """
+        Load the file if it changed since the last check.
+
+        Returns:
+            True if the file changed and on_change was called
+        """
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            if self._signature is not None:
+                logger.warning("Config file '%s' removed, keeping config", self.path)
+            self._signature = None
+            return False
+
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return False
+        self._signature = signature
+
+        try:
+            config = json.loads(self.path.read_text(encoding="utf-8"))
+            self._on_change(config)
+        except (OSError, ValueError, KeyError):
+            logger.exception("Failed to load config file '%s'", self.path)
+            return False
+
+        logger.info("Loaded config file '%s'", self.path)
+        return True
+
+    async def run(self) -> None:
+        """Check the file every interval until `stop()` is called."""
+        loop = asyncio.get_running_loop()
+        self._running = True
+        while self._running:
+            await loop.run_in_executor(None, self.check)
+            await asyncio.sleep(self._interval)
+
+    def stop(self) -> None:
+        """Stop checking, takes effect after the current interval."""
+        self._running = False
@@ -0,0 +1,302 @@
+"""Route gateway messages to every registered chat module."""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import datetime
+import functools
+import logging
+import time
+from concurrent.futures import Executor
+from concurrent.futures import ThreadPoolExecutor
+
+import discord
+from eggbot.model.chat_message import ChatMessage
+from eggbot.model.chat_response import ChatResponse
+from eggbot.model.message_filter import MessageFilter
+from eggbot.module.chat_module_intf import ChatModuleIntf
+from eggbot.util import metrics
+from eggbot.util.keyword_matcher import KeywordMatcher
+
+# Routes are cached by (channel, guild), cleared when this many are cached
+MAX_CACHED_ROUTES = 4096
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class ModuleStats:
+    """Processing time and outcomes of a single chat module"""
+
+    calls: int = 0
+    responses: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+
+@dataclasses.dataclass
+class _Registration:
+    module: ChatModuleIntf
+    max_concurrency: int
+    offload: bool
+    slots: asyncio.Semaphore | None = None
+
+
+class _RouteIndex:
+    """Lookup tables of module filters, finds the modules a message can reach."""
+
+    def __init__(self, filters: dict[str, MessageFilter]) -> None:
+        """
+        Args:
+            filters: Mapping of module name to filter, in registration order
+        """
+        self._order = list(filters)
+        self._any_channel = frozenset(
+            name for name, filter_ in filters.items() if not filter_.channel_ids
+        )
+        self._any_guild = frozenset(
+            name for name, filter_ in filters.items() if not filter_.guild_id
+        )
+        self._needs_token = frozenset(
+            name for name, filter_ in filters.items() if filter_.required_tokens
+        )
+
+        by_channel: dict[str, set[str]] = {}
+        by_guild: dict[str | None, set[str]] = {}
+        excluded_by: dict[str, set[str]] = {}
+        self._by_token: dict[str, set[str]] = {}
+        for name, filter_ in filters.items():
+            for channel_id in filter_.channel_ids:
+                by_channel.setdefault(channel_id, set()).add(name)
+            if filter_.guild_id:
+                by_guild.setdefault(filter_.guild_id, set()).add(name)
+            for author_id in filter_.excluded_authors:
+                excluded_by.setdefault(author_id, set()).add(name)
+            for token in filter_.required_tokens:
+                self._by_token.setdefault(token.lower(), set()).add(name)
+
+        self._by_channel = {key: frozenset(names) for key, names in by_channel.items()}
+        self._by_guild = {key: frozenset(names) for key, names in by_guild.items()}
+        self._excluded_by = {
+            key: frozenset(names) for key, names in excluded_by.items()
+        }
+        self._tokens = KeywordMatcher({}, {token: token for token in self._by_token})
+        self._routes: dict[tuple[str, str | None], tuple[str, ...]] = {}
+
+    def route(self, message: ChatMessage) -> list[str]:
+        """Return names of modules whose filter the message passes, in order."""
+        names = self._routes.get((message.channel_id, message.guild_id))
+        if names is None:
+            names = self._route_location(message.channel_id, message.guild_id)
+
+        excluded = self._excluded_by.get(message.member_id, frozenset())
+        tokens_found: set[str] | None = None
+        routed: list[str] = []
+        for name in names:
+            if name in excluded:
+                continue
+            if name in self._needs_token:
+                if tokens_found is None:
+                    tokens_found = self._match_tokens(message.raw_message)
+                if name not in tokens_found:
+                    continue
+            routed.append(name)
+        return routed
+
+    def _route_location(self, channel_id: str, guild_id: str | None) -> tuple[str, ...]:
+        """Find and cache modules interested in a channel and guild."""
+        empty: frozenset[str] = frozenset()
+        allowed = (self._by_channel.get(channel_id, empty) | self._any_channel) & (
+            self._by_guild.get(guild_id, empty) | self._any_guild
+        )
+        names = tuple(name for name in self._order if name in allowed)
+
+        if len(self._routes) >= MAX_CACHED_ROUTES:
+            self._routes.clear()
+        self._routes[(channel_id, guild_id)] = names
+        return names
+
+    def _match_tokens(self, text: str) -> set[str]:
+        """Return names of modules with a required token found in the text."""
+        found: set[str] = set()
+        for token in self._tokens.match(text):
+            found |= self._by_token[token]
+        return found
+
+
+def to_chat_message(message: discord.Message) -> ChatMessage:
+    """
+    Convert a discord.py message into a ChatMessage.
+
+    Args:
+        message: Message received from the gateway
+
+    Returns:
+        ChatMessage, created_at is naive UTC
+    """
+    created_at = message.created_at.astimezone(datetime.timezone.utc)
+    return ChatMessage(
+        member_id=str(message.author.id),
+        channel_id=str(message.channel.id),
+        created_at=str(created_at.replace(tzinfo=None)),
+        raw_message=message.content,
+        guild_id=str(message.guild.id) if message.guild else None,
+    )
+
+
+class MessageDispatcher:
+    """Run every registered chat module on each message received."""
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 4,
+        executor: Executor | None = None,
+    ) -> None:
+        """
+        Modules are run concurrently with each other. Each module is limited to
+        a number of messages in progress at once so a slow module queues its own
+        work without holding up the others.
+
+        Modules only receive messages passing their `message_filter()`. Filters
+        are compiled into lookup tables when first needed after a module is
+        registered, call `refresh_filters()` if a module's filter changes.
+
+        Args:
+            max_concurrency: Default limit of messages in progress per module
+            executor: Runs offloaded `process_message_batch` calls. A thread
+                pool owned by the dispatcher is created if not given
+        """
+        self._max_concurrency = max_concurrency
+        self._executor = executor or ThreadPoolExecutor(
+            thread_name_prefix="eggbot-dispatch"
+        )
+        self._owns_executor = executor is None
+        self._modules: dict[str, _Registration] = {}
+        self._stats: dict[str, ModuleStats] = {}
+        self._index: _RouteIndex | None = None
+
+    def register(
+        self,
+        module: ChatModuleIntf,
+        *,
+        name: str | None = None,
+        max_concurrency: int | None = None,
+        offload: bool = True,
+    ) -> None:
+        """
+        Register a chat module, replacing any module registered by the same name.
+
+        Args:
+            module: Chat module given every dispatched message
+            name: Name used in stats, defaults to the module's class name
+            max_concurrency: Limit of messages in progress for this module
+            offload: Run on the executor, set False for trivial modules
+        """
+        name = name or type(module).__name__
+        self._modules[name] = _Registration(
+            module=module,
+            max_concurrency=max_concurrency or self._max_concurrency,
+            offload=offload,
+        )
+        self._stats.setdefault(name, ModuleStats())
+        self._index = None
+
+    def unregister(self, name: str) -> None:
+        """Remove a registered module by name. Stats are kept."""
+        self._modules.pop(name, None)
+        self._index = None
+
+    def refresh_filters(self) -> None:
+        """Recompile module filters, use after a module's filter changes."""
+        self._index = None
+
+    def route(self, message: ChatMessage) -> list[str]:
+        """
+        Find the modules a message will be dispatched to.
+
+        Args:
+            message: ChatMessage to route
+
+        Returns:
+            Names of modules whose filter the message passes, in registration order
+        """
+        if self._index is None:
+            self._index = _RouteIndex(
+                {
+                    name: reg.module.message_filter()
+                    for name, reg in self._modules.items()
+                }
+            )
+        return self._index.route(message)
+
+    async def dispatch(self, message: ChatMessage) -> list[ChatResponse]:
+        """
+        Run all registered modules interested in a message.
+
+        A module raising an exception is logged and counted, it does not affect
+        the responses of other modules.
+
+        Args:
+            message: ChatMessage to process
+
+        Returns:
+            Responses from all modules, in registration order
+        """
+        names = self.route(message)
+        if not names:
+            return []
+
+        results = await asyncio.gather(
+            *(self._run(name, self._modules[name], message) for name in names)
+        )
+        return [response for responses in results for response in responses]
+
+    def get_stats(self) -> dict[str, ModuleStats]:
+        """Return a snapshot of processing stats by module name."""
+        return {name: dataclasses.replace(stats) for name, stats in self._stats.items()}
+
+    def close(self) -> None:
+        """Shut down the executor if owned by the dispatcher."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    async def _run(
+        self,
+        name: str,
+        registration: _Registration,
+        message: ChatMessage,
+    ) -> list[ChatResponse]:
+        """Run one module under its concurrency limit, recording stats."""
+        # Created here, within the running loop, for python 3.8 compatibility
+        if registration.slots is None:
+            registration.slots = asyncio.Semaphore(registration.max_concurrency)
+
+        process = functools.partial(registration.module.process_message_batch, message)
+        stats = self._stats[name]
+
+        async with registration.slots:
+            start = time.perf_counter()
+            try:
+                if registration.offload:
+                    loop = asyncio.get_running_loop()
+                    responses = await loop.run_in_executor(self._executor, process)
+                else:
+                    responses = process()
+
+            except Exception:
+                stats.errors += 1
+                metrics.registry.inc("eggbot_module_errors_total", 1, module=name)
+                logger.exception("Module %s failed to process message", name)
+                responses = []
+
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.calls += 1
+                stats.total_time += elapsed
+                stats.max_time = max(stats.max_time, elapsed)
+                metrics.registry.observe("eggbot_module_seconds", elapsed, module=name)
+
+        stats.responses += len(responses)
+        return responses
@@ -0,0 +1,107 @@
+"""Keep responses that could not be sent in the database until they are."""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import logging
+from typing import Sequence
+
+from eggbot.model.chat_response import ChatResponse
+from eggbot.model.deferred_task import DeferredTask
+from eggbot.service.send_queue import SendQueue
+from eggbot.service.task_scheduler import TaskScheduler
+
+OUTBOX_EVENT_TYPE = "outbox"
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """Keep responses that could not be sent in the database until they are."""
+
+    def __init__(
+        self,
+        queue: SendQueue,
+        scheduler: TaskScheduler,
+        *,
+        retry_after: int = 30,
+    ) -> None:
+        """
+        Responses refused by a full send queue, or failing to send, are saved as
+        deferred tasks of OUTBOX_EVENT_TYPE. The scheduler replays them through the
+        send queue, so replays are rate limited and coalesced like any other send.
+        Replays that fail are rescheduled with the scheduler's backoff.
+
+        Give the outbox a scheduler of its own. Its batch_size and max_concurrency
+        bound how many saved responses are held in memory while draining. Without
+        max_attempts, saved responses are retried until sent rather than
+        dead-lettered after an outage.
+
+        Args:
+            queue: Queue responses are sent through
+            scheduler: Scheduler the outbox handler is registered with
+            retry_after: Seconds before a response that failed to send is replayed
+        """
+        self._queue = queue
+        self._scheduler = scheduler
+        self._retry_after = retry_after
+        self._watching: set[asyncio.Task[None]] = set()
+
+        scheduler.register(OUTBOX_EVENT_TYPE, self._replay)
+
+    async def send(self, response: ChatResponse) -> None:
+        """
+        Queue a response, saving it to the outbox if the queue is full or it fails.
+
+        Args:
+            response: ChatResponse to send
+        """
+        sent = self._queue.offer(response)
+        if sent is None:
+            await self.spill([response])
+            return
+
+        watch = asyncio.create_task(self._spill_on_failure(response, sent))
+        self._watching.add(watch)
+        watch.add_done_callback(self._watching.discard)
+
+    async def spill(
+        self,
+        responses: Sequence[ChatResponse],
+        retry_after: int = 0,
+    ) -> None:
+        """
+        Save responses to the outbox to be sent later.
+
+        Args:
+            responses: ChatResponses to save
+            retry_after: Number of seconds to wait before the first replay
+        """
+        events = [json.dumps(dataclasses.asdict(response)) for response in responses]
+        await self._scheduler.submit_many(events, OUTBOX_EVENT_TYPE, retry_after)
+
+    async def join(self) -> None:
+        """Wait until all responses given to `send()` are sent or saved."""
+        while self._watching:
+            await asyncio.gather(*self._watching, return_exceptions=True)
+
+    async def _spill_on_failure(
+        self,
+        response: ChatResponse,
+        sent: asyncio.Future[bool],
+    ) -> None:
+        """Save response to the outbox if sending it fails."""
+        if await sent:
+            return
+        try:
+            await self.spill([response], self._retry_after)
+        except Exception:
+            logger.exception("Failed to save response to %s", response.target_id)
+
+    async def _replay(self, task: DeferredTask) -> None:
+        """Send a saved response. Raises to reschedule it if the send fails."""
+        response = ChatResponse(**task.event)
+        sent = await self._queue.put(response)
+        if not await sent:
+            raise ConnectionError(f"Failed to send outbox task {task.uid}")
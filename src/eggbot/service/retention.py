@@ -0,0 +1,169 @@
+"""Prune rows past their retention and return the space to the file system."""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import datetime
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any
+from typing import Sequence
+
+from eggbot.model.db_store_intfc import ArchiveCallback
+from eggbot.provider.async_db_store import AsyncDBStore
+from eggbot.util import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class RetentionPolicy:
+    """Rows of a table kept for max_age, pruned by its provider's `prune`"""
+
+    name: str
+    store: AsyncDBStore[Any]
+    max_age: datetime.timedelta
+
+
+@dataclasses.dataclass
+class RetentionReport:
+    """Outcome of a single retention run"""
+
+    deleted: dict[str, int] = dataclasses.field(default_factory=dict)
+    archived: int = 0
+    bytes_reclaimed: int = 0
+    elapsed: float = 0.0
+
+
+class RetentionJob:
+    """Prune rows past their retention and return the space to the file system."""
+
+    def __init__(
+        self,
+        policies: Sequence[RetentionPolicy],
+        *,
+        chunk_size: int = 500,
+        chunk_pause: float = 0.05,
+        vacuum_pages: int | None = None,
+        archive_dir: str | Path | None = None,
+        interval: float = 3600.0,
+    ) -> None:
+        """
+        Rows are deleted in chunks, each its own short transaction, pausing
+        between chunks so other writers are never locked out for long. After
+        pruning each database is compacted, see DBStoreIntfc.compact. Only
+        databases in incremental auto_vacuum mode are compacted, the job never
+        runs a full VACUUM. Create within the running event loop.
+
+        Args:
+            policies: Tables to prune and how long their rows are kept
+            chunk_size: Maximum rows deleted per transaction
+            chunk_pause: Seconds between chunks
+            vacuum_pages: Most free pages released per run, all when None
+            archive_dir: Write pruned rows here, as JSON lines per table,
+                before they are deleted. Rows are only deleted when not given
+            interval: Seconds between runs when running
+        """
+        self.policies = list(policies)
+        self._chunk_size = chunk_size
+        self._chunk_pause = chunk_pause
+        self._vacuum_pages = vacuum_pages
+        self._archive_dir = Path(archive_dir) if archive_dir is not None else None
+        self._interval = interval
+        self._running = False
+        self._wakeup = asyncio.Event()
+
+    async def run_once(self) -> RetentionReport:
+        """
+        Prune every policy's table then compact each database.
+
+        Returns:
+            Rows deleted by policy name, rows archived, and bytes reclaimed
+        """
+        start = time.perf_counter()
+        report = RetentionReport()
+        now = datetime.datetime.utcnow()
+
+        for policy in self.policies:
+            before = now - policy.max_age
+            archive = self._archiver(policy.name)
+            deleted = 0
+            while True:
+                count = await policy.store.run(
+                    lambda store: store.prune(
+                        before, limit=self._chunk_size, archive=archive
+                    )
+                )
+                deleted += count
+                if count < self._chunk_size:
+                    break
+                await asyncio.sleep(self._chunk_pause)
+
+            report.deleted[policy.name] = deleted
+            if archive is not None:
+                report.archived += deleted
+            metrics.registry.inc(
+                "eggbot_retention_rows_total", deleted, table=policy.name
+            )
+
+        # Stores opened on the same database find nothing left after the first
+        compacted: set[int] = set()
+        for policy in self.policies:
+            if id(policy.store) in compacted:
+                continue
+            compacted.add(id(policy.store))
+            report.bytes_reclaimed += await policy.store.run(
+                lambda store: store.compact(self._vacuum_pages)
+            )
+        metrics.registry.inc("eggbot_retention_bytes_total", report.bytes_reclaimed)
+
+        report.elapsed = time.perf_counter() - start
+        logger.info(
+            "Retention pruned %s, archived %d rows, reclaimed %d bytes in %.2fs",
+            report.deleted,
+            report.archived,
+            report.bytes_reclaimed,
+            report.elapsed,
+        )
+        return report
+
+    async def run(self) -> None:
+        """Run every interval until `stop()` is called. Failed runs are logged."""
+        self._running = True
+        while self._running:
+            self._wakeup.clear()
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Retention run failed")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        """Stop running, takes effect after the current run."""
+        self._running = False
+        self._wakeup.set()
+
+    def _archiver(self, name: str) -> ArchiveCallback | None:
+        """Return a callback appending rows to the table's archive file, if any."""
+        archive_dir = self._archive_dir
+        if archive_dir is None:
+            return None
+        path = archive_dir / f"{name}.jsonl"
+
+        def _archive(rows: list[dict[str, Any]]) -> None:
+            # Durable before the delete is committed, so rows are never lost
+            archive_dir.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as archive_file:
+                for row in rows:
+                    archive_file.write(json.dumps(row) + "\n")
+                archive_file.flush()
+                os.fsync(archive_file.fileno())
+
+        return _archive
@@ -0,0 +1,278 @@
+"""Rate limited, coalescing queue for outbound chat responses."""
+from __future__ import annotations
+
+import asyncio
+import collections
+import dataclasses
+import logging
+import time
+from typing import Awaitable
+from typing import Callable
+from typing import Deque
+
+from eggbot.model.chat_response import ChatResponse
+from eggbot.util import metrics
+
+SendTransport = Callable[[ChatResponse], Awaitable[None]]
+
+# Discord rejects message content longer than this
+MAX_MESSAGE_LENGTH = 2000
+# Idle routes are pruned once this many routes are tracked
+MAX_IDLE_ROUTES = 1024
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class SendStats:
+    """Outbound message counts of a send queue"""
+
+    queued: int = 0
+    sent: int = 0
+    coalesced: int = 0
+    failed: int = 0
+    throttle_time: float = 0.0
+
+
+@dataclasses.dataclass
+class _TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float
+    updated_at: float
+
+    def reserve(self, now: float) -> float:
+        """Take a token, returns seconds to wait until the token is available."""
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_full(self, now: float) -> bool:
+        """True if the bucket has refilled to capacity."""
+        return self.tokens + (now - self.updated_at) * self.rate >= self.capacity
+
+
+@dataclasses.dataclass
+class _Batch:
+    ready_at: float
+    responses: list[ChatResponse] = dataclasses.field(default_factory=list)
+    sent: list[asyncio.Future[bool]] = dataclasses.field(default_factory=list)
+    length: int = 0
+
+
+@dataclasses.dataclass
+class _Route:
+    bucket: _TokenBucket
+    batches: Deque[_Batch] = dataclasses.field(default_factory=collections.deque)
+    worker: asyncio.Task[None] | None = None
+
+
+class SendQueue:
+    """Rate limited, coalescing queue for outbound chat responses."""
+
+    def __init__(
+        self,
+        transport: SendTransport,
+        *,
+        rate: float = 1.0,
+        burst: int = 5,
+        global_rate: float = 50.0,
+        coalesce_window: float = 0.5,
+        max_pending: int = 1000,
+        max_length: int = MAX_MESSAGE_LENGTH,
+        separator: str = "\n\n",
+    ) -> None:
+        """
+        Responses are grouped into routes by delivery channel, or by target member
+        when there is no delivery channel. Each route has its own token bucket and
+        sends in the order responses were queued. Responses for a route arriving
+        within the coalesce window, or while the route is throttled, are joined
+        into a single message.
+
+        `put()` waits while max_pending responses are unsent, pushing back on
+        producers instead of growing without bound. `offer()` refuses instead.
+
+        Args:
+            transport: Coroutine function sending one response
+            rate: Messages per second allowed on each route
+            burst: Messages a route can send at once before being throttled
+            global_rate: Messages per second allowed across all routes
+            coalesce_window: Seconds a new message waits for others to join it
+            max_pending: Unsent responses allowed before `put()` waits
+            max_length: Longest message coalescing will create
+            separator: Text placed between coalesced messages
+        """
+        self._transport = transport
+        self._rate = rate
+        self._burst = burst
+        self._coalesce_window = coalesce_window
+        self._max_pending = max_pending
+        self._max_length = max_length
+        self._separator = separator
+
+        self._global = _TokenBucket(global_rate, global_rate, global_rate, 0.0)
+        self._routes: dict[str, _Route] = {}
+        self._stats = SendStats()
+        # Created on first use, within the running loop, for python 3.8 compatibility
+        self._space: asyncio.Condition | None = None
+
+    async def put(self, response: ChatResponse) -> asyncio.Future[bool]:
+        """
+        Queue a response to be sent, waiting while the queue is full.
+
+        Args:
+            response: ChatResponse to send
+
+        Returns:
+            Future set to True once sent, or False if the send failed
+        """
+        space = self._get_space()
+        async with space:
+            await space.wait_for(lambda: self._stats.queued < self._max_pending)
+            return self._enqueue(response)
+
+    def offer(self, response: ChatResponse) -> asyncio.Future[bool] | None:
+        """
+        Queue a response to be sent if the queue is not full.
+
+        Args:
+            response: ChatResponse to send
+
+        Returns:
+            Future set to True once sent, or False if the send failed. None if
+            the queue is full and the response was not queued
+        """
+        if self._stats.queued >= self._max_pending:
+            return None
+        return self._enqueue(response)
+
+    def _enqueue(self, response: ChatResponse) -> asyncio.Future[bool]:
+        """Add response to its route, joining the last unsent batch if it fits."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        route = self._get_route(route_key(response), now)
+        self._stats.queued += 1
+
+        if route.batches and self._can_join(route.batches[-1], response):
+            batch = route.batches[-1]
+            self._stats.coalesced += 1
+        else:
+            batch = _Batch(now + self._coalesce_window)
+            route.batches.append(batch)
+
+        sent: asyncio.Future[bool] = loop.create_future()
+        batch.length += len(response.message) + len(self._separator) * bool(
+            batch.responses
+        )
+        batch.responses.append(response)
+        batch.sent.append(sent)
+
+        if route.worker is None:
+            route.worker = asyncio.create_task(self._send_route(route))
+        return sent
+
+    async def join(self) -> None:
+        """Wait until every queued response has been sent or has failed."""
+        while True:
+            workers = [route.worker for route in self._routes.values() if route.worker]
+            if not workers:
+                return
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def get_stats(self) -> SendStats:
+        """Return a snapshot of send counts."""
+        return dataclasses.replace(self._stats)
+
+    def _get_space(self) -> asyncio.Condition:
+        """Return condition notified as queue space frees, created within the loop."""
+        if self._space is None:
+            self._space = asyncio.Condition()
+        return self._space
+
+    def _get_route(self, key: str, now: float) -> _Route:
+        """Return route of key, creating it and pruning idle routes if needed."""
+        route = self._routes.get(key)
+        if route is not None:
+            return route
+
+        if len(self._routes) >= MAX_IDLE_ROUTES:
+            # A route idle long enough to refill its bucket carries no state
+            self._routes = {
+                key: route
+                for key, route in self._routes.items()
+                if route.worker or not route.bucket.is_full(now)
+            }
+
+        bucket = _TokenBucket(self._rate, self._burst, self._burst, now)
+        route = self._routes[key] = _Route(bucket)
+        return route
+
+    def _can_join(self, batch: _Batch, response: ChatResponse) -> bool:
+        """True if the response fits into the unsent batch."""
+        length = batch.length + len(self._separator) + len(response.message)
+        return length <= self._max_length
+
+    async def _send_route(self, route: _Route) -> None:
+        """Send batches of a route in order until it is empty."""
+        loop = asyncio.get_running_loop()
+        try:
+            while route.batches:
+                batch = route.batches[0]
+                delay = batch.ready_at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                await self._throttle(route.bucket.reserve(loop.time()))
+                await self._throttle(self._global.reserve(loop.time()))
+
+                # Nothing more can join the batch once it leaves the route
+                route.batches.popleft()
+                await self._send(batch)
+        finally:
+            route.worker = None
+
+    async def _throttle(self, delay: float) -> None:
+        """Wait out a token bucket delay."""
+        if delay > 0:
+            self._stats.throttle_time += delay
+            await asyncio.sleep(delay)
+
+    async def _send(self, batch: _Batch) -> None:
+        """Send a batch, recording the outcome, and free its queue slots."""
+        first = batch.responses[0]
+        response = dataclasses.replace(
+            first,
+            message=self._separator.join(resp.message for resp in batch.responses),
+        )
+        success = False
+        start = time.perf_counter()
+        try:
+            await self._transport(response)
+            success = True
+
+        except Exception:
+            self._stats.failed += len(batch.responses)
+            metrics.registry.inc("eggbot_send_errors_total")
+            logger.exception("Failed to send to %s", route_key(response))
+
+        else:
+            self._stats.sent += 1
+
+        finally:
+            metrics.registry.observe("eggbot_send_seconds", time.perf_counter() - start)
+            self._stats.queued -= len(batch.responses)
+            for sent in batch.sent:
+                if not sent.done():
+                    sent.set_result(success)
+            space = self._get_space()
+            async with space:
+                space.notify(len(batch.responses))
+
+
+def route_key(response: ChatResponse) -> str:
+    """Rate limit route of a response, its delivery channel or target member."""
+    if response.delivery_id:
+        return f"channel:{response.delivery_id}"
+    return f"member:{response.target_id}"
@@ -0,0 +1,233 @@
+"""Dispatch due deferred tasks to handlers registered by event type."""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import heapq
+import logging
+import os
+import socket
+from typing import Awaitable
+from typing import Callable
+from typing import Sequence
+from uuid import uuid4
+
+from eggbot.model.deferred_task import DeferredTask
+from eggbot.provider.async_db_store import AsyncDBStore
+from eggbot.provider.deferred_task_db import DeferredTaskDB
+
+TaskHandler = Callable[[DeferredTask], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+class TaskScheduler:
+    """Dispatch due deferred tasks to handlers registered by event type."""
+
+    def __init__(
+        self,
+        store: AsyncDBStore[DeferredTaskDB],
+        *,
+        max_concurrency: int = 4,
+        batch_size: int = 50,
+        base_backoff: float = 30.0,
+        max_backoff: float = 3600.0,
+        max_attempts: int | None = 5,
+        lease_seconds: float = 300.0,
+        worker_id: str | None = None,
+        error_backoff: float = 5.0,
+    ) -> None:
+        """
+        The table is only queried when the next known task is due. Wake-up times
+        are kept in an in-memory heap, fed by `submit()`, `notify()`, and the
+        earliest pending retry_at found after each batch. Create within the
+        running event loop.
+
+        Due tasks are leased to this scheduler before they are dispatched, so any
+        number of schedulers, in any number of processes, can share the table
+        without running a task twice.
+
+        Args:
+            store: Awaitable DeferredTaskDB provider
+            max_concurrency: Maximum number of handlers running at once
+            batch_size: Maximum number of due tasks fetched per query
+            base_backoff: Seconds to wait after the first failed attempt
+            max_backoff: Upper limit of seconds to wait between attempts
+            max_attempts: Failed attempts before a task is dead-lettered, None
+                retries forever at max_backoff
+            lease_seconds: Seconds a claimed task is held before others can reclaim
+            worker_id: Unique name of this scheduler, generated if not given
+            error_backoff: Seconds before the table is queried again after a
+                query fails, such as when the database is locked
+        """
+        self._store = store
+        self._batch_size = batch_size
+        self._base_backoff = base_backoff
+        self._max_backoff = max_backoff
+        self._max_attempts = max_attempts
+        self._lease_seconds = lease_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid4()}"
+        self._error_backoff = error_backoff
+
+        self._handlers: dict[str, TaskHandler] = {}
+        self._wakeups: list[datetime.datetime] = []
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._in_flight: dict[str, asyncio.Task[None]] = {}
+        self._running = False
+
+    def register(self, event_type: str, handler: TaskHandler) -> None:
+        """
+        Register the handler for all tasks of an event type.
+
+        Args:
+            event_type: Event type of tasks handled
+            handler: Coroutine function given each due task. Raise to fail attempt
+        """
+        self._handlers[event_type] = handler
+        self.notify(datetime.datetime.utcnow())
+
+    async def submit(self, event: str, type_: str, retry_after: int = 0) -> None:
+        """
+        Save a new deferred task and schedule a wake-up for it.
+
+        Args:
+            event: Serialized event payload to event handler
+            type_: Event type of task
+            retry_after: Number of seconds to wait before the first attempt
+        """
+        await self._store.run(DeferredTaskDB.save, event, type_, retry_after)
+        self.notify(
+            datetime.datetime.utcnow() + datetime.timedelta(seconds=retry_after)
+        )
+
+    async def submit_many(
+        self,
+        events: Sequence[str],
+        type_: str,
+        retry_after: int = 0,
+    ) -> None:
+        """
+        Save many new deferred tasks in one transaction and schedule a wake-up.
+
+        Args:
+            events: Serialized event payloads to event handler
+            type_: Event type of all tasks
+            retry_after: Number of seconds to wait before the first attempt
+        """
+        await self._store.run(DeferredTaskDB.save_many, events, type_, retry_after)
+        self.notify(
+            datetime.datetime.utcnow() + datetime.timedelta(seconds=retry_after)
+        )
+
+    def notify(self, retry_at: datetime.datetime) -> None:
+        """
+        Schedule a wake-up. Use when tasks are saved outside of the scheduler.
+
+        Args:
+            retry_at: Point in time a task becomes due
+        """
+        heapq.heappush(self._wakeups, retry_at)
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        """Dispatch due tasks until `stop()` is called. Failed queries are logged."""
+        self._running = True
+        # The first query finds the earliest pending task
+        self.notify(datetime.datetime.utcnow())
+
+        while self._running:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._seconds_to_wakeup())
+            except asyncio.TimeoutError:
+                pass
+
+            now = datetime.datetime.utcnow()
+            if not (self._running and self._wakeups and self._wakeups[0] <= now):
+                continue
+            try:
+                await self._run_due(now)
+            except Exception:
+                logger.exception(
+                    "Failed to run due tasks, retrying in %.1fs", self._error_backoff
+                )
+                self.notify(now + datetime.timedelta(seconds=self._error_backoff))
+
+    async def stop(self) -> None:
+        """Stop dispatching and wait for running handlers to finish."""
+        self._running = False
+        self._wakeup.set()
+        await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+
+    def _seconds_to_wakeup(self) -> float | None:
+        """Seconds until the earliest wake-up, None if there is nothing to wait on."""
+        if not self._wakeups:
+            return None
+        delta = self._wakeups[0] - datetime.datetime.utcnow()
+        return max(delta.total_seconds(), 0)
+
+    async def _run_due(self, now: datetime.datetime) -> None:
+        """Claim a batch of due tasks and start a handler for each."""
+        while self._wakeups and self._wakeups[0] <= now:
+            heapq.heappop(self._wakeups)
+
+        tasks = await self._store.run(
+            DeferredTaskDB.claim,
+            self.worker_id,
+            self._batch_size,
+            self._lease_seconds,
+            list(self._handlers),
+        )
+
+        for task in tasks:
+            await self._slots.acquire()
+            self._in_flight[task.uid] = asyncio.create_task(self._dispatch(task))
+
+        if len(tasks) >= self._batch_size:
+            self.notify(now)
+        else:
+            next_retry_at = await self._store.run(DeferredTaskDB.next_retry_at, now)
+            if next_retry_at:
+                self.notify(next_retry_at)
+
+    async def _dispatch(self, task: DeferredTask) -> None:
+        """Run task's handler and record the outcome."""
+        try:
+            await self._handlers[task.event_type](task)
+
+        except Exception:
+            attempts = task.attempts + 1
+            if self._max_attempts is not None and attempts >= self._max_attempts:
+                logger.exception(
+                    "Task %s failed %d times, dead-lettered", task.uid, attempts
+                )
+                await self._store.run(
+                    DeferredTaskDB.dead_letter,
+                    task.uid,
+                    self.worker_id,
+                )
+            else:
+                logger.exception("Task %s failed, attempt %d", task.uid, attempts)
+                await self._reschedule(task, attempts)
+
+        else:
+            await self._store.run(DeferredTaskDB.complete, task.uid, self.worker_id)
+
+        finally:
+            self._in_flight.pop(task.uid, None)
+            self._slots.release()
+
+    async def _reschedule(self, task: DeferredTask, attempts: int) -> None:
+        """Set the next attempt of a failed task with exponential backoff."""
+        # Exponent capped so unlimited attempts never overflow a float
+        exponent = min(attempts - 1, 32)
+        backoff = min(self._base_backoff * 2**exponent, self._max_backoff)
+        retry_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=backoff)
+        await self._store.run(
+            DeferredTaskDB.reschedule,
+            task.uid,
+            retry_at,
+            self.worker_id,
+        )
+        self.notify(retry_at)
@@ -0,0 +1,291 @@
+"""Match many keyword patterns against a message in a single scan."""
+from __future__ import annotations
+
+import dataclasses
+import re
+from collections import deque
+from typing import Mapping
+
+# Valid `{m}`, `{m,}`, `{,n}`, `{m,n}` quantifiers. Anything else is a literal brace.
+_BRACE_QUANTIFIER = re.compile(r"\{\d*,?\d*\}")
+# Escape following a backslash, from the character after it to its last
+_ESCAPE = re.compile(
+    r"x[0-9a-fA-F]{0,2}|u[0-9a-fA-F]{0,4}|U[0-9a-fA-F]{0,8}|N(?:\{[^}]*\})?"
+    r"|[0-9]{1,3}|.",
+    re.S,
+)
+# Dotted and dotless i match "i" under re.IGNORECASE but casefold apart
+_FOLD_I = str.maketrans({"\u0130": "i", "\u0131": "i"})
+
+
+@dataclasses.dataclass
+class _Entry:
+    """A unique pattern and the keys which share it."""
+
+    index: int
+    pattern: re.Pattern[str] | None
+    keys: list[str]
+
+
+class KeywordMatcher:
+    """
+    Match many keyword patterns against a message in a single scan.
+
+    Each pattern is reduced to a literal anchor, a run of characters every match
+    must contain. All anchors are loaded into one Aho-Corasick automaton so a
+    single pass over the message finds every candidate pattern. Only candidates
+    are confirmed with their full regex. Patterns without an anchor fall back to
+    being searched on every message.
+    """
+
+    def __init__(
+        self,
+        patterns: Mapping[str, re.Pattern[str]],
+        literals: Mapping[str, str] | None = None,
+    ) -> None:
+        """
+        Build the matcher. Cost is linear to the total size of the anchors.
+
+        Args:
+            patterns: Mapping of key to compiled pattern
+            literals: Mapping of key to exact text, matched without regex
+        """
+        self._entries: list[_Entry] = []
+        self._fallbacks: list[int] = []
+
+        # Automaton state: transitions, failure links, and entries ending here
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+
+        by_pattern: dict[tuple[str, int], _Entry] = {}
+        for key, pattern in patterns.items():
+            entry = by_pattern.get((pattern.pattern, pattern.flags))
+            if entry is None:
+                entry = self._add_entry(pattern, key)
+                by_pattern[(pattern.pattern, pattern.flags)] = entry
+                anchor = required_literal(pattern)
+                if anchor:
+                    self._add_anchor(anchor, entry.index)
+                else:
+                    self._fallbacks.append(entry.index)
+            else:
+                entry.keys.append(key)
+
+        by_literal: dict[str, _Entry] = {}
+        for key, literal in (literals or {}).items():
+            entry = by_literal.get(literal)
+            if entry is None:
+                entry = self._add_entry(None, key)
+                by_literal[literal] = entry
+                self._add_anchor(fold_case(literal), entry.index)
+            else:
+                entry.keys.append(key)
+
+        self._build_failure_links()
+
+    def __len__(self) -> int:
+        """Number of unique patterns and literals loaded."""
+        return len(self._entries)
+
+    def match(self, text: str) -> list[str]:
+        """
+        Find all keys with a pattern or literal found in the text.
+
+        Args:
+            text: Text to search
+
+        Returns:
+            Keys matched, in the order they were given to the matcher
+        """
+        keys: list[str] = []
+        for pattern, entry_keys in self.candidates(text):
+            if pattern is None or pattern.search(text):
+                keys.extend(entry_keys)
+        return keys
+
+    def candidates(self, text: str) -> list[tuple[re.Pattern[str] | None, list[str]]]:
+        """
+        Find patterns which may match the text, without running any regex.
+
+        Use to confirm candidates some other way than `re.Pattern.search`.
+
+        Args:
+            text: Text to search
+
+        Returns:
+            Pattern, None for a found literal, and its keys in the order given
+        """
+        return [
+            (self._entries[index].pattern, self._entries[index].keys)
+            for index in sorted(self._candidates(text) | set(self._fallbacks))
+        ]
+
+    def _candidates(self, text: str) -> set[int]:
+        """Return index of every entry with an anchor found in the text."""
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+
+        found: set[int] = set()
+        state = 0
+        for char in fold_case(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def _add_entry(self, pattern: re.Pattern[str] | None, key: str) -> _Entry:
+        """Register a new unique entry."""
+        entry = _Entry(index=len(self._entries), pattern=pattern, keys=[key])
+        self._entries.append(entry)
+        return entry
+
+    def _add_anchor(self, anchor: str, index: int) -> None:
+        """Add anchor to the automaton's trie."""
+        state = 0
+        for char in anchor:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._out[state] += (index,)
+
+    def _build_failure_links(self) -> None:
+        """Breadth-first pass linking each state to its longest proper suffix."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._out[next_state] += self._out[self._fail[next_state]]
+
+
+def required_literal(pattern: re.Pattern[str]) -> str | None:
+    """
+    Find the longest run of literal characters every match of pattern contains.
+
+    The search is conservative. Only the top level of the pattern is considered
+    and any construct that is not a plain character ends the current run.
+
+    Args:
+        pattern: Compiled pattern
+
+    Returns:
+        Literal anchor, case folded by `fold_case`, or None if one cannot be
+        determined
+    """
+    if pattern.flags & re.VERBOSE:
+        return None
+
+    text = pattern.pattern
+    runs: list[str] = []
+    run: list[str] = []
+    idx = 0
+
+    while idx < len(text):
+        char = text[idx]
+
+        if char == "\\":
+            escaped = text[idx + 1 : idx + 2]
+            if escaped and not escaped.isalnum():
+                run.append(escaped)
+                idx += 2
+                continue
+            # Classes, code points, and backreferences end the run, skipped whole
+            runs.append("".join(run))
+            run = []
+            escape = _ESCAPE.match(text, idx + 1)
+            idx = escape.end() if escape else idx + 1
+            continue
+
+        if char in "*+?":
+            run = run[:-1]
+            runs.append("".join(run))
+            run = []
+
+        elif char == "{" and _BRACE_QUANTIFIER.match(text, idx):
+            run = run[:-1]
+            runs.append("".join(run))
+            run = []
+            idx = text.index("}", idx)
+
+        elif char in "[(":
+            runs.append("".join(run))
+            run = []
+            idx = _skip_group(text, idx)
+            if idx < 0:
+                return None
+
+        elif char == "|" or char == ")":
+            # Alternation at the top level means nothing is required
+            return None
+
+        elif char in ".^$":
+            runs.append("".join(run))
+            run = []
+
+        else:
+            run.append(char)
+
+        idx += 1
+
+    runs.append("".join(run))
+    longest = max(runs, key=len)
+    return fold_case(longest) or None
+
+
+def fold_case(text: str) -> str:
+    """
+    Fold case so characters re.IGNORECASE treats as equal compare equal.
+
+    Plain `str.lower` misses some, such as "ſ" for "s" or the Kelvin sign
+    for "k", so anchors and the text searched are both folded with this.
+
+    Args:
+        text: Text to fold
+
+    Returns:
+        Case folded text, which may be longer than text
+    """
+    return text.translate(_FOLD_I).casefold()
+
+
+def _skip_group(text: str, idx: int) -> int:
+    """Return index of the bracket closing the group or class opened at idx."""
+    depth = 0
+    in_class = False
+    while idx < len(text):
+        char = text[idx]
+        if char == "\\":
+            idx += 2
+            continue
+        if in_class:
+            if char == "]":
+                in_class = False
+                if not depth:
+                    return idx
+        elif char == "[":
+            in_class = True
+            # A leading `]` (or `^]`) is a literal member of the class
+            idx += 2 if text[idx + 1 : idx + 2] == "^" else 1
+            idx += 1 if text[idx : idx + 1] == "]" else 0
+            continue
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if not depth:
+                return idx
+        idx += 1
+    return -1
@@ -0,0 +1,291 @@
+"""Counters and latency histograms for the bot's hot paths."""
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import functools
+import logging
+import math
+import threading
+import time
+from typing import Any
+from typing import Callable
+from typing import Tuple
+from typing import TypeVar
+
+# Histogram buckets per power of two, values are kept to within 1/16th (~6%)
+SUB_BUCKETS = 16
+# Smallest value told apart from zero, in seconds
+MIN_VALUE = 1e-9
+QUANTILES = (0.5, 0.9, 0.99)
+
+Labels = Tuple[Tuple[str, str], ...]
+SeriesKey = Tuple[str, Labels]
+FuncT = TypeVar("FuncT", bound=Callable[..., Any])
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class HistogramSnapshot:
+    """Summary of values recorded by a histogram"""
+
+    count: int = 0
+    total: float = 0.0
+    min_value: float = 0.0
+    max_value: float = 0.0
+    quantiles: dict[float, float] = dataclasses.field(default_factory=dict)
+
+
+class Histogram:
+    """
+    Log-linear histogram in the style of HdrHistogram.
+
+    Each power of two is split into SUB_BUCKETS equal buckets so quantiles
+    are accurate to a fixed relative error, whatever the magnitude of values.
+    Only buckets used are stored.
+    """
+
+    def __init__(self) -> None:
+        self._buckets: dict[int, int] = {}
+        self._count = 0
+        self._total = 0.0
+        self._min = math.inf
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, value: float) -> None:
+        """Record a value, values below MIN_VALUE are counted as MIN_VALUE."""
+        mantissa, exponent = math.frexp(max(value, MIN_VALUE))
+        index = exponent * SUB_BUCKETS + int((mantissa * 2 - 1) * SUB_BUCKETS)
+        with self._lock:
+            self._buckets[index] = self._buckets.get(index, 0) + 1
+            self._count += 1
+            self._total += value
+            self._min = min(self._min, value)
+            self._max = max(self._max, value)
+
+    def snapshot(self, quantiles: tuple[float, ...] = QUANTILES) -> HistogramSnapshot:
+        """
+        Summarize the values recorded.
+
+        Args:
+            quantiles: Quantiles to estimate, between 0 and 1
+
+        Returns:
+            Count, total, min, max and each quantile's estimated value
+        """
+        with self._lock:
+            buckets = sorted(self._buckets.items())
+            snapshot = HistogramSnapshot(
+                count=self._count,
+                total=self._total,
+                min_value=self._min if self._count else 0.0,
+                max_value=self._max,
+            )
+
+        for quantile in quantiles:
+            value = 0.0
+            seen = 0
+            for index, count in buckets:
+                seen += count
+                value = _bucket_midpoint(index)
+                if seen >= quantile * snapshot.count:
+                    break
+            # The true value is within the bucket and within what was recorded
+            value = min(max(value, snapshot.min_value), snapshot.max_value)
+            snapshot.quantiles[quantile] = value
+        return snapshot
+
+
+def _bucket_midpoint(index: int) -> float:
+    """Return the middle of the range of values counted in a bucket."""
+    exponent, sub_bucket = divmod(index, SUB_BUCKETS)
+    return math.ldexp(1 + (sub_bucket + 0.5) / SUB_BUCKETS, exponent - 1)
+
+
+class MetricsRegistry:
+    """Named counters and histograms, each series identified by its labels."""
+
+    def __init__(self, enabled: bool = False) -> None:
+        """
+        Recording is skipped while disabled. Hot paths check `enabled` before
+        reading a clock so disabled metrics cost a single attribute lookup.
+
+        Args:
+            enabled: Record metrics from the start
+        """
+        self.enabled = enabled
+        self._counters: dict[SeriesKey, int] = {}
+        self._histograms: dict[SeriesKey, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: int = 1, **labels: str) -> None:
+        """Add to a counter, created at zero on first use."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record a value, in seconds for latencies, in a histogram."""
+        if not self.enabled:
+            return
+        self._histogram((name, tuple(sorted(labels.items())))).record(value)
+
+    def timed(self, name: str, **labels: str) -> Callable[[FuncT], FuncT]:
+        """
+        Decorate a function to record its duration and count its errors.
+
+        Durations are observed in `name`, exceptions raised are counted in
+        `name` with `_errors_total` in place of a `_seconds` suffix.
+        """
+        prefix = name[: -len("_seconds")] if name.endswith("_seconds") else name
+        errors = f"{prefix}_errors_total"
+        key = (name, tuple(sorted(labels.items())))
+
+        def decorator(func: FuncT) -> FuncT:
+            @functools.wraps(func)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    self.inc(errors, 1, **labels)
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - start
+                    self._histogram(key).record(elapsed)
+
+            return wrapper  # type: ignore
+
+        return decorator
+
+    def _histogram(self, key: SeriesKey) -> Histogram:
+        """Return the histogram of a series, created on first use."""
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def get_counters(self) -> dict[SeriesKey, int]:
+        """Return a snapshot of every counter by name and labels."""
+        with self._lock:
+            return dict(self._counters)
+
+    def get_histograms(self) -> dict[SeriesKey, HistogramSnapshot]:
+        """Return a summary of every histogram by name and labels."""
+        with self._lock:
+            histograms = dict(self._histograms)
+        return {key: histogram.snapshot() for key, histogram in histograms.items()}
+
+    def reset(self) -> None:
+        """Remove all counters and histograms."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Histograms are exposed as summaries, with quantiles, sum and count.
+        """
+        lines: list[str] = []
+        typed: set[str] = set()
+        for (name, labels), value in sorted(self.get_counters().items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_render_labels(labels)} {value}")
+
+        for (name, labels), snapshot in sorted(self.get_histograms().items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} summary")
+            for quantile, estimate in snapshot.quantiles.items():
+                quantile_labels = labels + (("quantile", str(quantile)),)
+                lines.append(f"{name}{_render_labels(quantile_labels)} {estimate:.9g}")
+            lines.append(f"{name}_sum{_render_labels(labels)} {snapshot.total:.9g}")
+            lines.append(f"{name}_count{_render_labels(labels)} {snapshot.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def render_text(self) -> str:
+        """Render a short human readable summary, latencies in milliseconds."""
+        lines: list[str] = []
+        for (name, labels), snapshot in sorted(self.get_histograms().items()):
+            quantiles = " ".join(
+                f"p{quantile * 100:g}={value * 1000:.2f}"
+                for quantile, value in snapshot.quantiles.items()
+            )
+            lines.append(
+                f"{name}{_render_labels(labels)} n={snapshot.count} {quantiles} "
+                f"max={snapshot.max_value * 1000:.2f}"
+            )
+        for (name, labels), value in sorted(self.get_counters().items()):
+            lines.append(f"{name}{_render_labels(labels)} {value}")
+        return "\n".join(lines)
+
+
+def _render_labels(labels: Labels) -> str:
+    """Render labels as `{name="value",...}`, or nothing without labels."""
+    if not labels:
+        return ""
+    rendered = ",".join(
+        '{}="{}"'.format(
+            name,
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return f"{{{rendered}}}"
+
+
+async def serve(
+    metrics: MetricsRegistry,
+    host: str = "127.0.0.1",
+    port: int = 9100,
+) -> asyncio.Server:
+    """
+    Serve metrics in the Prometheus text format over HTTP.
+
+    Every request, whatever its path, is answered with all metrics.
+
+    Args:
+        metrics: Registry to serve
+        host: Interface to listen on, local only by default
+        port: Port to listen on, 0 picks a free port
+
+    Returns:
+        The started server, close it to stop serving
+    """
+
+    async def _handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            # Headers are read and ignored, the request is always the same
+            await reader.readuntil(b"\r\n\r\n")
+            body = metrics.render_prometheus().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+                b"Connection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, OSError):
+            logger.debug("Dropped malformed metrics request")
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(_handle, host, port)
+
+
+# Shared by the whole bot, enabled by configuration
+registry = MetricsRegistry()
@@ -0,0 +1,127 @@
+"""Search user patterns in worker processes under a time budget."""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import re
+import threading
+from multiprocessing.pool import Pool
+from typing import Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def _search_all(patterns: Sequence[tuple[str, int]], text: str) -> list[bool]:
+    """Search text with each pattern. Runs in a worker process."""
+    return [bool(re.search(pattern, text, flags)) for pattern, flags in patterns]
+
+
+class PatternSandbox:
+    """
+    Search user patterns in worker processes under a time budget.
+
+    A pattern that backtracks catastrophically holds the worker running it, not
+    the caller. When a search runs over budget the workers are terminated and
+    replaced, the patterns responsible are found and reported as over budget.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = 0.1,
+        processes: int = 1,
+        start_method: str = "spawn",
+    ) -> None:
+        """
+        Workers are started on first search. Safe to share between threads.
+
+        Args:
+            timeout: Seconds a single search of all patterns may take
+            processes: Number of worker processes
+            start_method: multiprocessing start method for workers
+        """
+        self.timeout = timeout
+        self._processes = processes
+        self._context = multiprocessing.get_context(start_method)
+        self._pool: Pool | None = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        # One search per worker at a time, so time waiting in line is not counted
+        self._workers = threading.BoundedSemaphore(processes)
+
+    def search(
+        self,
+        patterns: Sequence[re.Pattern[str]],
+        text: str,
+    ) -> list[bool | None]:
+        """
+        Search text with each pattern.
+
+        Args:
+            patterns: Compiled patterns to search with
+            text: Text to search
+
+        Returns:
+            For each pattern True if found, False if not, or None if the pattern
+            ran over budget
+        """
+        if not patterns:
+            return []
+
+        found = self._run(patterns, text)
+        if found is not None:
+            return list(found)
+        if len(patterns) == 1:
+            logger.warning("Pattern '%s' over budget", patterns[0].pattern)
+            return [None]
+
+        # Retry one at a time to separate patterns over budget from the rest
+        results: list[bool | None] = []
+        for pattern in patterns:
+            results.extend(self.search([pattern], text))
+        return results
+
+    def close(self) -> None:
+        """Terminate the worker processes."""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+    def _run(
+        self,
+        patterns: Sequence[re.Pattern[str]],
+        text: str,
+    ) -> list[bool] | None:
+        """Search on a worker, None if over budget. Workers are then replaced."""
+        args = ([(pattern.pattern, pattern.flags) for pattern in patterns], text)
+        while True:
+            with self._workers:
+                pool, generation = self._get_pool()
+                try:
+                    return pool.apply_async(_search_all, args).get(self.timeout)
+
+                except multiprocessing.TimeoutError:
+                    with self._lock:
+                        if generation != self._generation:
+                            # Workers were replaced by another over budget search
+                            continue
+                        self._replace_pool()
+                    return None
+
+    def _get_pool(self) -> tuple[Pool, int]:
+        """Return the worker pool, starting it if needed, and its generation."""
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._context.Pool(self._processes)
+                # Wait for workers to start, start up time is not search time
+                self._pool.starmap(_search_all, [([], "")] * self._processes, 1)
+            return self._pool, self._generation
+
+    def _replace_pool(self) -> None:
+        """Terminate the workers, a new pool is started on next use. Hold lock."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        self._generation += 1
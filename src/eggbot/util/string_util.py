@@ -1,15 +1,298 @@
 """Common helper methods for strings."""
 from __future__ import annotations
 
+import collections
+import dataclasses
 import re
+import sys
+import threading
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Tuple
+
+if sys.version_info >= (3, 11):
+    from re import _parser as sre_parse  # type: ignore
+else:
+    import sre_parse
+
+# Longest user pattern accepted by safe compile
+MAX_PATTERN_LENGTH = 256
+# Largest explicit repeat count, e.g. `{1000}`, accepted by safe compile
+MAX_REPEAT_COUNT = 100
+# Number of compiled patterns kept by StringUtil.compile_pattern
+PATTERN_CACHE_SIZE = 1024
+
+_CacheKey = Tuple[str, int, bool]
+_CharTest = Callable[[str], bool]
+_REPEATS = {"MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"}
+# Characters, with their other cases, tried when checking whether two
+# quantified items can overlap. Some change length with case, "ß" to "SS"
+_OVERLAP_SAMPLE = [
+    [case for case in {char, char.lower(), char.upper()} if len(case) == 1]
+    for char in map(chr, range(0x800))
+]
+_CATEGORIES: Dict[str, _CharTest] = {
+    "CATEGORY_DIGIT": str.isdecimal,
+    "CATEGORY_NOT_DIGIT": lambda char: not char.isdecimal(),
+    "CATEGORY_SPACE": str.isspace,
+    "CATEGORY_NOT_SPACE": lambda char: not char.isspace(),
+    "CATEGORY_WORD": lambda char: char.isalnum() or char == "_",
+    "CATEGORY_NOT_WORD": lambda char: not (char.isalnum() or char == "_"),
+}
+
+
+class UnsafePatternError(ValueError):
+    """Raised when a pattern is rejected by safe compile."""
+
+
+@dataclasses.dataclass
+class CacheStats:
+    """Usage of the compiled pattern cache"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+
+class _PatternCache:
+    """Thread-safe LRU cache of compiled patterns."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._patterns: collections.OrderedDict[
+            _CacheKey, re.Pattern[str]
+        ] = collections.OrderedDict()
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def get(self, key: _CacheKey) -> re.Pattern[str] | None:
+        with self._lock:
+            compiled = self._patterns.get(key)
+            if compiled is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+                self._patterns.move_to_end(key)
+            return compiled
+
+    def put(self, key: _CacheKey, compiled: re.Pattern[str]) -> None:
+        with self._lock:
+            self._patterns[key] = compiled
+            self._patterns.move_to_end(key)
+            while len(self._patterns) > self.max_size:
+                self._patterns.popitem(last=False)
+                self._stats.evictions += 1
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return dataclasses.replace(self._stats, size=len(self._patterns))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._patterns.clear()
+            self._stats = CacheStats()
+
+
+_cache = _PatternCache(PATTERN_CACHE_SIZE)
 
 
 class StringUtil:
     """Common helper methods for strings."""
 
     @staticmethod
-    def has_match(text: str, pattern: str) -> bool:
-        """Run pattern match against string and custom restrictions."""
-        # TODO: Exclude particulars of regex
-        # TODO: Consider pregen of all patterns to compiled expressions
-        return bool(re.match(pattern, text, flags=re.I))
+    def has_match(text: str, pattern: str, *, safe: bool = False) -> bool:
+        """
+        Run pattern match against string and custom restrictions.
+
+        Args:
+            text: Text to match from the start of
+            pattern: Regular expression, compiled once and cached
+            safe: Reject patterns prone to catastrophic backtracking
+
+        Raises:
+            UnsafePatternError: When safe and the pattern is rejected
+        """
+        return bool(StringUtil.compile_pattern(pattern, re.I, safe=safe).match(text))
+
+    @staticmethod
+    def compile_pattern(
+        pattern: str, flags: int = 0, *, safe: bool = False
+    ) -> re.Pattern[str]:
+        """
+        Compile a pattern, reusing the result from a bounded LRU cache.
+
+        Args:
+            pattern: Regular expression to compile
+            flags: re module flags
+            safe: Reject patterns prone to catastrophic backtracking
+
+        Returns:
+            Compiled pattern
+
+        Raises:
+            UnsafePatternError: When safe and the pattern is rejected
+            re.error: When the pattern is invalid
+        """
+        key = (pattern, flags, safe)
+        compiled = _cache.get(key)
+        if compiled is None:
+            if safe:
+                StringUtil.check_pattern(pattern, flags)
+            compiled = re.compile(pattern, flags)
+            _cache.put(key, compiled)
+        return compiled
+
+    @staticmethod
+    def check_pattern(pattern: str, flags: int = 0) -> None:
+        """
+        Check a user pattern is safe to run against untrusted text.
+
+        Rejects patterns longer than MAX_PATTERN_LENGTH, explicit repeat counts
+        over MAX_REPEAT_COUNT, and nested quantifiers such as `(a+)+`, `(a?){25}`
+        or `(\\w+\\s?)*` whose backtracking grows exponentially with input
+        length. Any variable width item inside a repeat counts as nested, only
+        fixed counts such as `(ab{2})+` pass. Alternation inside a quantifier,
+        such as `(a|aa)+`, is rejected for the same reason. Single characters,
+        as in `(a|b)*`, parse to a set and pass.
+
+        Unbounded quantifiers in a row that can match the same characters, such
+        as `a*a*c` or `\\w+\\s?\\w+`, are rejected as their backtracking grows
+        with a power of input length. Case is ignored when comparing them.
+
+        Args:
+            pattern: Regular expression to check
+            flags: re module flags
+
+        Raises:
+            UnsafePatternError: When the pattern is rejected
+            re.error: When the pattern is invalid
+        """
+        if len(pattern) > MAX_PATTERN_LENGTH:
+            raise UnsafePatternError(
+                f"Pattern longer than {MAX_PATTERN_LENGTH} characters"
+            )
+        _check_items(sre_parse.parse(pattern, flags), pattern, in_repeat=False)
+
+    @staticmethod
+    def get_cache_stats() -> CacheStats:
+        """Return a snapshot of compiled pattern cache usage."""
+        return _cache.stats()
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Empty the compiled pattern cache and reset its stats."""
+        _cache.clear()
+
+
+def _check_items(items: Any, pattern: str, in_repeat: bool) -> None:
+    """Walk a parsed pattern, raising on nested, overlapping or oversized repeats."""
+    # First characters of the last unbounded repeat, while nothing has to
+    # match between it and the current item
+    previous: _CharTest | None = None
+    for op, value in items:
+        name = str(op)
+        if name in _REPEATS:
+            low, high, body = value
+            bounded = high != sre_parse.MAXREPEAT
+            if low > MAX_REPEAT_COUNT or (bounded and high > MAX_REPEAT_COUNT):
+                raise UnsafePatternError(
+                    f"Repeat count over {MAX_REPEAT_COUNT} in '{pattern}'"
+                )
+            if in_repeat and low != high:
+                raise UnsafePatternError(f"Nested quantifier in '{pattern}'")
+            if not bounded:
+                first = _first_char(body)
+                if previous is not None and _overlaps(previous, first):
+                    raise UnsafePatternError(
+                        f"Adjacent quantifiers overlap in '{pattern}'"
+                    )
+                previous = first
+            elif low:
+                previous = None
+            _check_items(body, pattern, in_repeat or high > 1)
+            continue
+
+        # Zero width anchors such as \b leave the previous repeat adjacent
+        if name != "AT":
+            previous = None
+
+        if name == "SUBPATTERN":
+            _check_items(value[-1], pattern, in_repeat)
+
+        elif name == "BRANCH":
+            # Alternatives under a repeat backtrack like nested quantifiers
+            if in_repeat:
+                raise UnsafePatternError(f"Alternation in quantifier in '{pattern}'")
+            for branch in value[1]:
+                _check_items(branch, pattern, in_repeat)
+
+        elif name in {"ASSERT", "ASSERT_NOT"}:
+            _check_items(value[1], pattern, in_repeat)
+
+        elif name == "ATOMIC_GROUP":
+            _check_items(value, pattern, in_repeat)
+
+        elif name == "GROUPREF_EXISTS":
+            if in_repeat:
+                raise UnsafePatternError(f"Alternation in quantifier in '{pattern}'")
+            for branch in value[1:]:
+                if branch is not None:
+                    _check_items(branch, pattern, in_repeat)
+
+
+def _first_char(items: Any) -> _CharTest:
+    """Return a test for the characters items can start with, all when unknown."""
+    for op, value in items:
+        name = str(op)
+        if name == "AT":
+            continue
+        if name == "LITERAL":
+            return lambda char: char == chr(value)
+        if name == "NOT_LITERAL":
+            return lambda char: char != chr(value)
+        if name == "IN":
+            return _in_set(value)
+        if name == "SUBPATTERN":
+            return _first_char(value[-1])
+        if name in _REPEATS and value[0] > 0:
+            return _first_char(value[2])
+        break
+    return lambda char: True
+
+
+def _in_set(members: Any) -> _CharTest:
+    """Return a test for a parsed character set such as `[^a-c\\d]`."""
+    ranges: list[tuple[int, int]] = []
+    categories: list[_CharTest] = []
+    negate = False
+    for op, value in members:
+        name = str(op)
+        if name == "NEGATE":
+            negate = True
+        elif name == "LITERAL":
+            ranges.append((value, value))
+        elif name == "RANGE":
+            ranges.append(value)
+        elif name == "CATEGORY" and str(value) in _CATEGORIES:
+            categories.append(_CATEGORIES[str(value)])
+        else:
+            return lambda char: True
+
+    def _test(char: str) -> bool:
+        code = ord(char)
+        found = any(low <= code <= high for low, high in ranges) or any(
+            test(char) for test in categories
+        )
+        return negate != found
+
+    return _test
+
+
+def _overlaps(first: _CharTest, second: _CharTest) -> bool:
+    """Return whether any character, in either case, passes both tests."""
+    for cases in _OVERLAP_SAMPLE:
+        if any(first(case) for case in cases) and any(second(case) for case in cases):
+            return True
+    return False
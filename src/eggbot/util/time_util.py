@@ -0,0 +1,21 @@
+"""Common helper methods for timestamps."""
+from __future__ import annotations
+
+import datetime
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class TimeUtil:
+    """Common helper methods for timestamps."""
+
+    @staticmethod
+    def to_epoch(value: datetime.datetime) -> int:
+        """Convert naive UTC datetime to integer microseconds since the epoch."""
+        return (value - _EPOCH) // _MICROSECOND
+
+    @staticmethod
+    def from_epoch(value: int) -> datetime.datetime:
+        """Convert integer microseconds since the epoch to naive UTC datetime."""
+        return _EPOCH + datetime.timedelta(microseconds=value)
@@ -7,7 +7,10 @@ from typing import Generator
 
 import pytest
 from eggbot.model.chat_message import ChatMessage
+from eggbot.module.keyword_notifi import find_mentions
 from eggbot.module.keyword_notifi import KeywordNotifi
+from eggbot.util.pattern_sandbox import PatternSandbox
+from eggbot.util.string_util import UnsafePatternError
 
 random.seed()
 
@@ -91,3 +94,193 @@ def test_load_config(size: int, module: KeywordNotifi) -> None:
 def test_load_config_failure(module: KeywordNotifi) -> None:
     with pytest.raises(KeyError, match="Config file missing"):
         module.load_config({})
+
+
+@pytest.fixture
+def fanout_module() -> Generator[KeywordNotifi, None, None]:
+    module = KeywordNotifi()
+    module.load_config(
+        {
+            "keyword_notifi": [
+                {
+                    "member_id": "111",
+                    "pattern": "egg",
+                    "enabled": True,
+                    "block_list": [],
+                },
+                {
+                    "member_id": "222",
+                    "pattern": "eggs?",
+                    "enabled": True,
+                    "block_list": ["999"],
+                },
+                {
+                    "member_id": "333",
+                    "pattern": "egg",
+                    "enabled": False,
+                    "block_list": [],
+                },
+                {
+                    "member_id": "444",
+                    "pattern": "bacon",
+                    "enabled": True,
+                    "block_list": [CHANNEL_ID],
+                },
+            ]
+        }
+    )
+    yield module
+
+
+@pytest.mark.parametrize(
+    ("author_id", "message", "expected"),
+    (
+        (MEMBER_ID, "I have an egg", ["111", "222"]),
+        ("999", "I have an egg", ["111"]),
+        (MEMBER_ID, "Egg and bacon", ["111", "222"]),
+        (MEMBER_ID, "Hey <@333>", []),
+        (MEMBER_ID, "Hey <@222> and <@111>", ["111", "222"]),
+        (MEMBER_ID, "Hey <@!222> and <@555>", ["222"]),
+        (MEMBER_ID, "<@111> has an egg", ["111", "222"]),
+        (MEMBER_ID, "Nothing to see", []),
+    ),
+)
+def test_process_message_batch(
+    fanout_module: KeywordNotifi,
+    author_id: str,
+    message: str,
+    expected: list[str],
+) -> None:
+    chat_message = ChatMessage(
+        member_id=author_id,
+        channel_id=CHANNEL_ID,
+        created_at=str(datetime.utcnow()),
+        raw_message=message,
+    )
+
+    results = fanout_module.process_message_batch(chat_message)
+
+    assert [result.target_id for result in results] == expected
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    (
+        ("no mentions here", set()),
+        ("<@123> and <@!456> and <@123>", {"123", "456"}),
+        ("<#123> <@&456> <@abc> <@ 789>", set()),
+    ),
+)
+def test_find_mentions(text: str, expected: set[str]) -> None:
+    assert find_mentions(text) == expected
+
+
+def make_message(text: str) -> ChatMessage:
+    return ChatMessage(MEMBER_ID, CHANNEL_ID, str(datetime.utcnow()), text)
+
+
+def test_update_member(fanout_module: KeywordNotifi) -> None:
+    member = {"member_id": "555", "pattern": "toast", "enabled": True, "block_list": []}
+
+    fanout_module.update_member(member)
+    added = fanout_module.process_message_batch(make_message("Egg on toast"))
+    fanout_module.update_member({**member, "pattern": "jam"})
+    updated = fanout_module.process_message_batch(make_message("Egg on toast"))
+
+    assert [result.target_id for result in added] == ["111", "222", "555"]
+    assert [result.target_id for result in updated] == ["111", "222"]
+    assert len(fanout_module.configs) == 5
+
+
+def test_remove_member(fanout_module: KeywordNotifi) -> None:
+    removed = fanout_module.remove_member("111")
+    missing = fanout_module.remove_member("111")
+    results = fanout_module.process_message_batch(make_message("I have an egg"))
+
+    assert removed is True
+    assert missing is False
+    assert [result.target_id for result in results] == ["222"]
+    assert "111" not in fanout_module.configs
+
+
+def test_reload_only_rebuilds_changes(fanout_module: KeywordNotifi) -> None:
+    config = {
+        "keyword_notifi": [
+            {"member_id": "111", "pattern": "egg", "enabled": True, "block_list": []},
+            {"member_id": "222", "pattern": "spam", "enabled": True, "block_list": []},
+        ]
+    }
+    before = dict(fanout_module.configs)
+    lookups = fanout_module._lookups
+
+    fanout_module.load_config(config)
+    after = dict(fanout_module.configs)
+    reloaded = fanout_module._lookups
+    fanout_module.load_config(config)
+
+    assert after["111"] is before["111"]
+    assert after["222"] is not before["222"]
+    assert sorted(after) == ["111", "222"]
+    assert reloaded is not lookups
+    assert fanout_module._lookups is reloaded
+
+
+def test_compiled_patterns_are_memoized(fanout_module: KeywordNotifi) -> None:
+    member = {"member_id": "555", "pattern": "egg", "enabled": True, "block_list": []}
+
+    fanout_module.update_member(member)
+    fanout_module.remove_member("111")
+    fanout_module.remove_member("333")
+    fanout_module.remove_member("555")
+
+    assert fanout_module.configs["222"].pattern is fanout_module._compile("eggs?")
+    assert set(fanout_module._compiled) == {"eggs?", "bacon"}
+
+
+def test_failed_load_keeps_config(fanout_module: KeywordNotifi) -> None:
+    lookups = fanout_module._lookups
+
+    with pytest.raises(KeyError):
+        fanout_module.load_config({"keyword_notifi": [{"member_id": "111"}]})
+
+    assert fanout_module._lookups is lookups
+
+
+def test_unsafe_pattern_rejected(fanout_module: KeywordNotifi) -> None:
+    unsafe = {"member_id": "555", "pattern": "(a+)+", "enabled": True, "block_list": []}
+
+    with pytest.raises(UnsafePatternError):
+        fanout_module.update_member(unsafe)
+    fanout_module.load_config(
+        {"keyword_notifi": [unsafe, {**unsafe, "member_id": "666", "pattern": "egg"}]}
+    )
+
+    assert list(fanout_module.configs) == ["666"]
+
+
+def test_pattern_over_budget_disabled() -> None:
+    slow = {
+        "member_id": "555",
+        # Polynomial backtracking, passes check_pattern but not the time budget
+        "pattern": ".*a" * 7 + "c",
+        "enabled": True,
+        "block_list": [],
+    }
+    sandbox = PatternSandbox(timeout=0.5)
+    module = KeywordNotifi(sandbox)
+    module.load_config({"keyword_notifi": [slow, {**slow, "member_id": "666"}]})
+    module.update_member({**slow, "member_id": "111", "pattern": "egg"})
+    # Holds the required literal "ac", so the pattern is searched and fails slowly
+    message = make_message("egg " + "a" * 60 + " acd")
+
+    try:
+        first = module.process_message_batch(message)
+        second = module.process_message_batch(message)
+        module.load_config({"keyword_notifi": [slow]})
+    finally:
+        sandbox.close()
+
+    assert [result.target_id for result in first] == ["111"]
+    assert [result.target_id for result in second] == ["111"]
+    assert module.over_budget_members() == {"555": r"\b" + ".*a" * 7 + r"c\b"}
+    assert module.configs["555"].enabled is False
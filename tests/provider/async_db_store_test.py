@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+from eggbot.provider.async_db_store import AsyncDBStore
+from eggbot.provider.db_connector import DBConnector
+from eggbot.provider.moderation_action_db import ModerationActionDB
+
+DB_FILE = ":memory:"
+EVENT = "This is moderation event note"
+
+
+def test_save_get_delete() -> None:
+    async def _test() -> None:
+        async with AsyncDBStore(DBConnector(), DB_FILE, ModerationActionDB) as store:
+            await store.save(EVENT, member_id="111")
+            rows = await store.get()
+            await store.delete(rows[0].uid)
+            count = await store.run(ModerationActionDB.row_count)
+
+        assert len(rows) == 1
+        assert rows[0].member_id == "111"
+        assert count == 0
+
+    asyncio.run(_test())
+
+
+def test_run_provider_method() -> None:
+    async def _test() -> None:
+        async with AsyncDBStore(DBConnector(), DB_FILE, ModerationActionDB) as store:
+            await store.save(EVENT, member_id="111")
+            await store.save(EVENT, member_id="222")
+            rows = await store.run(ModerationActionDB.get_by_id, "222", active=True)
+
+        assert len(rows) == 1
+
+    asyncio.run(_test())
+
+
+def test_open_failure_raised_on_call() -> None:
+    def _fail(_: object) -> ModerationActionDB:
+        raise ValueError("boom")
+
+    async def _test() -> None:
+        async with AsyncDBStore(DBConnector(), DB_FILE, _fail) as store:
+            with pytest.raises(ValueError, match="boom"):
+                await store.get()
+
+    asyncio.run(_test())
+
+
+def test_event_loop_latency_during_write_burst() -> None:
+    burst_size = 2_000
+    concurrency = 20
+    tick = 0.005
+    lags: list[float] = []
+
+    async def _ticker(done: asyncio.Event) -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(tick)
+            lags.append(time.perf_counter() - start - tick)
+
+    async def _test() -> None:
+        done = asyncio.Event()
+        async with AsyncDBStore(DBConnector(), DB_FILE, ModerationActionDB) as store:
+            ticker = asyncio.create_task(_ticker(done))
+            for _ in range(burst_size // concurrency):
+                await asyncio.gather(*(store.save(EVENT) for _ in range(concurrency)))
+            done.set()
+            await ticker
+            count = await store.run(ModerationActionDB.row_count)
+
+        assert count == burst_size
+
+    asyncio.run(_test())
+
+    # The loop keeps ticking while writes run, no single tick is held up for long
+    assert lags
+    assert max(lags) < 0.05
@@ -1,6 +1,13 @@
 from __future__ import annotations
 
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Generator
+from unittest.mock import MagicMock
+from unittest.mock import patch
 
 import pytest
 from eggbot.provider.db_connector import DBConnection
@@ -39,3 +46,243 @@ def test_cached_connection(provider: DBConnector) -> None:
     with provider.get_connection(DB_FILE) as connection01:
         with provider.get_connection(DB_FILE) as connection02:
             assert connection02._dbconn is connection01._dbconn
+
+
+@pytest.fixture
+def write_behind(tmp_path: Path) -> Generator[tuple[DBConnection, Path], None, None]:
+    db_file = tmp_path / "write_behind.db"
+    connection = DBConnection(sqlite3.connect(db_file))
+    connection.cursor().execute("CREATE TABLE egg (uid INT)")
+    connection.commit()
+    try:
+        yield connection, db_file
+    finally:
+        connection.close()
+
+
+def _durable_rows(db_file: Path) -> int:
+    """Count rows visible from a second connection, only committed rows count"""
+    with sqlite3.connect(db_file) as reader:
+        return reader.execute("SELECT COUNT(*) FROM egg").fetchone()[0]
+
+
+def _write(connection: DBConnection, uid: int) -> None:
+    connection.cursor().execute("INSERT INTO egg (uid) VALUES (?)", (uid,))
+    connection.commit()
+
+
+def test_write_behind_flush_on_size(write_behind: tuple[DBConnection, Path]) -> None:
+    connection, db_file = write_behind
+    flushed: list[int] = []
+    connection.add_flush_hook(flushed.append)
+    connection.enable_write_behind(max_pending=3, max_delay=60)
+
+    _write(connection, 1)
+    _write(connection, 2)
+    before = _durable_rows(db_file)
+    _write(connection, 3)
+
+    assert before == 0
+    assert _durable_rows(db_file) == 3
+    assert flushed == [3]
+    assert connection.pending_writes == 0
+
+
+def test_write_behind_flush_on_delay(write_behind: tuple[DBConnection, Path]) -> None:
+    connection, db_file = write_behind
+    connection.enable_write_behind(max_pending=100, max_delay=60)
+    _write(connection, 1)
+
+    with patch("time.monotonic", return_value=time.monotonic() + 61):
+        connection.flush_if_due()
+
+    assert _durable_rows(db_file) == 1
+
+
+def test_write_behind_idle_flushed_by_timer(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "write_behind.db")
+    provider = DBConnector()
+
+    with provider.get_connection(db_file) as connection:
+        connection.cursor().execute("CREATE TABLE egg (uid INT)")
+        connection.commit()
+        connection.enable_write_behind(max_pending=100, max_delay=0.1)
+        _write(connection, 1)
+        time.sleep(0.5)
+        pending = connection.pending_writes
+
+        # The write lock was released, so a second connection can write at once
+        with sqlite3.connect(db_file, timeout=0) as other:
+            other.execute("INSERT INTO egg (uid) VALUES (2)")
+
+    assert pending == 0
+    assert _durable_rows(Path(db_file)) == 2
+
+
+def test_write_behind_explicit_flush(write_behind: tuple[DBConnection, Path]) -> None:
+    connection, db_file = write_behind
+    connection.enable_write_behind(max_pending=100, max_delay=60)
+    _write(connection, 1)
+    _write(connection, 2)
+
+    connection.flush()
+
+    assert _durable_rows(db_file) == 2
+
+
+def test_write_behind_disable(write_behind: tuple[DBConnection, Path]) -> None:
+    connection, db_file = write_behind
+    connection.enable_write_behind(max_pending=100, max_delay=60)
+    _write(connection, 1)
+
+    connection.disable_write_behind()
+    _write(connection, 2)
+
+    assert _durable_rows(db_file) == 2
+
+
+def test_write_behind_flushed_on_context_exit(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "write_behind.db")
+    provider = DBConnector()
+
+    with provider.get_connection(db_file) as connection:
+        connection.cursor().execute("CREATE TABLE egg (uid INT)")
+        connection.enable_write_behind(max_pending=100, max_delay=60)
+        _write(connection, 1)
+
+    assert _durable_rows(Path(db_file)) == 1
+
+
+def test_connection_per_thread(provider: DBConnector) -> None:
+    with provider.get_connection(DB_FILE) as connection01:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            connection02 = executor.submit(_hold_connection, provider, DB_FILE).result()
+
+    assert connection02 is not connection01._dbconn
+
+
+def _hold_connection(provider: DBConnector, db_file: str) -> sqlite3.Connection:
+    with provider.get_connection(db_file) as connection:
+        return connection._dbconn
+
+
+def test_idle_connection_reused(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "pool.db")
+    provider = DBConnector()
+
+    with provider.get_connection(db_file) as connection01:
+        connection01.cursor().execute("CREATE TABLE egg (uid INT)")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        connection02 = executor.submit(_hold_connection, provider, db_file).result()
+    stats = provider.get_stats(db_file)
+
+    assert connection02 is connection01._dbconn
+    assert stats.opened == 1
+    assert stats.checkouts == 2
+    assert stats.in_use == 0
+    assert stats.idle == 1
+
+
+def test_memory_database_not_pooled(provider: DBConnector) -> None:
+    with provider.get_connection(DB_FILE):
+        pass
+
+    assert provider.get_stats(DB_FILE).idle == 0
+
+
+def test_uncommitted_work_rolled_back_on_release(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "pool.db")
+    provider = DBConnector()
+    with provider.get_connection(db_file) as connection:
+        connection.cursor().execute("CREATE TABLE egg (uid INT)")
+        connection.cursor().execute("INSERT INTO egg (uid) VALUES (1)")
+
+    with provider.get_connection(db_file) as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM egg")
+        result = cursor.fetchone()[0]
+
+    assert result == 0
+
+
+def test_pool_size_limits_checkouts(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "pool.db")
+    provider = DBConnector(pool_size=1, timeout=0.05)
+
+    with provider.get_connection(db_file):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(_hold_connection, provider, db_file)
+            with pytest.raises(TimeoutError):
+                future.result()
+
+    assert provider.get_stats(db_file).in_use == 0
+
+
+def test_pool_wait_recorded(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "pool.db")
+    provider = DBConnector(pool_size=1)
+    checked_out = threading.Event()
+    release = threading.Event()
+
+    def _hold() -> None:
+        with provider.get_connection(db_file):
+            checked_out.set()
+            release.wait()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        executor.submit(_hold)
+        checked_out.wait()
+        waiter = executor.submit(_hold_connection, provider, db_file)
+        time.sleep(0.05)
+        release.set()
+        waiter.result()
+
+    stats = provider.get_stats(db_file)
+    assert stats.waits == 1
+    assert stats.max_wait >= 0.04
+    assert stats.wait_time == stats.max_wait
+
+
+def test_pragmas_applied(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "pool.db")
+    provider = DBConnector(pragmas={"journal_mode": "WAL", "cache_size": -2000})
+
+    with provider.get_connection(db_file) as connection:
+        cursor = connection.cursor()
+        journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+        cache_size = cursor.execute("PRAGMA cache_size").fetchone()[0]
+
+    assert journal_mode == "wal"
+    assert cache_size == -2000
+
+
+def test_pragma_retried_while_locked() -> None:
+    # Two connections opening a new database race to switch its journal mode
+    connection = MagicMock()
+    connection.execute.side_effect = [
+        sqlite3.OperationalError("database is locked"),
+        MagicMock(),
+    ]
+    provider = DBConnector(pragmas={"journal_mode": "WAL"})
+
+    with patch("sqlite3.connect", return_value=connection):
+        assert provider._open("pool.db") is connection
+
+    assert connection.execute.call_count == 2
+
+
+def test_invalid_pragma_name() -> None:
+    with pytest.raises(ValueError, match="Invalid pragma"):
+        DBConnector(pragmas={"cache_size=1; DROP TABLE egg": 1})
+
+
+def test_close_idle(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "pool.db")
+    provider = DBConnector()
+    with provider.get_connection(db_file):
+        pass
+
+    provider.close_idle()
+
+    assert provider.get_stats(db_file).idle == 0
+    assert provider._idle == {}
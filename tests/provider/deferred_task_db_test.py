@@ -1,14 +1,35 @@
 from __future__ import annotations
 
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+from typing import Callable
 from typing import Generator
 
 import pytest
+from eggbot.model.deferred_task import STATUS_DEAD
+from eggbot.model.deferred_task import STATUS_DONE
+from eggbot.model.deferred_task import STATUS_PENDING
 from eggbot.provider.db_connector import DBConnection
+from eggbot.provider.db_connector import DBConnector
 from eggbot.provider.deferred_task_db import DeferredTaskDB
 
 DB_FILE = ":memory:"
-EXPECTED_COLUMNS = ["uid", "created_at", "retry_at", "event_type", "event", "attempts"]
+EXPECTED_COLUMNS = [
+    "uid",
+    "created_at",
+    "retry_at",
+    "event_type",
+    "event",
+    "attempts",
+    "status",
+    "finished_at",
+    "lease_owner",
+    "lease_until",
+]
 TABLE_NAME = "deferred_task"
 TASK = '{"event_type": "remind", "message": "get eggs"}'
 
@@ -23,6 +44,24 @@ def provider() -> Generator[DeferredTaskDB, None, None]:
         dbconn.close()
 
 
+def query_plans(provider: DeferredTaskDB, call: Callable[[], object]) -> list[str]:
+    """Capture the SELECT statements run by call and return their query plans"""
+    statements: list[str] = []
+    provider.dbconn._dbconn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        provider.dbconn._dbconn.set_trace_callback(None)
+
+    cursor = provider.dbconn.cursor()
+    plans: list[str] = []
+    for statement in statements:
+        if statement.startswith("SELECT"):
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}")
+            plans.extend(row[-1] for row in cursor.fetchall())
+    return plans
+
+
 def test_init(provider: DeferredTaskDB) -> None:
     assert isinstance(provider.dbconn, DBConnection)
 
@@ -51,6 +90,13 @@ def test_save(provider: DeferredTaskDB, row_count: int) -> None:
     assert provider.row_count() == row_count
 
 
+@pytest.mark.parametrize(("row_count"), (1, 10, 100, 10_000))
+def test_save_many(provider: DeferredTaskDB, row_count: int) -> None:
+    provider.save_many([TASK] * row_count, "testing", 100)
+
+    assert provider.row_count() == row_count
+
+
 def test_get_all(provider: DeferredTaskDB) -> None:
     total = 10
     for _ in range(total):
@@ -82,3 +128,358 @@ def test_delete(provider: DeferredTaskDB) -> None:
     validate = provider.row_count()
 
     assert validate == 0
+
+
+def test_get_by_event_type_uses_index(provider: DeferredTaskDB) -> None:
+    plans = query_plans(provider, lambda: provider.get("remind"))
+
+    assert plans
+    assert all("deferred_task_event_type_created_at" in plan for plan in plans)
+
+
+def test_get_due(provider: DeferredTaskDB) -> None:
+    provider.save(TASK, "remind", 100)
+    provider.save_many([TASK] * 3, "remind")
+    provider.save(TASK, "announce")
+    due = provider.get_due(event_types=["remind"])[0]
+    provider.complete(due.uid)
+
+    results = provider.get_due(limit=10, event_types=["remind"])
+    limited = provider.get_due(limit=1)
+
+    assert len(results) == 2
+    assert all(task.event_type == "remind" for task in results)
+    assert len(limited) == 1
+
+
+def test_get_due_uses_index(provider: DeferredTaskDB) -> None:
+    plans = query_plans(provider, lambda: provider.get_due())
+
+    assert plans
+    assert any("deferred_task_status_retry_at" in plan for plan in plans)
+
+
+def test_next_retry_at(provider: DeferredTaskDB) -> None:
+    empty = provider.next_retry_at()
+    provider.save(TASK, retry_after=100)
+    provider.save(TASK, retry_after=10)
+
+    result = provider.next_retry_at()
+    after = provider.next_retry_at(result)
+
+    assert empty is None
+    assert result is not None
+    assert after is not None
+    assert (after - result).total_seconds() > 80
+
+
+def test_reschedule(provider: DeferredTaskDB) -> None:
+    provider.save(TASK)
+    task = provider.get()[0]
+    retry_at = datetime.utcnow() + timedelta(seconds=100)
+
+    provider.reschedule(task.uid, retry_at)
+    verify = provider.get()[0]
+
+    assert verify.attempts == 1
+    assert provider.get_due() == []
+    assert provider.next_retry_at() == retry_at
+
+
+@pytest.mark.parametrize(
+    ("status", "attempts"),
+    ((STATUS_DONE, 0), (STATUS_DEAD, 1)),
+)
+def test_finish(provider: DeferredTaskDB, status: str, attempts: int) -> None:
+    provider.save(TASK)
+    task = provider.get()[0]
+
+    if status == STATUS_DONE:
+        provider.complete(task.uid)
+    else:
+        provider.dead_letter(task.uid)
+    verify = provider.get()[0]
+
+    assert verify.status == status
+    assert verify.attempts == attempts
+    assert verify.finished_at is not None
+    assert provider.get_due() == []
+
+
+def test_claim_is_exclusive(provider: DeferredTaskDB) -> None:
+    provider.save_many([TASK] * 5)
+
+    claimed01 = provider.claim("worker01", limit=3)
+    claimed02 = provider.claim("worker02", limit=3)
+    claimed03 = provider.claim("worker03", limit=3)
+
+    assert len(claimed01) == 3
+    assert len(claimed02) == 2
+    assert claimed03 == []
+    assert {task.uid for task in claimed01}.isdisjoint(task.uid for task in claimed02)
+    assert all(task.lease_owner == "worker01" for task in claimed01)
+    assert provider.get_due() == []
+
+
+def test_claim_reclaims_expired_lease(provider: DeferredTaskDB) -> None:
+    provider.save(TASK)
+    provider.claim("worker01", lease_seconds=-1)
+
+    result = provider.claim("worker02")
+
+    assert len(result) == 1
+    assert result[0].lease_owner == "worker02"
+
+
+def test_claim_by_event_type(provider: DeferredTaskDB) -> None:
+    provider.save(TASK, "remind")
+    provider.save(TASK, "announce")
+
+    result = provider.claim("worker01", event_types=["announce"])
+
+    assert [task.event_type for task in result] == ["announce"]
+
+
+def test_finish_requires_lease_owner(provider: DeferredTaskDB) -> None:
+    provider.save(TASK)
+    task = provider.claim("worker01", lease_seconds=-1)[0]
+    provider.claim("worker02")
+
+    provider.complete(task.uid, "worker01")
+    stale = provider.get()[0]
+    provider.complete(task.uid, "worker02")
+    verify = provider.get()[0]
+
+    assert stale.status == STATUS_PENDING
+    assert verify.status == STATUS_DONE
+
+
+def test_reschedule_releases_lease(provider: DeferredTaskDB) -> None:
+    provider.save(TASK)
+    task = provider.claim("worker01")[0]
+
+    provider.reschedule(task.uid, datetime.utcnow(), "worker01")
+    result = provider.claim("worker02")
+
+    assert len(result) == 1
+    assert result[0].attempts == 1
+
+
+def test_next_retry_at_includes_lease_expiry(provider: DeferredTaskDB) -> None:
+    provider.save(TASK)
+    provider.claim("worker01", lease_seconds=100)
+    now = datetime.utcnow()
+
+    result = provider.next_retry_at(now)
+
+    assert result is not None
+    assert 90 < (result - now).total_seconds() <= 100
+
+
+def test_concurrent_claims_never_overlap(tmp_path: Path) -> None:
+    db_file = str(tmp_path / "claims.db")
+    total = 500
+    workers = 4
+    with sqlite3.connect(db_file) as seed:
+        DeferredTaskDB(DBConnection(seed)).save_many([TASK] * total)
+
+    def _drain(owner: str) -> list[str]:
+        claimed: list[str] = []
+        dbconn = DBConnection(sqlite3.connect(db_file, timeout=30))
+        try:
+            db_provider = DeferredTaskDB(dbconn)
+            while True:
+                tasks = db_provider.claim(owner, limit=7)
+                if not tasks:
+                    return claimed
+                claimed.extend(task.uid for task in tasks)
+        finally:
+            dbconn.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_drain, [f"worker{idx}" for idx in range(workers)]))
+
+    claimed = [uid for result in results for uid in result]
+    assert len(claimed) == total
+    assert len(set(claimed)) == total
+
+
+@pytest.mark.parametrize(("page_size"), (1, 3, 10, 500))
+def test_iter_all(provider: DeferredTaskDB, page_size: int) -> None:
+    provider.save_many([TASK] * 10, "remind")
+    provider.save_many([TASK] * 5, "announce")
+    expected = sorted(
+        provider.get("remind"), key=lambda task: (task.created_at, task.uid)
+    )
+
+    results = list(provider.iter_all("remind", page_size=page_size))
+    everything = list(provider.iter_all(page_size=page_size))
+
+    assert results == expected
+    assert len(everything) == 15
+
+
+def test_iter_all_uses_index(provider: DeferredTaskDB) -> None:
+    provider.save_many([TASK] * 3, "remind")
+
+    plans = query_plans(provider, lambda: list(provider.iter_all("remind", 1)))
+
+    assert plans
+    assert all("deferred_task_event_type_created_at" in plan for plan in plans)
+    assert not any("TEMP B-TREE" in plan for plan in plans)
+    # Pages after the first seek past the last row rather than filter to it
+    assert any(
+        plan.startswith("SEARCH") and "(created_at,uid)>(?,?)" in plan for plan in plans
+    )
+
+
+def test_timestamps_stored_as_integers(provider: DeferredTaskDB) -> None:
+    provider.save(TASK)
+    cursor = provider.dbconn.cursor()
+
+    cursor.execute(
+        "SELECT typeof(created_at), typeof(retry_at), typeof(finished_at) "
+        "FROM deferred_task"
+    )
+
+    assert cursor.fetchone() == ("integer", "integer", "null")
+
+
+def test_event_decoded_on_access(provider: DeferredTaskDB) -> None:
+    provider.save(TASK, "remind")
+
+    task = provider.get("remind")[0]
+
+    assert task.raw_event == TASK
+    assert task.event == {"event_type": "remind", "message": "get eggs"}
+    assert task.event is task.event
+    assert isinstance(task.created_at, datetime)
+
+
+def test_migrate_text_timestamps() -> None:
+    created_at = datetime(2023, 1, 2, 3, 4, 5, 678901)
+    retry_at = datetime(2023, 1, 2, 3, 4, 35)
+    dbconn = DBConnection(sqlite3.connect(DB_FILE))
+    cursor = dbconn.cursor()
+    cursor.execute(
+        "CREATE TABLE deferred_task (uid TEXT PRIMARY KEY, created_at TEXT, "
+        "retry_at TEXT, event_type TEXT, event TEXT, attempts INT)"
+    )
+    cursor.execute(
+        "INSERT INTO deferred_task VALUES (?, ?, ?, ?, ?, ?)",
+        ("1", str(created_at), str(retry_at), "remind", TASK, 0),
+    )
+    dbconn.commit()
+
+    task = DeferredTaskDB(dbconn).get()[0]
+    dbconn.close()
+
+    assert task.created_at == created_at
+    assert task.retry_at == retry_at
+    assert task.finished_at is None
+
+
+def test_prune(provider: DeferredTaskDB) -> None:
+    provider.save_many([TASK] * 3)
+    tasks = provider.get()
+    provider.complete(tasks[0].uid)
+    provider.dead_letter(tasks[1].uid)
+    after = datetime.utcnow() + timedelta(seconds=1)
+
+    assert provider.prune(datetime.utcnow() - timedelta(days=1)) == 0
+    assert provider.prune(after, statuses=[STATUS_DEAD]) == 1
+    assert provider.prune(after, limit=1) == 1
+    assert provider.prune(after) == 0
+    assert [task.uid for task in provider.get()] == [tasks[2].uid]
+
+
+def test_prune_archives_before_delete(provider: DeferredTaskDB) -> None:
+    provider.save_many([TASK] * 2)
+    for task in provider.get():
+        provider.complete(task.uid)
+    after = datetime.utcnow() + timedelta(seconds=1)
+    archived: list[dict[str, Any]] = []
+
+    def _fail(rows: list[dict[str, Any]]) -> None:
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        provider.prune(after, archive=_fail)
+    kept = provider.row_count()
+    deleted = provider.prune(after, archive=archived.extend)
+
+    assert kept == 2
+    assert deleted == 2
+    assert provider.row_count() == 0
+    assert [row["status"] for row in archived] == [STATUS_DONE, STATUS_DONE]
+    assert set(archived[0]) == set(EXPECTED_COLUMNS)
+
+
+def test_prune_uses_index(provider: DeferredTaskDB) -> None:
+    plans = query_plans(provider, lambda: provider.prune(datetime.utcnow()))
+
+    assert plans
+    assert all("deferred_task_status_finished_at" in plan for plan in plans)
+
+
+def prune_all(provider: DeferredTaskDB, rows: int) -> None:
+    """Save, finish, and prune rows of about 3KB each"""
+    provider.save_many(["egg" * 1000] * rows)
+    for task in provider.get():
+        provider.complete(task.uid)
+    provider.prune(datetime.utcnow() + timedelta(seconds=1), limit=rows)
+
+
+def test_compact_incremental(tmp_path: Path) -> None:
+    db_file = tmp_path / "compact.db"
+    connector = DBConnector()
+    with connector.get_connection(str(db_file)) as dbconn:
+        provider = DeferredTaskDB(dbconn)
+        prune_all(provider, 1000)
+        page_size = dbconn.cursor().execute("PRAGMA page_size").fetchone()[0]
+
+        partly = provider.compact(max_pages=10)
+        reclaimed = provider.compact()
+        again = provider.compact()
+    connector.close_idle()
+
+    assert partly == 10 * page_size
+    assert reclaimed > 3_000_000
+    assert again == 0
+    assert db_file.stat().st_size < 200_000
+
+
+def test_compact_skips_other_modes(tmp_path: Path) -> None:
+    db_file = tmp_path / "compact.db"
+    connector = DBConnector(pragmas={})
+    with connector.get_connection(str(db_file)) as dbconn:
+        provider = DeferredTaskDB(dbconn)
+        prune_all(provider, 1000)
+        size = db_file.stat().st_size
+
+        reclaimed = provider.compact()
+        mode = dbconn.cursor().execute("PRAGMA auto_vacuum").fetchone()[0]
+    connector.close_idle()
+
+    assert reclaimed == 0
+    assert mode == 0
+    assert db_file.stat().st_size == size
+
+
+def test_vacuum_converts_to_incremental(tmp_path: Path) -> None:
+    db_file = tmp_path / "compact.db"
+    connector = DBConnector(pragmas={})
+    with connector.get_connection(str(db_file)) as dbconn:
+        provider = DeferredTaskDB(dbconn)
+        prune_all(provider, 1000)
+
+        reclaimed = provider.vacuum()
+        mode = dbconn.cursor().execute("PRAGMA auto_vacuum").fetchone()[0]
+        prune_all(provider, 1000)
+        compacted = provider.compact()
+    connector.close_idle()
+
+    assert reclaimed > 3_000_000
+    assert mode == 2
+    assert compacted > 3_000_000
+    assert db_file.stat().st_size < 200_000
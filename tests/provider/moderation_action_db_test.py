@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+import copy
+import dataclasses
+import datetime
+import pickle
 import sqlite3
 import time
+from typing import Any
+from typing import Callable
 from typing import Generator
+from typing import Iterator
 
 import pytest
+from eggbot.provider import moderation_action_db
 from eggbot.provider.db_connector import DBConnection
 from eggbot.provider.moderation_action_db import ModerationActionDB
+from eggbot.provider.schema_migration import migrate
+from eggbot.util.time_util import TimeUtil
 
 DB_FILE = ":memory:"
 EXPECTED_COLUMNS = [
@@ -33,6 +43,36 @@ def provider() -> Generator[ModerationActionDB, None, None]:
         dbconn.close()
 
 
+@pytest.fixture
+def cached() -> Generator[ModerationActionDB, None, None]:
+    dbconn = DBConnection(sqlite3.connect(DB_FILE))
+    db_provider = ModerationActionDB(dbconn, cache_size=3)
+    db_provider.save_many([EVENT] * 2, member_id="111")
+    db_provider.save_many([EVENT] * 2, member_id="222")
+    try:
+        yield db_provider
+    finally:
+        dbconn.close()
+
+
+def query_plans(provider: ModerationActionDB, call: Callable[[], object]) -> list[str]:
+    """Capture the SELECT statements run by call and return their query plans"""
+    statements: list[str] = []
+    provider.dbconn._dbconn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        provider.dbconn._dbconn.set_trace_callback(None)
+
+    cursor = provider.dbconn.cursor()
+    plans: list[str] = []
+    for statement in statements:
+        if statement.startswith("SELECT"):
+            cursor.execute(f"EXPLAIN QUERY PLAN {statement}")
+            plans.extend(row[-1] for row in cursor.fetchall())
+    return plans
+
+
 def test_init(provider: ModerationActionDB) -> None:
     assert isinstance(provider.dbconn, DBConnection)
 
@@ -61,6 +101,13 @@ def test_save(provider: ModerationActionDB, row_count: int) -> None:
     assert provider.row_count() == row_count
 
 
+@pytest.mark.parametrize(("row_count"), (1, 10, 100, 10_000))
+def test_save_many(provider: ModerationActionDB, row_count: int) -> None:
+    provider.save_many([EVENT] * row_count, action="note")
+
+    assert provider.row_count() == row_count
+
+
 def test_get_all(provider: ModerationActionDB) -> None:
     total = 10
     for _ in range(total):
@@ -133,3 +180,619 @@ def test_get_by_id_active(provider: ModerationActionDB) -> None:
     assert len(all_results) == count
     assert len(active_results) == count - 1
     assert len(inactive_results) == 1
+
+
+@pytest.mark.parametrize(("active"), (None, True, False))
+def test_get_by_id_uses_index(
+    provider: ModerationActionDB, active: bool | None
+) -> None:
+    plans = query_plans(provider, lambda: provider.get_by_id("egg", active))
+
+    assert plans
+    # Either member index, both lead with member_id
+    assert all("INDEX moderation_action_member_id_" in plan for plan in plans)
+
+
+def test_get_by_action_uses_index(provider: ModerationActionDB) -> None:
+    plans = query_plans(provider, lambda: provider.get("warn"))
+
+    assert plans
+    assert all("moderation_action_action" in plan for plan in plans)
+
+
+@pytest.mark.parametrize(("page_size"), (1, 3, 10, 500))
+def test_iter_all(provider: ModerationActionDB, page_size: int) -> None:
+    provider.save_many([EVENT] * 10, action="warn")
+    provider.save_many([EVENT] * 5, action="ban")
+    expected = sorted(provider.get("warn"), key=lambda row: (row.created_at, row.uid))
+
+    results = list(provider.iter_all("warn", page_size=page_size))
+    everything = list(provider.iter_all(page_size=page_size))
+
+    assert results == expected
+    assert len(everything) == 15
+
+
+@pytest.mark.parametrize(("page_size"), (1, 3, 500))
+def test_iter_by_id(provider: ModerationActionDB, page_size: int) -> None:
+    provider.save_many([EVENT] * 4, member_id="111")
+    provider.save_many([EVENT] * 2, member_id="222")
+    provider.deactivate(provider.get_by_id("111")[0].uid)
+
+    all_results = list(provider.iter_by_id("111", page_size=page_size))
+    active_results = list(provider.iter_by_id("111", True, page_size=page_size))
+
+    assert len(all_results) == 4
+    assert len(active_results) == 3
+    assert all(row.member_id == "111" for row in all_results)
+
+
+@pytest.mark.parametrize(
+    ("call", "index"),
+    (
+        (lambda p: p.iter_all(page_size=1), "moderation_action_created_at"),
+        (lambda p: p.iter_all("note", 1), "moderation_action_action"),
+        (lambda p: p.iter_by_id("egg", True, 1), "moderation_action_member_id_active"),
+        (
+            lambda p: p.iter_by_id("egg", None, 1),
+            "moderation_action_member_id_created_at",
+        ),
+    ),
+)
+def test_iter_uses_index(
+    provider: ModerationActionDB,
+    call: Callable[[ModerationActionDB], Iterator[Any]],
+    index: str,
+) -> None:
+    provider.save_many([EVENT] * 3)
+
+    plans = query_plans(provider, lambda: list(call(provider)))
+
+    assert plans
+    assert all(index in plan for plan in plans)
+    assert not any("TEMP B-TREE" in plan for plan in plans)
+    # Pages after the first seek past the last row rather than filter to it
+    assert any(
+        plan.startswith("SEARCH") and "(created_at,uid)>(?,?)" in plan for plan in plans
+    )
+
+
+def test_action_is_immutable(provider: ModerationActionDB) -> None:
+    provider.save(EVENT)
+    action = provider.get()[0]
+    actions = {action}
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        action.current_note = "changed"
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        del action.uid
+
+    assert copy.copy(action) == action
+    assert pickle.loads(pickle.dumps(action)) in actions
+
+
+def test_timestamps_stored_as_integers(provider: ModerationActionDB) -> None:
+    provider.save(EVENT)
+    cursor = provider.dbconn.cursor()
+
+    cursor.execute(
+        "SELECT typeof(created_at), typeof(updated_at) FROM moderation_action"
+    )
+
+    assert cursor.fetchone() == ("integer", "integer")
+
+
+def test_update_changes_updated_at(provider: ModerationActionDB) -> None:
+    provider.save(EVENT)
+    before = provider.get()[0]
+
+    provider.update(before.uid, "new note")
+    after = provider.get()[0]
+
+    assert after.created_at == before.created_at
+    assert after.updated_at >= before.updated_at
+    assert after.current_note == "new note"
+    assert after.active is True
+
+
+def test_cache_repeat_lookup_is_hit(cached: ModerationActionDB) -> None:
+    first = cached.get_by_id("111")
+    second = cached.get_by_id("111")
+    cached.get_by_id("111", active=True)
+
+    stats = cached.get_cache_stats()
+    assert first == second
+    assert first[0] is not second[0]
+    assert (stats.hits, stats.misses, stats.size) == (1, 2, 2)
+
+
+def test_cache_disabled_by_default(provider: ModerationActionDB) -> None:
+    provider.get_by_id("111")
+    provider.get_by_id("111")
+
+    assert provider.get_cache_stats().hits == 0
+
+
+def test_cache_evicts_least_recent(cached: ModerationActionDB) -> None:
+    cached.get_by_id("111")
+    cached.get_by_id("222")
+    cached.get_by_id("333")
+    cached.get_by_id("111")
+    cached.get_by_id("444")
+    cached.get_by_id("111")
+
+    stats = cached.get_cache_stats()
+    assert stats.evictions == 1
+    assert stats.size == 3
+    assert stats.hits == 2
+
+
+def test_cache_expires(cached: ModerationActionDB) -> None:
+    assert cached._cache is not None
+    cached._cache.ttl = 0.01
+    cached.get_by_id("111")
+    time.sleep(0.02)
+    cached.get_by_id("111")
+
+    assert cached.get_cache_stats().hits == 0
+
+
+def test_cache_save_invalidates_member(cached: ModerationActionDB) -> None:
+    cached.get_by_id("111")
+    cached.get_by_id("222")
+
+    cached.save(EVENT, member_id="111")
+    cached.save_many([EVENT], member_id="111")
+
+    assert len(cached.get_by_id("111")) == 4
+    assert len(cached.get_by_id("222")) == 2
+    assert cached.get_cache_stats().hits == 1
+
+
+@pytest.mark.parametrize(
+    ("change", "expected"),
+    (
+        (lambda db, uid: db.update(uid, "new note"), (2, 0)),
+        (lambda db, uid: db.delete(uid), (1, 0)),
+        (lambda db, uid: db.deactivate(uid), (1, 1)),
+    ),
+)
+def test_cache_change_by_uid_invalidates_member(
+    cached: ModerationActionDB,
+    change: Callable[[ModerationActionDB, str], None],
+    expected: tuple[int, int],
+) -> None:
+    uid = cached.get_by_id("111", active=True)[0].uid
+    cached.get_by_id("111", active=False)
+    cached.get_by_id("222", active=True)
+
+    change(cached, uid)
+    active = cached.get_by_id("111", active=True)
+    inactive = cached.get_by_id("111", active=False)
+
+    assert (len(active), len(inactive)) == expected
+    assert cached.get_cache_stats().invalidations == 2
+    assert len(cached.get_by_id("222", active=True)) == 2
+    assert cached.get_cache_stats().hits == 1
+
+
+def test_cache_update_is_seen(cached: ModerationActionDB) -> None:
+    uid = cached.get_by_id("111")[0].uid
+
+    cached.update(uid, "new note")
+    notes = {row.uid: row.current_note for row in cached.get_by_id("111")}
+
+    assert notes[uid] == "new note"
+
+
+def test_cache_deactivate_uncached_row(cached: ModerationActionDB) -> None:
+    # Row is not held by any cached result, its member is looked up
+    uid = cached.get_by_id("111", active=True)[0].uid
+    cached.clear_cache()
+    cached.get_by_id("111", active=False)
+
+    cached.deactivate(uid)
+
+    assert len(cached.get_by_id("111", active=False)) == 1
+
+
+@pytest.fixture(params=(True, False), ids=("fts5", "scan"))
+def searchable(
+    request: Any,
+    monkeypatch: pytest.MonkeyPatch,
+) -> Generator[ModerationActionDB, None, None]:
+    """Provider with notes to search, with and without the FTS5 index"""
+    if not request.param:
+        monkeypatch.setattr(moderation_action_db, "has_fts5", lambda _: False)
+    dbconn = DBConnection(sqlite3.connect(DB_FILE))
+    db_provider = ModerationActionDB(dbconn)
+    db_provider.save("Spammed egg pictures in general", member_id="111")
+    db_provider.save("Egg egg egg, posted eggs all day", member_id="222")
+    db_provider.save("Rude to a moderator about bacon", member_id="111")
+    try:
+        yield db_provider
+    finally:
+        dbconn.close()
+
+
+def test_search(searchable: ModerationActionDB) -> None:
+    results = searchable.search("EGG")
+    notes = [result.action.current_note for result in results]
+
+    if searchable.has_search_index:
+        assert notes[0] == "Egg egg egg, posted eggs all day"
+        assert results[0].snippet == "[Egg] [egg] [egg], posted eggs all day"
+        assert results[0].rank < results[1].rank
+    assert sorted(notes) == [
+        "Egg egg egg, posted eggs all day",
+        "Spammed egg pictures in general",
+    ]
+
+
+def test_search_all_words_and_member(searchable: ModerationActionDB) -> None:
+    assert len(searchable.search("egg general")) == 1
+    assert len(searchable.search("egg", member_id="111")) == 1
+    assert len(searchable.search("egg", limit=1)) == 1
+    assert searchable.search("   ") == []
+    assert searchable.search("toast") == []
+
+
+def test_search_prefix(searchable: ModerationActionDB) -> None:
+    results = searchable.search("moder*")
+
+    assert [result.action.member_id for result in results] == ["111"]
+    # Without FTS5 only the prefix itself is marked
+    assert "[moder" in results[0].snippet
+
+
+def test_search_ignores_query_syntax(searchable: ModerationActionDB) -> None:
+    assert searchable.search('egg" OR "bacon') == []
+    assert searchable.search("NEAR(egg") == []
+
+
+def test_search_follows_changes(searchable: ModerationActionDB) -> None:
+    uid = searchable.search("bacon")[0].action.uid
+
+    searchable.update(uid, "Rude to a moderator about toast")
+    after_update = searchable.search("toast")
+    original = searchable.search("bacon")
+    searchable.delete(uid)
+
+    assert [result.action.uid for result in after_update] == [uid]
+    assert [result.action.uid for result in original] == [uid]
+    assert searchable.search("moderator") == []
+
+
+def test_search_after_vacuum(
+    searchable: ModerationActionDB,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    rebuilds: list[bool] = []
+    rebuild = searchable.rebuild_search_index
+
+    def _rebuild() -> None:
+        rebuilds.append(True)
+        rebuild()
+
+    monkeypatch.setattr(searchable, "rebuild_search_index", _rebuild)
+    # Leaves a rowid gap that a full VACUUM may close up
+    searchable.delete(searchable.search("bacon")[0].action.uid)
+    expected = [result.action.uid for result in searchable.search("egg")]
+
+    searchable.vacuum()
+
+    assert rebuilds == [True]
+    assert [result.action.uid for result in searchable.search("egg")] == expected
+    assert searchable.search("bacon") == []
+
+
+def test_search_indexes_existing_notes() -> None:
+    dbconn = DBConnection(sqlite3.connect(DB_FILE))
+    migrate(dbconn, TABLE_NAME, moderation_action_db._MIGRATIONS)
+    dbconn.cursor().execute(
+        f"INSERT INTO {TABLE_NAME} VALUES ('1', 0, 0, '111', 'note', 'egg', 'egg', 1)"
+    )
+
+    provider = ModerationActionDB(dbconn)
+    results = provider.search("egg")
+    provider.rebuild_search_index()
+    rebuilt = provider.search("egg")
+    dbconn.close()
+
+    assert [result.action.uid for result in results] == ["1"]
+    assert [result.action.uid for result in rebuilt] == ["1"]
+
+
+def test_search_uses_index(provider: ModerationActionDB) -> None:
+    plans = query_plans(provider, lambda: provider.search("egg", member_id="111"))
+
+    assert plans[0].startswith("SCAN moderation_action_fts VIRTUAL TABLE INDEX")
+    assert plans[1] == "SEARCH moderation_action USING INTEGER PRIMARY KEY (rowid=?)"
+
+
+@pytest.mark.parametrize(
+    ("old", "new"),
+    (
+        ("", "egg"),
+        ("egg", ""),
+        ("Spammed eggs in general", "Spammed boiled eggs in #general, twice"),
+        ("same", "same"),
+        ("\u00e9gg \U0001f95a", "\U0001f95a egg"),
+    ),
+)
+def test_delta_round_trip(old: str, new: str) -> None:
+    delta = moderation_action_db.encode_delta(old, new)
+
+    assert moderation_action_db.apply_delta(old, delta) == new
+
+
+def test_delta_is_compact() -> None:
+    old = "Posted eggs in the bacon channel after being asked to stop. " * 5
+    new = old.replace("bacon", "toast", 1)
+
+    delta = moderation_action_db.encode_delta(old, new)
+
+    assert delta == '[19,-5,"toast",276]'
+
+
+def test_note_history(provider: ModerationActionDB) -> None:
+    provider.save("first")
+    uid = provider.get()[0].uid
+    provider.update(uid, "second")
+    provider.update(uid, "second")
+    provider.update(uid, "third")
+
+    history = provider.get_history(uid)
+
+    assert [(rev.revision, rev.note) for rev in history] == [
+        (0, "first"),
+        (1, "second"),
+        (2, "third"),
+    ]
+    assert history[0].created_at <= history[1].created_at <= history[2].created_at
+    assert provider.get()[0].current_note == "third"
+    assert provider.get_history("missing") == []
+
+
+def test_failed_update_rolls_back_revision(provider: ModerationActionDB) -> None:
+    provider.save("first")
+    uid = provider.get()[0].uid
+    cursor = provider.dbconn.cursor()
+    cursor.execute(
+        "CREATE TRIGGER refuse BEFORE UPDATE ON moderation_action "
+        "BEGIN SELECT RAISE(ABORT, 'no edits'); END"
+    )
+    provider.dbconn.commit()
+
+    with pytest.raises(sqlite3.IntegrityError):
+        provider.update(uid, "second")
+
+    assert [rev.note for rev in provider.get_history(uid)] == ["first"]
+    assert provider.get()[0].current_note == "first"
+
+
+def test_note_as_of(provider: ModerationActionDB) -> None:
+    provider.save("first")
+    uid = provider.get()[0].uid
+    provider.update(uid, "second")
+    provider.update(uid, "third")
+    history = provider.get_history(uid)
+    before = history[0].created_at - datetime.timedelta(microseconds=1)
+
+    assert provider.get_note_as_of(uid, before) is None
+    assert provider.get_note_as_of(uid, history[0].created_at) == "first"
+    assert provider.get_note_as_of(uid, history[1].created_at) == "second"
+    assert provider.get_note_as_of(uid, datetime.datetime.utcnow()) == "third"
+
+
+def test_delete_removes_history(provider: ModerationActionDB) -> None:
+    provider.save("first")
+    uid = provider.get()[0].uid
+    provider.update(uid, "second")
+
+    provider.delete(uid)
+    cursor = provider.dbconn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM moderation_action_revision")
+
+    assert cursor.fetchone()[0] == 0
+
+
+def test_history_migrated_from_edited_notes() -> None:
+    dbconn = DBConnection(sqlite3.connect(DB_FILE))
+    old_migrations = [m for m in moderation_action_db._MIGRATIONS if m.version < 5]
+    migrate(dbconn, TABLE_NAME, old_migrations)
+    dbconn.cursor().executemany(
+        f"INSERT INTO {TABLE_NAME} VALUES (?, 0, ?, '111', 'note', ?, ?, 1)",
+        (("1", 0, "egg", "egg"), ("2", 1_000_000, "egg", "fried egg")),
+    )
+
+    provider = ModerationActionDB(dbconn)
+    unedited = provider.get_history("1")
+    edited = provider.get_history("2")
+    provider.update("2", "fried eggs")
+    updated = provider.get_history("2")
+    dbconn.close()
+
+    assert [rev.note for rev in unedited] == ["egg"]
+    assert [rev.note for rev in edited] == ["egg", "fried egg"]
+    assert edited[1].created_at == datetime.datetime(1970, 1, 1, 0, 0, 1)
+    assert [rev.note for rev in updated] == ["egg", "fried egg", "fried eggs"]
+
+
+@pytest.fixture
+def reported(provider: ModerationActionDB) -> ModerationActionDB:
+    """Actions of three members over two weeks of January 2024"""
+    rows = [
+        ("1", "2024-01-01 10:00", "111", "warn", True),
+        ("2", "2024-01-01 23:59", "111", "ban", True),
+        ("3", "2024-01-02 00:00", "222", "warn", False),
+        ("4", "2024-01-03 12:00", "222", "warn", True),
+        ("5", "2024-01-08 08:00", "333", "note", True),
+        ("6", "2024-01-09 08:00", "111", "warn", False),
+    ]
+    provider.dbconn.cursor().executemany(
+        f"INSERT INTO {TABLE_NAME} VALUES (?, ?, 0, ?, ?, 'egg', 'egg', ?)",
+        (
+            (
+                uid,
+                TimeUtil.to_epoch(datetime.datetime.fromisoformat(created_at)),
+                member_id,
+                action,
+                active,
+            )
+            for uid, created_at, member_id, action, active in rows
+        ),
+    )
+    return provider
+
+
+def daily_totals(provider: ModerationActionDB) -> list[tuple[Any, ...]]:
+    cursor = provider.dbconn.cursor()
+    cursor.execute("SELECT * FROM moderation_action_daily ORDER BY 1, 2, 3")
+    return cursor.fetchall()
+
+
+def test_count_by_action(reported: ModerationActionDB) -> None:
+    january_2 = datetime.date(2024, 1, 2)
+
+    assert reported.count_by_action() == {"ban": 1, "note": 1, "warn": 4}
+    assert reported.count_by_action(active=False) == {"warn": 2}
+    assert reported.count_by_action(since=january_2) == {"note": 1, "warn": 3}
+    assert reported.count_by_action(until=january_2) == {"ban": 1, "warn": 1}
+
+
+def test_count_by_period(reported: ModerationActionDB) -> None:
+    by_day = reported.count_by_period("day", action="warn")
+    by_week = reported.count_by_period("week")
+    second_week = reported.count_by_period("week", since=datetime.date(2024, 1, 3))
+
+    assert by_day == {
+        datetime.date(2024, 1, 1): 1,
+        datetime.date(2024, 1, 2): 1,
+        datetime.date(2024, 1, 3): 1,
+        datetime.date(2024, 1, 9): 1,
+    }
+    assert by_week == {datetime.date(2024, 1, 1): 4, datetime.date(2024, 1, 8): 2}
+    assert second_week == {datetime.date(2024, 1, 1): 1, datetime.date(2024, 1, 8): 2}
+    with pytest.raises(ValueError):
+        reported.count_by_period("month")
+
+
+def test_count_active(reported: ModerationActionDB) -> None:
+    counts = reported.count_active()
+
+    assert (counts.active, counts.inactive, counts.total) == (4, 2, 6)
+    assert reported.count_active(action="ban").inactive == 0
+
+
+def test_count_by_member(reported: ModerationActionDB) -> None:
+    assert reported.count_by_member() == {"111": 3, "222": 2, "333": 1}
+    assert reported.count_by_member(active=False) == {"111": 1, "222": 1}
+
+
+def test_top_offenders(reported: ModerationActionDB) -> None:
+    since = datetime.datetime(2024, 1, 1, 12)
+    until = datetime.datetime(2024, 1, 9)
+
+    assert reported.top_offenders(since) == [("111", 2), ("222", 2), ("333", 1)]
+    assert reported.top_offenders(since, until, limit=1) == [("222", 2)]
+    assert reported.top_offenders(since, action="note") == [("333", 1)]
+
+
+def test_daily_totals_follow_changes(reported: ModerationActionDB) -> None:
+    reported.save("egg", member_id="444", action="warn")
+    reported.deactivate("1")
+    reported.deactivate("1")
+    reported.update("4", "bacon")
+    reported.delete("5")
+    expected = daily_totals(reported)
+    reported.dbconn.cursor().execute("DELETE FROM moderation_action_daily")
+    reported.dbconn.cursor().execute(
+        "INSERT INTO moderation_action_daily "
+        "SELECT created_at / 86400000000, action, active, COUNT(*) "
+        f"FROM {TABLE_NAME} GROUP BY 1, 2, 3"
+    )
+
+    assert daily_totals(reported) == expected
+    assert not [row for row in expected if row[-1] == 0]
+
+
+@pytest.mark.parametrize(
+    ("call"),
+    (
+        lambda p: p.count_by_action(datetime.date(2024, 1, 1), active=True),
+        lambda p: p.count_by_period("week", action="warn"),
+        lambda p: p.count_active(),
+    ),
+)
+def test_counts_read_daily_totals(
+    provider: ModerationActionDB, call: Callable[[ModerationActionDB], object]
+) -> None:
+    plans = query_plans(provider, lambda: call(provider))
+
+    assert plans
+    assert all(
+        "moderation_action_daily" in plan
+        for plan in plans
+        if not plan.startswith("USE TEMP B-TREE")
+    )
+
+
+def test_member_counts_read_index_only(provider: ModerationActionDB) -> None:
+    since = datetime.datetime(2024, 1, 1)
+    by_member = query_plans(provider, lambda: provider.count_by_member(active=True))
+    top = query_plans(provider, lambda: provider.top_offenders(since))
+
+    assert "COVERING INDEX moderation_action_member_id_active" in by_member[0]
+    assert "COVERING INDEX moderation_action_created_at (created_at>?)" in top[0]
+
+
+def test_daily_totals_migrated() -> None:
+    dbconn = DBConnection(sqlite3.connect(DB_FILE))
+    old_migrations = [m for m in moderation_action_db._MIGRATIONS if m.version < 6]
+    migrate(dbconn, TABLE_NAME, old_migrations)
+    dbconn.cursor().executemany(
+        f"INSERT INTO {TABLE_NAME} VALUES (?, ?, 0, '111', 'warn', 'egg', 'egg', 1)",
+        (("1", 0), ("2", 1), ("3", 86_400_000_000)),
+    )
+
+    provider = ModerationActionDB(dbconn)
+    totals = daily_totals(provider)
+    dbconn.close()
+
+    assert totals == [(0, "warn", 1, 2), (1, "warn", 1, 1)]
+
+
+def test_prune_inactive(cached: ModerationActionDB) -> None:
+    inactive = cached.get_by_id("111")[0]
+    cached.deactivate(inactive.uid)
+    before_deactivated = cached.get_by_id("111", active=False)
+    after = datetime.datetime.utcnow() + datetime.timedelta(seconds=1)
+
+    kept = cached.prune(inactive.created_at)
+    deleted = cached.prune(after)
+
+    assert kept == 0
+    assert deleted == 1
+    assert [action.uid for action in before_deactivated] == [inactive.uid]
+    assert cached.get_by_id("111", active=False) == []
+    assert cached.row_count() == 3
+    assert cached.count_active() == moderation_action_db.ActiveCounts(3, 0)
+    assert cached.get_history(inactive.uid) == []
+
+
+def test_prune_removes_from_search(searchable: ModerationActionDB) -> None:
+    searchable.save("omelette in the egg channel")
+    uid = searchable.search("omelette")[0].action.uid
+    searchable.deactivate(uid)
+
+    searchable.prune(datetime.datetime.utcnow() + datetime.timedelta(seconds=1))
+
+    assert searchable.search("omelette") == []
+
+
+def test_prune_uses_index(provider: ModerationActionDB) -> None:
+    plans = query_plans(provider, lambda: provider.prune(datetime.datetime.utcnow()))
+
+    assert plans
+    assert all("moderation_action_inactive_created_at" in plan for plan in plans)
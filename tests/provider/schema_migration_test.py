@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Generator
+
+import pytest
+from eggbot.provider import schema_migration
+from eggbot.provider.db_connector import DBConnection
+from eggbot.provider.schema_migration import get_version
+from eggbot.provider.schema_migration import migrate
+from eggbot.provider.schema_migration import Migration
+
+DB_FILE = ":memory:"
+TABLE_NAME = "egg"
+MIGRATIONS = (
+    Migration(2, ("CREATE INDEX egg_color ON egg (color)",)),
+    Migration(1, ("CREATE TABLE egg (uid TEXT PRIMARY KEY, color TEXT)",)),
+)
+
+
+@pytest.fixture
+def dbconn() -> Generator[DBConnection, None, None]:
+    connection = DBConnection(sqlite3.connect(DB_FILE))
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+def _index_names(dbconn: DBConnection) -> list[str]:
+    cursor = dbconn.cursor()
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=?",
+        (TABLE_NAME,),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def test_get_version_unknown_table(dbconn: DBConnection) -> None:
+    assert get_version(dbconn, TABLE_NAME) == 0
+
+
+def test_migrate_applies_in_order(dbconn: DBConnection) -> None:
+    result = migrate(dbconn, TABLE_NAME, MIGRATIONS)
+
+    assert result == 2
+    assert get_version(dbconn, TABLE_NAME) == 2
+    assert "egg_color" in _index_names(dbconn)
+
+
+def test_migrate_skips_applied(dbconn: DBConnection) -> None:
+    migrate(dbconn, TABLE_NAME, MIGRATIONS[1:])
+
+    # Would fail on a duplicate table if version 1 ran again
+    result = migrate(dbconn, TABLE_NAME, MIGRATIONS)
+
+    assert result == 2
+
+
+def test_migrate_failure_rolls_back(dbconn: DBConnection) -> None:
+    broken = Migration(3, ("CREATE INDEX egg_uid ON egg (uid)", "NOT VALID SQL"))
+
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(dbconn, TABLE_NAME, MIGRATIONS + (broken,))
+
+    assert get_version(dbconn, TABLE_NAME) == 2
+    assert "egg_uid" not in _index_names(dbconn)
+
+
+def test_migrate_rechecks_version_when_locked(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    db_file = str(tmp_path / "egg.db")
+    first = DBConnection(sqlite3.connect(db_file))
+    second = DBConnection(sqlite3.connect(db_file))
+    reads: list[str] = []
+
+    def _stale_version(dbconn: DBConnection, table_name: str) -> int:
+        """Version read by second before first migrated, then the real one"""
+        reads.append(table_name)
+        return 0 if len(reads) == 1 else get_version(dbconn, table_name)
+
+    # Both processes start together, first wins the write lock
+    migrate(first, TABLE_NAME, MIGRATIONS)
+    monkeypatch.setattr(schema_migration, "get_version", _stale_version)
+    result = migrate(second, TABLE_NAME, MIGRATIONS)
+    first.close()
+    second.close()
+
+    assert result == 2
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import pytest
+from eggbot.service.config_watcher import ConfigFileWatcher
+
+
+@pytest.fixture
+def config_file(tmp_path: Path) -> Path:
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"egg": 1}))
+    return path
+
+
+def touch(path: Path, content: dict[str, Any]) -> None:
+    """Write content, forcing a new modification time"""
+    path.write_text(json.dumps(content))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_loads_only_on_change(config_file: Path) -> None:
+    loaded: list[dict[str, Any]] = []
+    watcher = ConfigFileWatcher(config_file, loaded.append)
+
+    first = watcher.check()
+    unchanged = watcher.check()
+    touch(config_file, {"egg": 2})
+    changed = watcher.check()
+
+    assert [first, unchanged, changed] == [True, False, True]
+    assert loaded == [{"egg": 1}, {"egg": 2}]
+
+
+def test_missing_file_keeps_config(tmp_path: Path) -> None:
+    loaded: list[dict[str, Any]] = []
+    watcher = ConfigFileWatcher(tmp_path / "missing.json", loaded.append)
+
+    assert watcher.check() is False
+    assert loaded == []
+
+
+def test_invalid_file_keeps_config(config_file: Path) -> None:
+    loaded: list[dict[str, Any]] = []
+    watcher = ConfigFileWatcher(config_file, loaded.append)
+    watcher.check()
+
+    config_file.write_text("{not json")
+    result = watcher.check()
+
+    assert result is False
+    assert loaded == [{"egg": 1}]
+
+
+def test_run_polls_file(config_file: Path) -> None:
+    loaded: list[dict[str, Any]] = []
+    watcher = ConfigFileWatcher(config_file, loaded.append, interval=0.01)
+
+    async def _test() -> None:
+        runner = asyncio.create_task(watcher.run())
+        await asyncio.sleep(0.05)
+        touch(config_file, {"egg": 2})
+        await asyncio.sleep(0.05)
+        watcher.stop()
+        await runner
+
+    asyncio.run(_test())
+
+    assert loaded == [{"egg": 1}, {"egg": 2}]
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import datetime
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from eggbot.model.chat_message import ChatMessage
+from eggbot.model.chat_response import ChatResponse
+from eggbot.model.message_filter import MessageFilter
+from eggbot.module.chat_module_intf import ChatModuleIntf
+from eggbot.service.message_dispatcher import MessageDispatcher
+from eggbot.service.message_dispatcher import to_chat_message
+from eggbot.util import metrics
+
+MESSAGE = ChatMessage(
+    member_id="12345678901234567",
+    channel_id="01234567890123456",
+    created_at=str(datetime.datetime.utcnow()),
+    raw_message="Hello there",
+)
+
+
+class EchoModule(ChatModuleIntf):
+    """Responds to every message, optionally blocking the calling thread."""
+
+    def __init__(
+        self,
+        target_id: str,
+        delay: float = 0.0,
+        message_filter: MessageFilter | None = None,
+    ) -> None:
+        self.target_id = target_id
+        self.delay = delay
+        self.filter = message_filter or MessageFilter()
+        self.calls = 0
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def process_message(self, message: ChatMessage) -> ChatResponse | None:
+        with self._lock:
+            self.calls += 1
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+        return ChatResponse(message.raw_message, self.target_id, None)
+
+    def message_filter(self) -> MessageFilter:
+        return self.filter
+
+    def load_config(self, config: dict[str, Any]) -> None:
+        ...
+
+
+class BrokenModule(EchoModule):
+    def process_message(self, message: ChatMessage) -> ChatResponse | None:
+        raise ValueError("no eggs")
+
+
+def test_to_chat_message() -> None:
+    created_at = datetime.datetime(2023, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+    message: Any = SimpleNamespace(
+        author=SimpleNamespace(id=123),
+        channel=SimpleNamespace(id=456),
+        created_at=created_at,
+        content="Hello there",
+        guild=SimpleNamespace(id=789),
+    )
+
+    result = to_chat_message(message)
+
+    assert result == ChatMessage(
+        "123", "456", "2023-01-02 03:04:05", "Hello there", "789"
+    )
+
+
+def test_dispatch_collects_responses_in_order() -> None:
+    dispatcher = MessageDispatcher()
+    dispatcher.register(EchoModule("first"), name="first")
+    dispatcher.register(EchoModule("second"), name="second", offload=False)
+
+    results = asyncio.run(dispatcher.dispatch(MESSAGE))
+    dispatcher.close()
+
+    assert [result.target_id for result in results] == ["first", "second"]
+
+
+def test_failing_module_is_isolated() -> None:
+    dispatcher = MessageDispatcher()
+    dispatcher.register(BrokenModule("broken"))
+    dispatcher.register(EchoModule("echo"))
+
+    results = asyncio.run(dispatcher.dispatch(MESSAGE))
+    stats = dispatcher.get_stats()
+    dispatcher.close()
+
+    assert [result.target_id for result in results] == ["echo"]
+    assert stats["BrokenModule"].errors == 1
+    assert stats["BrokenModule"].calls == 1
+    assert stats["EchoModule"].responses == 1
+    assert stats["EchoModule"].errors == 0
+
+
+def test_stats_count_calls_and_time() -> None:
+    dispatcher = MessageDispatcher()
+    dispatcher.register(EchoModule("echo", delay=0.01))
+
+    async def _test() -> None:
+        for _ in range(3):
+            await dispatcher.dispatch(MESSAGE)
+
+    asyncio.run(_test())
+    stats = dispatcher.get_stats()["EchoModule"]
+    dispatcher.close()
+
+    assert stats.calls == 3
+    assert stats.responses == 3
+    assert stats.total_time >= 0.03
+    assert stats.max_time >= 0.01
+
+
+def test_module_metrics() -> None:
+    dispatcher = MessageDispatcher()
+    dispatcher.register(EchoModule("echo"))
+    dispatcher.register(BrokenModule("broken"))
+    metrics.registry.enabled = True
+
+    try:
+        asyncio.run(dispatcher.dispatch(MESSAGE))
+        histograms = metrics.registry.get_histograms()
+        counters = metrics.registry.get_counters()
+    finally:
+        metrics.registry.enabled = False
+        metrics.registry.reset()
+        dispatcher.close()
+
+    assert histograms[("eggbot_module_seconds", (("module", "EchoModule"),))].count == 1
+    assert counters == {
+        ("eggbot_module_errors_total", (("module", "BrokenModule"),)): 1
+    }
+
+
+def test_concurrency_is_bounded_per_module() -> None:
+    slow = EchoModule("slow", delay=0.02)
+    fast = EchoModule("fast")
+    dispatcher = MessageDispatcher(max_concurrency=8)
+    dispatcher.register(slow, name="slow", max_concurrency=2)
+    dispatcher.register(fast, name="fast")
+
+    async def _test() -> list[list[ChatResponse]]:
+        return await asyncio.gather(*(dispatcher.dispatch(MESSAGE) for _ in range(10)))
+
+    results = asyncio.run(_test())
+    dispatcher.close()
+
+    assert all(len(result) == 2 for result in results)
+    assert slow.peak == 2
+
+
+def test_slow_module_does_not_block_event_loop() -> None:
+    dispatcher = MessageDispatcher()
+    dispatcher.register(EchoModule("slow", delay=0.2))
+    lags: list[float] = []
+
+    async def _ticker(done: asyncio.Event) -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    async def _test() -> None:
+        done = asyncio.Event()
+        ticker = asyncio.create_task(_ticker(done))
+        await dispatcher.dispatch(MESSAGE)
+        done.set()
+        await ticker
+
+    asyncio.run(_test())
+    dispatcher.close()
+
+    assert len(lags) > 10
+    assert max(lags) < 0.05
+
+
+@pytest.mark.parametrize(
+    ("message_filter", "expected"),
+    (
+        (MessageFilter(), True),
+        (MessageFilter(channel_ids=frozenset({MESSAGE.channel_id})), True),
+        (MessageFilter(channel_ids=frozenset({"999"})), False),
+        (MessageFilter(guild_id="777"), True),
+        (MessageFilter(guild_id="999"), False),
+        (MessageFilter(excluded_authors=frozenset({MESSAGE.member_id})), False),
+        (MessageFilter(excluded_authors=frozenset({"999"})), True),
+        (MessageFilter(required_tokens=frozenset({"there", "eggs"})), True),
+        (MessageFilter(required_tokens=frozenset({"HELLO"})), True),
+        (MessageFilter(required_tokens=frozenset({"eggs"})), False),
+    ),
+)
+def test_message_filter(message_filter: MessageFilter, expected: bool) -> None:
+    module = EchoModule("echo", message_filter=message_filter)
+    dispatcher = MessageDispatcher()
+    dispatcher.register(module, offload=False)
+    message = dataclasses.replace(MESSAGE, guild_id="777")
+
+    results = asyncio.run(dispatcher.dispatch(message))
+
+    assert bool(results) is expected
+    assert module.calls == int(expected)
+
+
+def test_route_combines_filters_in_registration_order() -> None:
+    dispatcher = MessageDispatcher()
+    filters = {
+        "any": MessageFilter(),
+        "channel": MessageFilter(channel_ids=frozenset({"1", "2"})),
+        "guild": MessageFilter(guild_id="10"),
+        "both": MessageFilter(channel_ids=frozenset({"1"}), guild_id="10"),
+        "token": MessageFilter(
+            channel_ids=frozenset({"2"}), required_tokens=frozenset({"egg"})
+        ),
+    }
+    for name, message_filter in filters.items():
+        dispatcher.register(EchoModule(name, message_filter=message_filter), name=name)
+
+    def _route(channel_id: str, guild_id: str | None, text: str = "") -> list[str]:
+        return dispatcher.route(ChatMessage("5", channel_id, "", text, guild_id))
+
+    assert _route("1", "10") == ["any", "channel", "guild", "both"]
+    assert _route("1", None) == ["any", "channel"]
+    assert _route("2", "10") == ["any", "channel", "guild"]
+    assert _route("2", "10", "An Egg!") == ["any", "channel", "guild", "token"]
+    assert _route("3", "11") == ["any"]
+
+
+def test_refresh_filters() -> None:
+    module = EchoModule(
+        "echo", message_filter=MessageFilter(channel_ids=frozenset({"1"}))
+    )
+    dispatcher = MessageDispatcher()
+    dispatcher.register(module)
+    before = dispatcher.route(MESSAGE)
+
+    module.filter = MessageFilter()
+    stale = dispatcher.route(MESSAGE)
+    dispatcher.refresh_filters()
+    after = dispatcher.route(MESSAGE)
+    dispatcher.close()
+
+    assert before == []
+    assert stale == []
+    assert after == ["EchoModule"]
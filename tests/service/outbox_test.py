@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+from eggbot.model.chat_response import ChatResponse
+from eggbot.model.deferred_task import STATUS_DONE
+from eggbot.model.deferred_task import STATUS_PENDING
+from eggbot.provider.async_db_store import AsyncDBStore
+from eggbot.provider.db_connector import DBConnector
+from eggbot.provider.deferred_task_db import DeferredTaskDB
+from eggbot.service.outbox import Outbox
+from eggbot.service.outbox import OUTBOX_EVENT_TYPE
+from eggbot.service.send_queue import SendQueue
+from eggbot.service.task_scheduler import TaskScheduler
+
+DB_FILE = ":memory:"
+
+
+class FakeTransport:
+    """Records messages sent, failing the first fail_count sends."""
+
+    def __init__(self, delay: float = 0.0, fail_count: int = 0) -> None:
+        self.delay = delay
+        self.fail_count = fail_count
+        self.sent: list[str] = []
+        self.queue: SendQueue | None = None
+        self.peak_queued = 0
+
+    async def __call__(self, response: ChatResponse) -> None:
+        if self.queue is not None:
+            queued = self.queue.get_stats().queued
+            self.peak_queued = max(self.peak_queued, queued)
+        await asyncio.sleep(self.delay)
+        if self.fail_count:
+            self.fail_count -= 1
+            raise ConnectionError("no eggs")
+        self.sent.append(response.message)
+
+
+Test = Callable[[Outbox, SendQueue, AsyncDBStore[DeferredTaskDB]], Awaitable[Any]]
+
+
+def run_outbox(
+    test: Test,
+    transport: FakeTransport,
+    *,
+    run_scheduler: bool = True,
+    queue_kwargs: dict[str, Any] | None = None,
+    **kwargs: Any,
+) -> Any:
+    """Run test with an outbox, its scheduler running if run_scheduler"""
+
+    async def _run() -> Any:
+        queue = SendQueue(
+            transport,
+            **{"coalesce_window": 0, "max_length": 1, **(queue_kwargs or {})},
+        )
+        transport.queue = queue
+        async with AsyncDBStore(DBConnector(), DB_FILE, DeferredTaskDB) as store:
+            scheduler = TaskScheduler(store, base_backoff=0.01, **kwargs)
+            outbox = Outbox(queue, scheduler)
+            runner = asyncio.create_task(scheduler.run()) if run_scheduler else None
+            try:
+                return await asyncio.wait_for(test(outbox, queue, store), timeout=5)
+            finally:
+                await scheduler.stop()
+                if runner:
+                    await runner
+
+    return asyncio.run(_run())
+
+
+async def wait_for_sent(transport: FakeTransport, count: int) -> None:
+    while len(transport.sent) < count:
+        await asyncio.sleep(0.005)
+
+
+def test_overflow_is_saved() -> None:
+    transport = FakeTransport(delay=0.05)
+
+    async def _test(outbox: Outbox, queue: SendQueue, store: Any) -> Any:
+        for idx in range(3):
+            await outbox.send(ChatResponse(f"egg{idx}", str(idx), None))
+        await outbox.join()
+        return await store.get(OUTBOX_EVENT_TYPE)
+
+    tasks = run_outbox(
+        _test,
+        transport,
+        run_scheduler=False,
+        queue_kwargs={"max_pending": 1},
+    )
+
+    assert transport.sent == ["egg0"]
+    assert sorted(task.event["message"] for task in tasks) == ["egg1", "egg2"]
+    assert tasks[0].event == {"message": "egg1", "target_id": "1", "delivery_id": None}
+
+
+def test_failed_send_is_saved_for_later() -> None:
+    transport = FakeTransport(fail_count=1)
+
+    async def _test(outbox: Outbox, queue: SendQueue, store: Any) -> Any:
+        await outbox.send(ChatResponse("egg", "1", "2"))
+        await outbox.join()
+        return await store.get(OUTBOX_EVENT_TYPE)
+
+    tasks = run_outbox(_test, transport, run_scheduler=False)
+
+    assert transport.sent == []
+    assert len(tasks) == 1
+    assert tasks[0].status == STATUS_PENDING
+    assert tasks[0].retry_at > tasks[0].created_at
+
+
+def test_outbox_is_drained() -> None:
+    transport = FakeTransport(fail_count=2)
+    total = 20
+
+    async def _test(outbox: Outbox, queue: SendQueue, store: Any) -> Any:
+        responses = [ChatResponse(f"egg{idx}", str(idx), None) for idx in range(total)]
+        await outbox.spill(responses)
+        await wait_for_sent(transport, total)
+        await asyncio.sleep(0.05)
+        return await store.get(OUTBOX_EVENT_TYPE)
+
+    tasks = run_outbox(_test, transport)
+
+    assert sorted(transport.sent) == sorted(f"egg{idx}" for idx in range(total))
+    assert all(task.status == STATUS_DONE for task in tasks)
+    assert sum(task.attempts for task in tasks) == 2
+
+
+def test_drain_holds_bounded_responses() -> None:
+    transport = FakeTransport(delay=0.001)
+    total = 200
+
+    async def _test(outbox: Outbox, queue: SendQueue, store: Any) -> None:
+        responses = [ChatResponse(f"egg{idx}", str(idx), None) for idx in range(total)]
+        await outbox.spill(responses)
+        await wait_for_sent(transport, total)
+
+    run_outbox(_test, transport, batch_size=10, max_concurrency=4)
+
+    assert len(transport.sent) == total
+    assert transport.peak_queued <= 4
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import json
+from pathlib import Path
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+from eggbot.provider.async_db_store import AsyncDBStore
+from eggbot.provider.db_connector import DBConnector
+from eggbot.provider.deferred_task_db import DeferredTaskDB
+from eggbot.provider.moderation_action_db import ModerationActionDB
+from eggbot.service.retention import RetentionJob
+from eggbot.service.retention import RetentionPolicy
+
+TASK = '{"message": "get eggs"}'
+NOW = datetime.timedelta(0)
+
+Tasks = AsyncDBStore[DeferredTaskDB]
+Actions = AsyncDBStore[ModerationActionDB]
+
+
+def finish_tasks(provider: DeferredTaskDB, count: int) -> None:
+    provider.save_many([TASK] * count)
+    for task in provider.get():
+        provider.complete(task.uid)
+
+
+def deactivate_actions(provider: ModerationActionDB, count: int) -> None:
+    provider.save_many(["egg"] * count, member_id="111")
+    for action in provider.get()[1:]:
+        provider.deactivate(action.uid)
+
+
+def run_retention(
+    tmp_path: Path,
+    test: Callable[[Tasks, Actions], Awaitable[Any]],
+) -> Any:
+    """Run test with stores for both tables of a database file"""
+
+    async def _run() -> Any:
+        connector = DBConnector()
+        database = str(tmp_path / "retention.db")
+        async with AsyncDBStore(connector, database, DeferredTaskDB) as tasks:
+            async with AsyncDBStore(connector, database, ModerationActionDB) as actions:
+                return await asyncio.wait_for(test(tasks, actions), timeout=5)
+
+    return asyncio.run(_run())
+
+
+def test_run_once_prunes_in_chunks(tmp_path: Path) -> None:
+    async def _test(tasks: Tasks, actions: Actions) -> Any:
+        await tasks.run(finish_tasks, 5)
+        await actions.run(deactivate_actions, 3)
+        job = RetentionJob(
+            [
+                RetentionPolicy("deferred_task", tasks, NOW),
+                RetentionPolicy("moderation_action", actions, NOW),
+            ],
+            chunk_size=2,
+            chunk_pause=0,
+        )
+        report = await job.run_once()
+        tasks_kept = await tasks.run(DeferredTaskDB.row_count)
+        actions_kept = await actions.run(ModerationActionDB.row_count)
+        return report, (tasks_kept, actions_kept)
+
+    report, kept = run_retention(tmp_path, _test)
+
+    assert report.deleted == {"deferred_task": 5, "moderation_action": 2}
+    assert report.archived == 0
+    assert report.bytes_reclaimed >= 0
+    assert kept == (0, 1)
+
+
+def test_run_once_keeps_recent_rows(tmp_path: Path) -> None:
+    async def _test(tasks: Tasks, actions: Actions) -> Any:
+        await tasks.run(finish_tasks, 2)
+        week = datetime.timedelta(days=7)
+        job = RetentionJob([RetentionPolicy("deferred_task", tasks, week)])
+        return await job.run_once(), await tasks.run(DeferredTaskDB.row_count)
+
+    report, kept = run_retention(tmp_path, _test)
+
+    assert report.deleted == {"deferred_task": 0}
+    assert kept == 2
+
+
+def test_run_once_archives(tmp_path: Path) -> None:
+    archive_dir = tmp_path / "archive"
+
+    async def _test(tasks: Tasks, actions: Actions) -> Any:
+        await actions.run(deactivate_actions, 4)
+        job = RetentionJob(
+            [RetentionPolicy("moderation_action", actions, NOW)],
+            chunk_size=2,
+            archive_dir=archive_dir,
+        )
+        return await job.run_once()
+
+    report = run_retention(tmp_path, _test)
+    lines = (archive_dir / "moderation_action.jsonl").read_text().splitlines()
+
+    assert report.archived == 3
+    assert len(lines) == 3
+    assert all(json.loads(line)["active"] == 0 for line in lines)
+
+
+def test_run_until_stopped(tmp_path: Path) -> None:
+    async def _test(tasks: Tasks, actions: Actions) -> Any:
+        await tasks.run(finish_tasks, 1)
+        job = RetentionJob([RetentionPolicy("deferred_task", tasks, NOW)])
+        runner = asyncio.create_task(job.run())
+        while await tasks.run(DeferredTaskDB.row_count):
+            await asyncio.sleep(0.01)
+        job.stop()
+        await runner
+
+    run_retention(tmp_path, _test)
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+from eggbot.model.chat_response import ChatResponse
+from eggbot.service.send_queue import route_key
+from eggbot.service.send_queue import SendQueue
+
+
+class FakeTransport:
+    """Records responses sent, optionally taking time or failing."""
+
+    def __init__(self, delay: float = 0.0, fail_on: str | None = None) -> None:
+        self.delay = delay
+        self.fail_on = fail_on
+        self.sent: list[tuple[float, ChatResponse]] = []
+
+    async def __call__(self, response: ChatResponse) -> None:
+        await asyncio.sleep(self.delay)
+        if response.message == self.fail_on:
+            raise ConnectionError("no eggs")
+        self.sent.append((time.perf_counter(), response))
+
+    def messages(self, key: str | None = None) -> list[str]:
+        return [
+            response.message
+            for _, response in self.sent
+            if key is None or route_key(response) == key
+        ]
+
+
+def run_queue(
+    test: Callable[[SendQueue], Awaitable[Any]],
+    transport: FakeTransport,
+    **kwargs: Any,
+) -> Any:
+    """Run test with a send queue, waiting for all sends to finish"""
+
+    async def _run() -> Any:
+        queue = SendQueue(transport, **kwargs)
+        result = await asyncio.wait_for(test(queue), timeout=5)
+        await asyncio.wait_for(queue.join(), timeout=5)
+        return queue.get_stats(), result
+
+    return asyncio.run(_run())
+
+
+def test_route_key() -> None:
+    assert route_key(ChatResponse("egg", "123", None)) == "member:123"
+    assert route_key(ChatResponse("egg", "123", "456")) == "channel:456"
+
+
+def test_sends_in_order_per_route() -> None:
+    transport = FakeTransport()
+
+    async def _test(queue: SendQueue) -> None:
+        for idx in range(10):
+            await queue.put(ChatResponse(f"a{idx}", "1", None))
+            await queue.put(ChatResponse(f"b{idx}", "2", None))
+
+    stats, _ = run_queue(_test, transport, coalesce_window=0, max_length=1, rate=1000)
+
+    assert transport.messages("member:1") == [f"a{idx}" for idx in range(10)]
+    assert transport.messages("member:2") == [f"b{idx}" for idx in range(10)]
+    assert stats.sent == 20
+    assert stats.queued == 0
+
+
+def test_coalesces_within_window() -> None:
+    transport = FakeTransport()
+
+    async def _test(queue: SendQueue) -> None:
+        await queue.put(ChatResponse("egg1", "1", None))
+        await queue.put(ChatResponse("egg2", "1", None))
+        await queue.put(ChatResponse("egg3", "2", None))
+        await queue.put(ChatResponse("egg4", "1", None))
+
+    stats, _ = run_queue(_test, transport, coalesce_window=0.05, separator="|")
+
+    assert transport.messages("member:1") == ["egg1|egg2|egg4"]
+    assert transport.messages("member:2") == ["egg3"]
+    assert stats.sent == 2
+    assert stats.coalesced == 2
+
+
+def test_coalescing_respects_max_length() -> None:
+    transport = FakeTransport()
+
+    async def _test(queue: SendQueue) -> None:
+        for idx in range(5):
+            await queue.put(ChatResponse(f"egg{idx}", "1", None))
+
+    run_queue(_test, transport, coalesce_window=0.05, separator="|", max_length=9)
+
+    assert transport.messages() == ["egg0|egg1", "egg2|egg3", "egg4"]
+
+
+def test_route_is_rate_limited() -> None:
+    transport = FakeTransport()
+    total = 6
+
+    async def _test(queue: SendQueue) -> float:
+        start = time.perf_counter()
+        for idx in range(total):
+            await queue.put(ChatResponse(f"egg{idx}", "1", None))
+            await queue.put(ChatResponse(f"egg{idx}", "2", None))
+        await queue.join()
+        return time.perf_counter() - start
+
+    stats, elapsed = run_queue(
+        _test, transport, rate=50, burst=2, coalesce_window=0, max_length=1
+    )
+
+    # Two sent at once, the remaining four spaced by 1/50th of a second
+    assert elapsed >= (total - 2) / 50
+    assert elapsed < 0.5
+    assert len(transport.messages("member:1")) == total
+    assert len(transport.messages("member:2")) == total
+    assert stats.throttle_time > 0
+
+
+def test_throttled_route_does_not_delay_others() -> None:
+    transport = FakeTransport()
+
+    async def _test(queue: SendQueue) -> None:
+        for idx in range(3):
+            await queue.put(ChatResponse(f"slow{idx}", "1", None))
+        await asyncio.sleep(0.01)
+        await queue.put(ChatResponse("fast", "2", None))
+
+    run_queue(_test, transport, rate=5, burst=1, coalesce_window=0, max_length=1)
+
+    sent_at = {response.message: at for at, response in transport.sent}
+    assert sent_at["fast"] < sent_at["slow1"] < sent_at["slow2"]
+
+
+def test_put_waits_when_full() -> None:
+    transport = FakeTransport(delay=0.05)
+
+    async def _test(queue: SendQueue) -> float:
+        await queue.put(ChatResponse("egg1", "1", None))
+        await queue.put(ChatResponse("egg2", "2", None))
+        start = time.perf_counter()
+        await queue.put(ChatResponse("egg3", "3", None))
+        return time.perf_counter() - start
+
+    stats, waited = run_queue(_test, transport, max_pending=2, coalesce_window=0)
+
+    assert waited >= 0.04
+    assert stats.sent == 3
+
+
+def test_failed_send_is_counted() -> None:
+    transport = FakeTransport(fail_on="bad")
+
+    async def _test(queue: SendQueue) -> None:
+        await queue.put(ChatResponse("bad", "1", None))
+        await queue.put(ChatResponse("good", "1", None))
+
+    stats, _ = run_queue(_test, transport, coalesce_window=0, max_length=1)
+
+    assert transport.messages() == ["good"]
+    assert stats.failed == 1
+    assert stats.sent == 1
+    assert stats.queued == 0
+
+
+def test_throughput_across_routes() -> None:
+    transport = FakeTransport()
+    routes = 200
+    per_route = 10
+
+    async def _test(queue: SendQueue) -> None:
+        for idx in range(per_route):
+            for route in range(routes):
+                await queue.put(ChatResponse(f"egg{idx}", str(route), None))
+
+    stats, _ = run_queue(
+        _test,
+        transport,
+        rate=1_000_000,
+        burst=per_route,
+        global_rate=1_000_000,
+        coalesce_window=0,
+        max_length=1,
+        max_pending=100,
+    )
+
+    assert stats.sent == routes * per_route
+    for route in range(routes):
+        expected = [f"egg{idx}" for idx in range(per_route)]
+        assert transport.messages(f"member:{route}") == expected
+
+
+def test_offer_refuses_when_full() -> None:
+    transport = FakeTransport(delay=0.05, fail_on="bad")
+
+    async def _test(queue: SendQueue) -> list[Any]:
+        good = queue.offer(ChatResponse("good", "1", None))
+        bad = queue.offer(ChatResponse("bad", "2", None))
+        refused = queue.offer(ChatResponse("egg", "3", None))
+        assert good and bad
+        return [await good, await bad, refused]
+
+    stats, results = run_queue(_test, transport, max_pending=2, coalesce_window=0)
+
+    assert results == [True, False, None]
+    assert transport.messages() == ["good"]
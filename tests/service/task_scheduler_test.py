@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+import pytest
+from eggbot.model.deferred_task import DeferredTask
+from eggbot.model.deferred_task import STATUS_DEAD
+from eggbot.model.deferred_task import STATUS_DONE
+from eggbot.model.deferred_task import STATUS_PENDING
+from eggbot.provider.async_db_store import AsyncDBStore
+from eggbot.provider.db_connector import DBConnector
+from eggbot.provider.deferred_task_db import DeferredTaskDB
+from eggbot.service.task_scheduler import TaskScheduler
+
+DB_FILE = ":memory:"
+TASK = '{"message": "get eggs"}'
+
+
+def run_scheduler(
+    test: Callable[[TaskScheduler, AsyncDBStore[DeferredTaskDB]], Awaitable[Any]],
+    **kwargs: Any,
+) -> Any:
+    """Run test with a running scheduler, returns test result"""
+
+    async def _run() -> Any:
+        async with AsyncDBStore(DBConnector(), DB_FILE, DeferredTaskDB) as store:
+            scheduler = TaskScheduler(store, **kwargs)
+            runner = asyncio.create_task(scheduler.run())
+            try:
+                return await asyncio.wait_for(test(scheduler, store), timeout=5)
+            finally:
+                await scheduler.stop()
+                await runner
+
+    return asyncio.run(_run())
+
+
+def test_dispatch_by_event_type() -> None:
+    handled: list[str] = []
+
+    async def _test(scheduler: TaskScheduler, store: AsyncDBStore[DeferredTaskDB]):
+        done = asyncio.Event()
+
+        async def _handler(task: DeferredTask) -> None:
+            handled.append(task.event_type)
+            if len(handled) == 2:
+                done.set()
+
+        scheduler.register("remind", _handler)
+        await scheduler.submit(TASK, "remind")
+        await scheduler.submit(TASK, "remind")
+        await scheduler.submit(TASK, "unhandled")
+        await done.wait()
+        await asyncio.sleep(0.05)
+        return await store.get()
+
+    tasks = run_scheduler(_test)
+
+    assert handled == ["remind", "remind"]
+    assert sorted(task.status for task in tasks) == [
+        STATUS_DONE,
+        STATUS_DONE,
+        STATUS_PENDING,
+    ]
+
+
+def test_task_not_dispatched_before_due() -> None:
+    handled: list[DeferredTask] = []
+
+    async def _test(scheduler: TaskScheduler, store: AsyncDBStore[DeferredTaskDB]):
+        async def _handler(task: DeferredTask) -> None:
+            handled.append(task)
+
+        scheduler.register("remind", _handler)
+        await scheduler.submit(TASK, "remind", retry_after=60)
+        await asyncio.sleep(0.1)
+
+    run_scheduler(_test)
+
+    assert handled == []
+
+
+def test_failed_task_backs_off() -> None:
+    async def _test(scheduler: TaskScheduler, store: AsyncDBStore[DeferredTaskDB]):
+        failed = asyncio.Event()
+
+        async def _handler(task: DeferredTask) -> None:
+            failed.set()
+            raise ValueError("no eggs")
+
+        scheduler.register("remind", _handler)
+        await scheduler.submit(TASK, "remind")
+        await failed.wait()
+        await asyncio.sleep(0.05)
+        return await store.get()
+
+    tasks = run_scheduler(_test, base_backoff=60)
+
+    assert tasks[0].status == STATUS_PENDING
+    assert tasks[0].attempts == 1
+    assert tasks[0].retry_at > tasks[0].created_at
+
+
+def test_failed_task_dead_lettered() -> None:
+    async def _test(scheduler: TaskScheduler, store: AsyncDBStore[DeferredTaskDB]):
+        failed = asyncio.Event()
+
+        async def _handler(task: DeferredTask) -> None:
+            failed.set()
+            raise ValueError("no eggs")
+
+        scheduler.register("remind", _handler)
+        await scheduler.submit(TASK, "remind")
+        await failed.wait()
+        await asyncio.sleep(0.05)
+        return await store.get()
+
+    tasks = run_scheduler(_test, max_attempts=1)
+
+    assert tasks[0].status == STATUS_DEAD
+    assert tasks[0].attempts == 1
+
+
+def test_failed_task_retried_without_max_attempts() -> None:
+    async def _test(scheduler: TaskScheduler, store: AsyncDBStore[DeferredTaskDB]):
+        failures: list[int] = []
+        failed = asyncio.Event()
+
+        async def _handler(task: DeferredTask) -> None:
+            failures.append(task.attempts)
+            if len(failures) == 10:
+                failed.set()
+            raise ValueError("no eggs")
+
+        scheduler.register("remind", _handler)
+        await scheduler.submit(TASK, "remind")
+        await failed.wait()
+        await asyncio.sleep(0.05)
+        return await store.get()
+
+    tasks = run_scheduler(_test, base_backoff=0, max_attempts=None)
+
+    assert tasks[0].status == STATUS_PENDING
+    assert tasks[0].attempts >= 10
+
+
+def test_backoff_capped_after_many_attempts() -> None:
+    async def _test(scheduler: TaskScheduler, store: AsyncDBStore[DeferredTaskDB]):
+        await store.save(TASK, "remind")
+        task = (await store.run(DeferredTaskDB.claim, scheduler.worker_id))[0]
+        await scheduler._reschedule(task, 5000)
+        return task, await store.get()
+
+    task, tasks = run_scheduler(_test, max_backoff=600, max_attempts=None)
+    backoff = tasks[0].retry_at - task.created_at
+
+    assert tasks[0].attempts == 1
+    assert 590 <= backoff.total_seconds() <= 610
+
+
+def test_run_survives_failed_query(monkeypatch: pytest.MonkeyPatch) -> None:
+    claim = DeferredTaskDB.claim
+    calls: list[int] = []
+
+    def _claim(provider: DeferredTaskDB, *args: Any) -> list[DeferredTask]:
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return claim(provider, *args)
+
+    monkeypatch.setattr(DeferredTaskDB, "claim", _claim)
+
+    async def _test(scheduler: TaskScheduler, store: AsyncDBStore[DeferredTaskDB]):
+        done = asyncio.Event()
+
+        async def _handler(task: DeferredTask) -> None:
+            done.set()
+
+        scheduler.register("remind", _handler)
+        await scheduler.submit(TASK, "remind")
+        await done.wait()
+
+    run_scheduler(_test, error_backoff=0.01)
+
+    assert len(calls) >= 2
+
+
+def test_concurrency_is_bounded() -> None:
+    total = 20
+    running: list[int] = [0]
+    peak: list[int] = [0]
+
+    async def _test(scheduler: TaskScheduler, store: AsyncDBStore[DeferredTaskDB]):
+        done = asyncio.Event()
+        handled: list[str] = []
+
+        async def _handler(task: DeferredTask) -> None:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01)
+            running[0] -= 1
+            handled.append(task.uid)
+            if len(handled) == total:
+                done.set()
+
+        await store.run(DeferredTaskDB.save_many, [TASK] * total, "remind")
+        scheduler.register("remind", _handler)
+        await done.wait()
+        return handled
+
+    handled = run_scheduler(_test, max_concurrency=3, batch_size=5)
+
+    assert len(set(handled)) == total
+    assert peak[0] == 3
+
+
+def test_schedulers_share_table_without_duplicates() -> None:
+    total = 30
+    handled: list[str] = []
+
+    async def _test() -> None:
+        done = asyncio.Event()
+
+        async def _handler(task: DeferredTask) -> None:
+            await asyncio.sleep(0.001)
+            handled.append(task.uid)
+            if len(handled) == total:
+                done.set()
+
+        async with AsyncDBStore(DBConnector(), DB_FILE, DeferredTaskDB) as store:
+            await store.run(DeferredTaskDB.save_many, [TASK] * total, "remind")
+            schedulers = [TaskScheduler(store, batch_size=4) for _ in range(3)]
+            runners = []
+            for scheduler in schedulers:
+                scheduler.register("remind", _handler)
+                runners.append(asyncio.create_task(scheduler.run()))
+
+            await asyncio.wait_for(done.wait(), timeout=5)
+            await asyncio.sleep(0.05)
+            for scheduler in schedulers:
+                await scheduler.stop()
+            await asyncio.gather(*runners)
+
+    asyncio.run(_test())
+
+    assert len(handled) == total
+    assert len(set(handled)) == total
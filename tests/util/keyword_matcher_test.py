@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import re
+
+import pytest
+from eggbot.util.keyword_matcher import KeywordMatcher
+from eggbot.util.keyword_matcher import required_literal
+
+
+def compile_keyword(pattern: str) -> re.Pattern[str]:
+    """Compile pattern the same way KeywordNotifi does"""
+    return re.compile(rf"\b{pattern.lower()}\b", re.I)
+
+
+@pytest.mark.parametrize(
+    ("pattern", "expected"),
+    (
+        ("egg", "egg"),
+        ("jeff(erson|)", "jeff"),
+        ("colou?r", "colo"),
+        ("eggs{2,3}", "egg"),
+        ("{idx}", "{idx}"),
+        (r"egg\.bot", "egg.bot"),
+        ("[a-z]+bacon", "bacon"),
+        ("spam|eggs", None),
+        (".*", None),
+        (r"\d+", None),
+        (r"\x41bc", "bc"),
+        (r"\141bc", "bc"),
+        (r"\u0041bc", "bc"),
+        (r"(egg)\1s", "s"),
+    ),
+)
+def test_required_literal(pattern: str, expected: str | None) -> None:
+    result = required_literal(compile_keyword(pattern))
+
+    assert result == expected
+
+
+def test_required_literal_named_escape() -> None:
+    result = required_literal(re.compile(r"\N{LATIN SMALL LETTER A}bc"))
+
+    assert result == "bc"
+
+
+def test_match_code_point_escape() -> None:
+    matcher = KeywordMatcher({"abc": compile_keyword(r"\x41bc")})
+
+    assert matcher.match("hello Abc there") == ["abc"]
+
+
+@pytest.mark.parametrize(
+    ("pattern", "text"),
+    (
+        (r"\btest\b", "te\u017ft"),
+        (r"\bkelvin\b", "\u212aelvin"),
+        (r"\bfile\b", "f\u0131le"),
+        (r"\btilt\b", "T\u0130LT"),
+        (r"stra\u00dfe", "STRA\u1e9eE"),
+        (r"\u03c3\u03bf\u03c6\u03b9\u03b1", "\u03a3\u039f\u03a6\u0399\u0391"),
+        (r"\btest\b", "tests"),
+    ),
+)
+def test_match_folds_case_like_regex(pattern: str, text: str) -> None:
+    compiled = re.compile(pattern, re.I)
+    expected = ["key"] if compiled.search(text) else []
+
+    assert KeywordMatcher({"key": compiled}).match(text) == expected
+
+
+def test_required_literal_verbose_ignored() -> None:
+    result = required_literal(re.compile("e g g", re.X))
+
+    assert result is None
+
+
+def test_match_returns_all_keys() -> None:
+    patterns = {
+        "jeff": compile_keyword("jeff(erson|)"),
+        "jefferson": compile_keyword("jefferson"),
+        "shared01": compile_keyword("egg"),
+        "shared02": compile_keyword("egg"),
+        "miss": compile_keyword("bacon"),
+    }
+    matcher = KeywordMatcher(patterns, literals={"mention": "<@123>"})
+
+    result = matcher.match("Jefferson has an EGG for <@123>")
+
+    assert result == ["jeff", "jefferson", "shared01", "shared02", "mention"]
+
+
+def test_match_confirms_candidates() -> None:
+    matcher = KeywordMatcher({"egg": compile_keyword("egg")})
+
+    assert matcher.match("eggbot is not a word match") == []
+    assert matcher.match("the egg is") == ["egg"]
+
+
+def test_match_fallback_pattern() -> None:
+    matcher = KeywordMatcher({"digits": compile_keyword(r"\d{4}")})
+
+    assert matcher.match("room 1234") == ["digits"]
+    assert matcher.match("room 12") == []
+
+
+def test_match_deduplicates_patterns() -> None:
+    patterns = {str(idx): compile_keyword("egg") for idx in range(100)}
+
+    matcher = KeywordMatcher(patterns)
+
+    assert len(matcher) == 1
+    assert len(matcher.match("egg")) == 100
+
+
+@pytest.mark.parametrize(("size"), (10, 100, 10_000))
+def test_candidates_independent_of_subscribers(size: int) -> None:
+    # Per-message work is bounded by the message, not the number of patterns
+    patterns = {str(idx): compile_keyword(f"keyword{idx:05}") for idx in range(size)}
+    matcher = KeywordMatcher(patterns)
+
+    result = matcher._candidates("There is keyword00003 and keyword00007 in here")
+
+    assert len(result) == 2
+
+
+def test_candidates_skip_regex() -> None:
+    patterns = {"egg": compile_keyword("egg"), "digits": compile_keyword(r"\d{4}")}
+    matcher = KeywordMatcher(patterns, literals={"mention": "<@123>"})
+
+    result = matcher.candidates("eggbot pinged <@123>")
+
+    assert result == [
+        (patterns["egg"], ["egg"]),
+        (patterns["digits"], ["digits"]),
+        (None, ["mention"]),
+    ]
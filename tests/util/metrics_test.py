@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from typing import Generator
+
+import pytest
+from eggbot.provider.db_connector import DBConnection
+from eggbot.provider.moderation_action_db import ModerationActionDB
+from eggbot.util import metrics
+from eggbot.util.metrics import Histogram
+from eggbot.util.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry() -> Generator[MetricsRegistry, None, None]:
+    """Enable the shared registry for the test, empty before and after"""
+    metrics.registry.reset()
+    metrics.registry.enabled = True
+    try:
+        yield metrics.registry
+    finally:
+        metrics.registry.enabled = False
+        metrics.registry.reset()
+
+
+def test_histogram_quantiles() -> None:
+    histogram = Histogram()
+    for value in range(1, 10_001):
+        histogram.record(value / 1_000_000)
+
+    snapshot = histogram.snapshot((0.5, 0.9, 0.99, 1.0))
+
+    assert snapshot.count == 10_000
+    assert snapshot.min_value == pytest.approx(0.000001)
+    assert snapshot.max_value == pytest.approx(0.01)
+    assert snapshot.total == pytest.approx(sum(range(1, 10_001)) / 1_000_000)
+    for quantile, estimate in snapshot.quantiles.items():
+        assert estimate == pytest.approx(quantile / 100, rel=0.04)
+
+
+def test_histogram_empty() -> None:
+    snapshot = Histogram().snapshot()
+
+    assert snapshot.count == 0
+    assert snapshot.quantiles == {0.5: 0.0, 0.9: 0.0, 0.99: 0.0}
+
+
+def test_disabled_registry_records_nothing() -> None:
+    registry = MetricsRegistry()
+
+    registry.inc("eggs_total")
+    registry.observe("egg_seconds", 0.1)
+    registry.timed("egg_seconds")(lambda: None)()
+
+    assert registry.get_counters() == {}
+    assert registry.get_histograms() == {}
+
+
+def test_series_by_labels() -> None:
+    registry = MetricsRegistry(enabled=True)
+
+    registry.inc("eggs_total", 1, kind="fried")
+    registry.inc("eggs_total", 2, kind="fried")
+    registry.inc("eggs_total", 1, kind="boiled")
+
+    assert registry.get_counters() == {
+        ("eggs_total", (("kind", "fried"),)): 3,
+        ("eggs_total", (("kind", "boiled"),)): 1,
+    }
+
+
+def test_timed_counts_errors() -> None:
+    registry = MetricsRegistry(enabled=True)
+
+    @registry.timed("egg_seconds", kind="bad")
+    def broken() -> None:
+        raise ValueError("no eggs")
+
+    with pytest.raises(ValueError):
+        broken()
+
+    histograms = registry.get_histograms()
+    assert histograms[("egg_seconds", (("kind", "bad"),))].count == 1
+    assert registry.get_counters() == {("egg_errors_total", (("kind", "bad"),)): 1}
+
+
+def test_render_prometheus() -> None:
+    registry = MetricsRegistry(enabled=True)
+    registry.inc("eggs_total", 1, kind='say "egg"')
+    registry.observe("egg_seconds", 0.25)
+
+    result = registry.render_prometheus()
+
+    assert result == (
+        "# TYPE eggs_total counter\n"
+        'eggs_total{kind="say \\"egg\\""} 1\n'
+        "# TYPE egg_seconds summary\n"
+        'egg_seconds{quantile="0.5"} 0.25\n'
+        'egg_seconds{quantile="0.9"} 0.25\n'
+        'egg_seconds{quantile="0.99"} 0.25\n'
+        "egg_seconds_sum 0.25\n"
+        "egg_seconds_count 1\n"
+    )
+
+
+def test_render_text() -> None:
+    registry = MetricsRegistry(enabled=True)
+    registry.observe("egg_seconds", 0.25, kind="fried")
+    registry.inc("eggs_total")
+
+    result = registry.render_text()
+
+    assert result == (
+        'egg_seconds{kind="fried"} n=1 p50=250.00 p90=250.00 p99=250.00 max=250.00\n'
+        "eggs_total 1"
+    )
+
+
+def test_db_store_methods_are_timed(registry: MetricsRegistry) -> None:
+    dbconn = DBConnection(sqlite3.connect(":memory:"))
+    provider = ModerationActionDB(dbconn)
+
+    provider.save("egg")
+    provider.get()
+    provider.get()
+    list(provider.iter_all())
+    dbconn.close()
+
+    histograms = registry.get_histograms()
+    key = (("method", "get"), ("store", "ModerationActionDB"))
+    assert histograms[("eggbot_db_seconds", key)].count == 2
+    methods = {dict(labels)["method"] for _, labels in histograms}
+    assert methods == {"save", "get"}
+
+
+def test_serve(registry: MetricsRegistry) -> None:
+    registry.inc("eggs_total")
+
+    async def _test() -> bytes:
+        server = await metrics.serve(registry, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            return response
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    response = asyncio.run(_test())
+
+    assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert response.endswith(b"\r\n\r\n# TYPE eggs_total counter\neggs_total 1\n")
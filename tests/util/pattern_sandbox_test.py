@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import re
+import time
+from typing import Generator
+
+import pytest
+from eggbot.util.pattern_sandbox import PatternSandbox
+
+# Backtracks exponentially on a long run of "a" without a following "c"
+SLOW_PATTERN = re.compile(r"\b(a|aa)*c\b", re.I)
+SLOW_TEXT = "a" * 60 + " c"
+
+
+@pytest.fixture(scope="module")
+def sandbox() -> Generator[PatternSandbox, None, None]:
+    sandbox = PatternSandbox(timeout=0.5)
+    yield sandbox
+    sandbox.close()
+
+
+def test_search(sandbox: PatternSandbox) -> None:
+    patterns = [re.compile("egg", re.I), re.compile("bacon"), re.compile(r"\d+")]
+
+    assert sandbox.search(patterns, "EGG number 1") == [True, False, True]
+    assert sandbox.search([], "egg") == []
+
+
+def test_search_over_budget(sandbox: PatternSandbox) -> None:
+    patterns = [re.compile("egg"), SLOW_PATTERN, re.compile("spam")]
+
+    start = time.perf_counter()
+    result = sandbox.search(patterns, f"egg {SLOW_TEXT}")
+    elapsed = time.perf_counter() - start
+
+    assert result == [True, None, False]
+    # Found by one timed out batch and one timed out single search
+    assert elapsed < 5
+
+
+def test_search_after_over_budget(sandbox: PatternSandbox) -> None:
+    sandbox.search([SLOW_PATTERN], SLOW_TEXT)
+
+    assert sandbox.search([re.compile("egg")], "egg") == [True]
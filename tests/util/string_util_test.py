@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+import re
+
 import pytest
+from eggbot.util import string_util
+from eggbot.util.string_util import CacheStats
 from eggbot.util.string_util import StringUtil
+from eggbot.util.string_util import UnsafePatternError
 
 
 @pytest.mark.parametrize(
@@ -17,3 +22,95 @@ def test_has_match(text: str, pattern: str, expected: str) -> None:
     result = StringUtil.has_match(text, pattern)
 
     assert result is expected
+
+
+@pytest.fixture(autouse=True)
+def empty_cache() -> None:
+    StringUtil.clear_cache()
+
+
+def test_compile_is_cached() -> None:
+    first = StringUtil.compile_pattern("egg+s", re.I)
+    second = StringUtil.compile_pattern("egg+s", re.I)
+    other_flags = StringUtil.compile_pattern("egg+s")
+
+    stats = StringUtil.get_cache_stats()
+
+    assert first is second
+    assert other_flags is not first
+    assert stats == CacheStats(hits=1, misses=2, evictions=0, size=2)
+
+
+def test_cache_is_bounded(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(string_util._cache, "max_size", 2)
+
+    StringUtil.compile_pattern("egg")
+    StringUtil.compile_pattern("bacon")
+    StringUtil.compile_pattern("egg")
+    StringUtil.compile_pattern("spam")
+    StringUtil.compile_pattern("egg")
+    StringUtil.compile_pattern("bacon")
+
+    stats = StringUtil.get_cache_stats()
+
+    # bacon was least recently used when spam was added
+    assert stats == CacheStats(hits=2, misses=4, evictions=2, size=2)
+
+
+@pytest.mark.parametrize(
+    ("pattern"),
+    (
+        "(a+)+b",
+        "(a*)*b",
+        r"(\w+\s?)*$",
+        "((ab)+c?)+",
+        "(?:x|y+)+",
+        "(a{2,})*",
+        "a{1000}",
+        "a{0,5000}",
+        "(?=(a+)+)",
+        "(a|aa)+b",
+        "(a?){25}a{25}",
+        "a*a*a*a*c",
+        "a*" * 8 + "c",
+        "(a?b)+",
+        r"\w+\s?\w+",
+        r"\d*[0-9]+",
+        "A*a+",
+        "(a|b|ab)*c",
+        "(?:(?:x|yz)c)+",
+        "(a)(?:(?(1)a|b))+",
+        "a" * 300,
+    ),
+)
+def test_check_pattern_rejects_unsafe(pattern: str) -> None:
+    with pytest.raises(UnsafePatternError):
+        StringUtil.check_pattern(pattern)
+
+
+@pytest.mark.parametrize(
+    ("pattern"),
+    (
+        "Jeff(erson|)",
+        r"\begg(s|)\b",
+        "(ab)+c",
+        "(a|b)*",
+        "a{2,5}b+",
+        "(x{1})+",
+        r"colou?r\d+",
+        r"\d+\s*\w+",
+        "a*b*",
+        "(ab{2})+",
+        ".*a.*b",
+    ),
+)
+def test_check_pattern_accepts_safe(pattern: str) -> None:
+    StringUtil.check_pattern(pattern)
+
+
+def test_has_match_safe() -> None:
+    with pytest.raises(UnsafePatternError):
+        StringUtil.has_match("aaaa", "(a+)+b", safe=True)
+
+    assert StringUtil.has_match("aaaab", "(a+)+b")
+    assert StringUtil.get_cache_stats().size == 1
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import pytest
+from eggbot.util.time_util import TimeUtil
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    (
+        (datetime(1970, 1, 1), 0),
+        (datetime(1970, 1, 1, 0, 0, 1, 1), 1_000_001),
+        (datetime(2022, 10, 31, 12, 30, 15, 123456), 1_667_219_415_123_456),
+    ),
+)
+def test_to_epoch(value: datetime, expected: int) -> None:
+    assert TimeUtil.to_epoch(value) == expected
+
+
+def test_round_trip() -> None:
+    now = datetime.utcnow()
+
+    result = TimeUtil.from_epoch(TimeUtil.to_epoch(now))
+
+    assert result == now